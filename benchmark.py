@@ -0,0 +1,1316 @@
+#!/usr/bin/env python3
+"""
+Mohan Voice Assistant - Performance Benchmarks
+Offline benchmarks for the voice assistant's cold-start and latency-critical paths.
+
+Benchmarks:
+- imports: import-time profile of main.py and its heavy dependencies (python -X importtime)
+- e2e: boots the app locally against stub providers (stub_providers.py), drives simulated
+  WebSocket clients and reports p50/p95/p99 time-to-transcript, time-to-first-audio and throughput
+- ttfa: time-to-first-audio vs reply length, sentence-level TTS against whole-reply synthesis
+- edge-pool: Edge TTS latency with a fresh connection per synthesis against the warm pool
+- stt-upload: STT upload bytes and latency with the client's audio forwarded as-is vs downmixed,
+  resampled to 16 kHz and re-encoded (WAV, FLAC, Opus)
+- stream-stt: time from the end of speech to the local Whisper transcript, decoding the finished
+  clip vs decoding streamed audio incrementally while the user speaks
+- local-tts: real-time factor and per-sentence latency of the in-process CPU voice on one core
+- normalize: characters and estimated audio seconds speech normalization keeps out of TTS, on
+  recorded replies or built-in samples, after checking the symbol rules against SPEECH_EXAMPLES
+- search-cache: web search latency and cache hit ratio for a skewed query mix with live searches
+  only, the search cache, and the cache with hot topics refreshed in the background
+- groq-limits: voice turns alongside a batch transcription job against per-model Groq rate limits,
+  sending requests as they come vs the client-side rate-limit scheduler
+- prewarm: first-turn vs steady-state latency with and without pre-warming connections on accept
+- replay: replays sessions recorded with SESSION_RECORD_DIR (real audio, turn timing and answer
+  lengths) at a speed-up against a deployment or a local stubbed instance
+
+Usage:
+    python benchmark.py imports [--top 25] [--json report.json]
+    python benchmark.py e2e [--clients 8] [--turns 5] [--audio clip.wav ...] [--json report.json]
+    python benchmark.py ttfa [--reply-lengths 15 60 150 300] [--parallelism 3]
+    python benchmark.py edge-pool [--pool-size 6] [--clients 4] [--edge-connect-ms 200]
+    python benchmark.py stt-upload [--audio clip.webm ...] [--formats original flac opus]
+    python benchmark.py stream-stt [--seconds 3 6 10] [--local-whisper-ms 350]
+    python benchmark.py local-tts [--model voice.onnx] [--audio-format mp3-48k]
+    python benchmark.py normalize [recordings/] [--show]
+    python benchmark.py search-cache [--duration 30] [--rate 4] [--time-scale 0.02]
+    python benchmark.py groq-limits [--duration 60] [--turn-rate 0.25] [--batch-workers 2] [--groq-rpm 30]
+    python benchmark.py prewarm [--sessions 5] [--speaking-time 2] [--session-gap 8]
+    python benchmark.py replay recordings/ [--speedup 10] [--concurrency 50] [--target wss://.../ws]
+
+Author: Mohan Bhosale
+"""
+
+import argparse
+import asyncio
+import base64
+import glob
+import gzip
+import hashlib
+import io
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import wave
+from typing import Dict, List, Optional, Tuple
+
+from stub_providers import (StubWhisper, add_stub_arguments, start_stub_server, stub_config_from_args,
+                            stub_environment)
+
+# Modules whose import cost matters for gateway cold starts
+IMPORT_TARGETS = [
+    "main",
+    "fastapi",
+    "groq",
+    "openai",
+    "edge_tts",
+    "numpy",
+    "httpx",
+    "bs4",
+    "duckduckgo_search",
+]
+
+
+def profile_import(module: str) -> Dict:
+    """
+    Import a module in a fresh interpreter with -X importtime and parse the report
+
+    Args:
+        module: Dotted module name to import
+
+    Returns:
+        Dict with total cumulative time and per-module self/cumulative times in microseconds
+    """
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "benchmark")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+
+    entries: List[Dict] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append({
+            "module": name.rstrip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+        })
+
+    top_level = [entry for entry in entries if entry["module"].strip() == module]
+    return {
+        "module": module,
+        "ok": result.returncode == 0,
+        "error": result.stderr.strip().splitlines()[-1] if result.returncode else "",
+        "total_us": top_level[-1]["cumulative_us"] if top_level else 0,
+        "entries": entries,
+    }
+
+
+def run_imports(args):
+    """Report import time for main.py and each heavy dependency"""
+    print("📦 Import-time profile (fresh interpreter per module)\n")
+    report = [profile_import(module) for module in IMPORT_TARGETS]
+
+    print(f"{'module':<22}{'total ms':>10}")
+    print("-" * 32)
+    for item in report:
+        if item["ok"]:
+            print(f"{item['module']:<22}{item['total_us'] / 1000:>10.1f}")
+        else:
+            print(f"{item['module']:<22}{'failed':>10}  ({item['error']})")
+
+    main_report = report[0]
+    if main_report["ok"]:
+        print(f"\n🐢 Slowest imports under 'import main' (top {args.top} by cumulative time):")
+        slowest = sorted(main_report["entries"], key=lambda entry: entry["cumulative_us"], reverse=True)
+        for entry in slowest[:args.top]:
+            print(f"   {entry['cumulative_us'] / 1000:>8.1f} ms  {entry['module'].strip()}")
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"\n💾 Wrote {args.json}")
+
+
+def make_test_audio(seconds: float = 2.0, sample_rate: int = 16000) -> bytes:
+    """
+    Synthesize a speech-like WAV clip (voiced harmonics with a syllable-rate envelope)
+
+    Args:
+        seconds: Clip duration
+        sample_rate: Sample rate in Hz
+
+    Returns:
+        16-bit mono WAV bytes
+    """
+    import numpy as np
+
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 20 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5
+    noise = np.random.default_rng(0).normal(0, 0.02, len(t))
+    signal = 0.3 * voiced * envelope / 2 + noise
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes((np.clip(signal, -1, 1) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def sample_recordings() -> Dict[str, bytes]:
+    """
+    Synthetic stand-ins for client recordings
+
+    Returns:
+        Clip name -> WAV bytes: a 48 kHz stereo desktop capture with silence before and after
+        the question, and a tightly cut 16 kHz mono clip
+    """
+    import numpy as np
+
+    with wave.open(io.BytesIO(make_test_audio(4.0, 48000))) as wav_file:
+        speech = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype="<i2")
+    silence = np.zeros(int(1.5 * 48000), dtype="<i2")
+    padded = np.concatenate([silence, speech, silence])
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(48000)
+        wav_file.writeframes(np.repeat(padded, 2).tobytes())
+    return {"48k-stereo-padded.wav": buffer.getvalue(), "16k-mono.wav": make_test_audio(3.0)}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (None for no samples)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    """
+    Boot main.create_web_app under uvicorn in a subprocess and wait until it serves requests
+
+    Args:
+        port: Local port for the app
+        env: Extra environment (stub provider endpoints, limits)
+
+    Returns:
+        The running uvicorn process
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:create_web_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--ws", "websockets"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL if not env.get("BENCHMARK_APP_LOGS") else None,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("App exited during startup")
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not start within 30s")
+
+
+def new_samples() -> Dict[str, List]:
+    """Empty result lists shared by the simulated clients"""
+    return {"time_to_transcript": [], "time_to_first_audio": [], "turn_time": [], "rejected": [], "errors": []}
+
+
+async def measure_turn(ws, turn: int, audio_b64: str, mime: str, samples: Dict[str, List]):
+    """
+    Send one question on an open connection and record its timings
+
+    Args:
+        ws: Connected app WebSocket
+        turn: Turn id for the message
+        audio_b64: Base64-encoded audio clip
+        mime: Clip MIME type
+        samples: Shared result lists, appended to in place
+    """
+    sent_at = time.perf_counter()
+    await ws.send(json.dumps({
+        "type": "audio", "turn": turn, "data": audio_b64, "mimeType": mime, "size": len(audio_b64) * 3 // 4,
+    }))
+
+    first_audio_at = None
+    frames = 0
+    # Binary audio frames announced by the response (one per sentence, or one pre-rendered clip)
+    expected_frames = None
+    while expected_frames is None or frames < expected_frames:
+        frame = await asyncio.wait_for(ws.recv(), timeout=60)
+        now = time.perf_counter()
+        if isinstance(frame, bytes):
+            frames += 1
+            first_audio_at = first_audio_at or now
+            continue
+
+        message = json.loads(frame)
+        if message.get("turn") not in (None, turn):
+            continue
+        if message["type"] == "transcription":
+            samples["time_to_transcript"].append(now - sent_at)
+        elif message["type"] == "busy":
+            samples["rejected"].append(1)
+            return
+        elif message["type"] == "response":
+            if message.get("audio"):
+                first_audio_at = first_audio_at or now
+            expected_frames = message.get("audio_chunks", 1 if message.get("audio_frame") else 0)
+
+    finished_at = time.perf_counter()
+    samples["time_to_first_audio"].append((first_audio_at or finished_at) - sent_at)
+    samples["turn_time"].append(finished_at - sent_at)
+
+
+async def negotiate_format(ws, audio_format: Optional[str]):
+    """Request a TTS output format the way the page does, and wait for the server's choice"""
+    if not audio_format:
+        return
+    await ws.send(json.dumps({"type": "hello", "audio_formats": [audio_format]}))
+    while json.loads(await asyncio.wait_for(ws.recv(), timeout=10)).get("type") != "audio_format":
+        pass
+
+
+async def run_client(url: str, clips: List[bytes], turns: int, think_time: float, samples: Dict[str, List],
+                     audio_format: Optional[str] = None):
+    """
+    Simulate one user: connect, ask `turns` questions and record per-turn timings
+
+    Args:
+        url: App WebSocket URL
+        clips: Audio clips to send (cycled)
+        turns: Questions to ask on this connection
+        think_time: Seconds to wait between turns
+        samples: Shared result lists, appended to in place
+        audio_format: TTS format to negotiate (server default when None)
+    """
+    import websockets
+
+    async with websockets.connect(url, max_size=None) as ws:
+        await negotiate_format(ws, audio_format)
+        for turn in range(1, turns + 1):
+            clip = clips[(turn - 1) % len(clips)]
+            await measure_turn(ws, turn, base64.b64encode(clip).decode(), "audio/wav", samples)
+            await asyncio.sleep(think_time)
+
+
+async def run_sessions(url: str, clips: List[bytes], sessions: int, turns: int, speaking_time: float,
+                       session_gap: float, audio_format: Optional[str] = None) -> Tuple[Dict, Dict]:
+    """
+    Open sessions one after another, splitting each session's first turn from its later ones
+
+    Args:
+        url: App WebSocket URL
+        clips: Audio clips to send (cycled)
+        sessions: Sequential sessions to open
+        turns: Questions per session
+        speaking_time: Seconds the user "speaks" before each question is sent
+        session_gap: Idle seconds between sessions, letting provider connections go cold
+        audio_format: TTS format to negotiate (server default when None)
+
+    Returns:
+        Samples of first turns and of later (steady-state) turns
+    """
+    import websockets
+
+    first, steady = new_samples(), new_samples()
+    started = time.perf_counter()
+    for _ in range(sessions):
+        try:
+            async with websockets.connect(url, max_size=None) as ws:
+                await negotiate_format(ws, audio_format)
+                for turn in range(1, turns + 1):
+                    await asyncio.sleep(speaking_time)
+                    clip = clips[(turn - 1) % len(clips)]
+                    await measure_turn(ws, turn, base64.b64encode(clip).decode(), "audio/wav",
+                                       first if turn == 1 else steady)
+        except Exception as e:
+            first["errors"].append(repr(e))
+        await asyncio.sleep(session_gap)
+    first["wall_time"] = steady["wall_time"] = time.perf_counter() - started
+    return first, steady
+
+
+async def drive_clients(url: str, clips: List[bytes], clients: int, turns: int, think_time: float,
+                        audio_format: Optional[str] = None) -> Dict:
+    """Run all simulated clients concurrently and collect their samples"""
+    samples = new_samples()
+
+    async def guarded(index: int):
+        # Stagger connection opens slightly, as real users do
+        await asyncio.sleep(index * 0.01)
+        try:
+            await run_client(url, clips, turns, think_time, samples, audio_format)
+        except Exception as e:
+            samples["errors"].append(repr(e))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(guarded(i) for i in range(clients)))
+    samples["wall_time"] = time.perf_counter() - started
+    return samples
+
+
+def summarize(samples: Dict) -> Dict:
+    """Reduce raw samples to percentiles (milliseconds) and throughput"""
+    report = {}
+    for metric in ("time_to_transcript", "time_to_first_audio", "turn_time"):
+        values = samples[metric]
+        report[metric] = {
+            f"p{pct}": round(percentile(values, pct) * 1000, 1) if values else None
+            for pct in (50, 95, 99)
+        }
+    report["completed_turns"] = len(samples["turn_time"])
+    report["rejected_turns"] = len(samples["rejected"])
+    report["client_errors"] = len(samples["errors"])
+    report["throughput_turns_per_s"] = round(len(samples["turn_time"]) / samples["wall_time"], 2)
+    return report
+
+
+def print_report(report: Dict, samples: Dict):
+    """Print the latency table and totals"""
+    print(f"\n{'metric':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    print("-" * 52)
+    for metric in ("time_to_transcript", "time_to_first_audio", "turn_time"):
+        row = report[metric]
+        cells = "".join(f"{row[key] if row[key] is not None else '-':>10}" for key in ("p50", "p95", "p99"))
+        print(f"{metric:<22}{cells}")
+    print(f"\n✅ {report['completed_turns']} turns, {report['throughput_turns_per_s']} turns/s, "
+          f"{report['rejected_turns']} rejected, {report['client_errors']} client errors")
+    for error in samples["errors"][:5]:
+        print(f"   ❌ {error}")
+
+
+def stubbed_app(stub_config, clients: int, app_logs: bool, stub_port: int = 0, app_port: int = 0,
+                extra_env: Optional[Dict[str, str]] = None) -> Tuple[str, subprocess.Popen]:
+    """
+    Start stub providers and the app pointed at them
+
+    Returns:
+        The app's WebSocket URL and its process (terminate it when done)
+    """
+    stub_port = stub_port or _free_port()
+    start_stub_server(stub_config, stub_port)
+    return app_on_stubs(stub_port, clients, app_logs, app_port, extra_env)
+
+
+def app_on_stubs(stub_port: int, clients: int, app_logs: bool, app_port: int = 0,
+                 extra_env: Optional[Dict[str, str]] = None) -> Tuple[str, subprocess.Popen]:
+    """Start the app against already running stub providers"""
+    app_port = app_port or _free_port()
+    env = {
+        **stub_environment(stub_port),
+        "MAX_ACTIVE_SESSIONS": str(max(clients, 10)),
+        "LOCAL_STT_BACKEND": "inprocess",
+        **(extra_env or {}),
+    }
+    if app_logs:
+        env["BENCHMARK_APP_LOGS"] = "1"
+
+    print(f"🧪 Stub providers on :{stub_port}, app on :{app_port}")
+    return f"ws://127.0.0.1:{app_port}/ws", start_app(app_port, env)
+
+
+def run_e2e(args):
+    """Benchmark the full voice loop offline against stub providers"""
+    clips = []
+    for path in args.audio or []:
+        with open(path, "rb") as audio_file:
+            clips.append(audio_file.read())
+    clips = clips or [make_test_audio()]
+
+    url, app_process = stubbed_app(stub_config_from_args(args), args.clients, args.app_logs,
+                                   args.stub_port, args.app_port)
+    try:
+        print(f"🚀 {args.clients} clients x {args.turns} turns")
+        samples = asyncio.run(drive_clients(url, clips, args.clients, args.turns, args.think_time,
+                                            args.audio_format))
+    finally:
+        app_process.terminate()
+        app_process.wait(timeout=10)
+
+    report = summarize(samples)
+    print_report(report, samples)
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump({"config": vars(args) | {"func": None}, "report": report}, report_file, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+
+def load_sessions(paths: List[str]) -> List[Dict]:
+    """
+    Read recorded sessions (files or directories of *.session.gz)
+
+    Args:
+        paths: Recording files or directories
+
+    Returns:
+        Sessions with their header fields and a "turns" list, oldest first
+    """
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.session.gz"))) if os.path.isdir(path) else [path])
+
+    sessions = []
+    for path in files:
+        with gzip.open(path, "rt") as record_file:
+            lines = [json.loads(line) for line in record_file if line.strip()]
+        if len(lines) > 1:
+            sessions.append({**lines[0], "turns": lines[1:]})
+    return sorted(sessions, key=lambda session: session["started_at"])
+
+
+def select_sessions(sessions: List[Dict], mix: str, long_chars: int) -> List[Dict]:
+    """Keep all sessions, only search-heavy ones, or only ones with long answers"""
+    if mix == "search":
+        return [session for session in sessions if any(turn.get("search") for turn in session["turns"])]
+    if mix == "long":
+        return [session for session in sessions
+                if any(turn.get("response_chars", 0) >= long_chars for turn in session["turns"])]
+    return sessions
+
+
+def build_schedule(sessions: List[Dict], speedup: float, loops: int) -> List[Tuple[float, Dict]]:
+    """
+    Compress the recorded arrival pattern by `speedup`, repeating it `loops` times
+
+    Returns:
+        (start delay in seconds, session) pairs, so bursts in the recording stay bursts
+    """
+    first_start = sessions[0]["started_at"]
+    span = max(session["started_at"] - first_start + session["turns"][-1]["offset_s"] for session in sessions)
+    schedule = []
+    for loop in range(loops):
+        for session in sessions:
+            schedule.append(((loop * span + session["started_at"] - first_start) / speedup, session))
+    return schedule
+
+
+async def replay_session(url: str, session: Dict, speedup: float, samples: Dict[str, List],
+                         audio_format: Optional[str] = None):
+    """
+    Replay one recorded session, keeping each turn's offset from session start
+
+    A turn whose recorded offset has already passed (the previous answer came
+    back slower than in production) is sent as soon as that answer arrives.
+    The recorded TTS format is negotiated unless `audio_format` overrides it.
+    """
+    import websockets
+
+    async with websockets.connect(url, max_size=None) as ws:
+        await negotiate_format(ws, audio_format or session["turns"][0].get("audio_format"))
+        started = time.perf_counter()
+        for turn, record in enumerate(session["turns"], start=1):
+            delay = record["offset_s"] / speedup - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await measure_turn(ws, turn, record["audio_b64"], record.get("mime") or "audio/webm", samples)
+
+
+async def drive_replay(url: str, schedule: List[Tuple[float, Dict]], speedup: float, concurrency: int,
+                       audio_format: Optional[str] = None) -> Dict:
+    """Start sessions on schedule, at most `concurrency` connections at once, and collect samples"""
+    samples = new_samples()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def guarded(delay: float, session: Dict):
+        await asyncio.sleep(delay)
+        async with slots:
+            try:
+                await replay_session(url, session, speedup, samples, audio_format)
+            except Exception as e:
+                samples["errors"].append(repr(e))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(guarded(delay, session) for delay, session in schedule))
+    samples["wall_time"] = time.perf_counter() - started
+    return samples
+
+
+def replay_stub_config(args, sessions: List[Dict]):
+    """Stub settings that answer each recorded clip with its recorded transcript and answer length"""
+    config = stub_config_from_args(args)
+    transcripts = [turn["transcript"] for session in sessions for turn in session["turns"] if turn["transcript"]]
+    config.transcripts = transcripts or config.transcripts
+    config.transcripts_by_audio = {
+        hashlib.sha1(base64.b64decode(turn["audio_b64"])).hexdigest(): turn["transcript"]
+        for session in sessions for turn in session["turns"] if turn["transcript"]
+    }
+    config.reply_words_by_transcript = {
+        turn["transcript"]: len(turn["response"].split())
+        for session in sessions for turn in session["turns"] if turn["transcript"]
+    }
+    return config
+
+
+def run_replay(args):
+    """Replay recorded production sessions against a deployment or a local stubbed instance"""
+    sessions = select_sessions(load_sessions(args.recordings), args.mix, args.long_chars)
+    if not sessions:
+        sys.exit("No recorded sessions matched (record with SESSION_RECORD_DIR=...)")
+
+    turns = [turn for session in sessions for turn in session["turns"]]
+    schedule = build_schedule(sessions, args.speedup, args.loop)
+    print(f"📼 {len(sessions)} sessions, {len(turns)} turns "
+          f"({sum(1 for turn in turns if turn.get('search'))} with search, "
+          f"{sum(1 for turn in turns if turn.get('response_chars', 0) >= args.long_chars)} long answers), "
+          f"x{args.loop} at {args.speedup:g}x speed, up to {args.concurrency} concurrent")
+
+    app_process = None
+    url = args.target
+    if not url:
+        # Recorded clips are matched to their transcripts by hash, so upload them as recorded
+        url, app_process = stubbed_app(replay_stub_config(args, sessions), args.concurrency, args.app_logs,
+                                       extra_env={"STT_UPLOAD_FORMAT": "original"})
+    try:
+        samples = asyncio.run(drive_replay(url, schedule, args.speedup, args.concurrency, args.audio_format))
+    finally:
+        if app_process:
+            app_process.terminate()
+            app_process.wait(timeout=10)
+
+    report = summarize(samples)
+    print_report(report, samples)
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump({"config": vars(args) | {"func": None}, "report": report}, report_file, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+
+def run_ttfa(args):
+    """Time-to-first-audio vs reply length, sentence-level TTS against whole-reply synthesis"""
+    stub_config = stub_config_from_args(args)
+    stub_port = _free_port()
+    start_stub_server(stub_config, stub_port)
+    modes = {
+        "whole reply": {"TTS_PARALLELISM": "0"},
+        f"sentences x{args.parallelism}": {"TTS_PARALLELISM": str(args.parallelism)},
+    }
+    apps = {mode: app_on_stubs(stub_port, 1, args.app_logs, extra_env=env) for mode, env in modes.items()}
+    clips = [make_test_audio()]
+
+    results = []
+    try:
+        for words in args.reply_lengths:
+            # The stub reads its config per request, so the reply length can change between runs
+            stub_config.reply_words = words
+            row = {"reply_words": words}
+            for mode, (url, _) in apps.items():
+                samples = asyncio.run(drive_clients(url, clips, 1, args.turns, 0.0, args.audio_format))
+                for error in samples["errors"][:1]:
+                    print(f"   ❌ {mode}: {error}")
+                row[mode] = summarize(samples)
+            results.append(row)
+    finally:
+        for _, process in apps.values():
+            process.terminate()
+            process.wait(timeout=10)
+
+    mode_names = list(modes)
+    print(f"\n{'reply words':<14}" + "".join(f"{name + ' TTFA p50':>26}" for name in mode_names)
+          + f"{'turn time p50':>16}")
+    print("-" * (14 + 26 * len(mode_names) + 16))
+    for row in results:
+        cells = "".join(f"{row[name]['time_to_first_audio']['p50'] or '-':>26}" for name in mode_names)
+        print(f"{row['reply_words']:<14}{cells}{row[mode_names[-1]]['turn_time']['p50'] or '-':>16}")
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump({"config": vars(args) | {"func": None}, "report": results}, report_file, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+
+def scrape_counter(url: str, name: str) -> Dict[str, float]:
+    """Read one labelled counter from the app's /metrics, keyed by its label string"""
+    metrics_url = url.replace("ws://", "http://").rsplit("/ws", 1)[0] + "/metrics"
+    with urllib.request.urlopen(metrics_url, timeout=5) as response:
+        lines = response.read().decode().splitlines()
+    values = {}
+    for line in lines:
+        if line.startswith(name + "{"):
+            labels, _, value = line[len(name):].rpartition(" ")
+            values[labels] = float(value)
+    return values
+
+
+def run_edge_pool(args):
+    """Edge TTS latency with a connection per request against the warm connection pool"""
+    stub_config = stub_config_from_args(args)
+    stub_port = _free_port()
+    start_stub_server(stub_config, stub_port)
+    modes = {
+        "connect per request": {"EDGE_TTS_POOL_SIZE": "0"},
+        f"pool of {args.pool_size}": {"EDGE_TTS_POOL_SIZE": str(args.pool_size)},
+    }
+    clips = [make_test_audio()]
+
+    results = {}
+    for mode, env in modes.items():
+        url, process = app_on_stubs(stub_port, args.clients, args.app_logs, extra_env=env)
+        try:
+            samples = asyncio.run(drive_clients(url, clips, args.clients, args.turns, args.think_time,
+                                                args.audio_format))
+            for error in samples["errors"][:1]:
+                print(f"   ❌ {mode}: {error}")
+            results[mode] = summarize(samples)
+            results[mode]["edge_connections"] = scrape_counter(url, "voice_edge_tts_connections_total")
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print(f"\n{'mode':<24}{'TTFA p50':>10}{'TTFA p95':>10}{'turn p50':>10}{'opened':>8}{'reused':>8}")
+    print("-" * 70)
+    for mode, report in results.items():
+        opened, reused = (int(report["edge_connections"].get(f'{{event="{event}"}}', 0))
+                          for event in ("opened", "reused"))
+        print(f"{mode:<24}{report['time_to_first_audio']['p50'] or '-':>10}"
+              f"{report['time_to_first_audio']['p95'] or '-':>10}{report['turn_time']['p50'] or '-':>10}"
+              f"{opened:>8}{reused:>8}")
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump({"config": vars(args) | {"func": None}, "report": results}, report_file, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+
+def run_prewarm(args):
+    """First-turn vs steady-state latency with and without pre-warming on accept"""
+    stub_port = _free_port()
+    start_stub_server(stub_config_from_args(args), stub_port)
+    clips = [make_test_audio()]
+
+    results = {}
+    for mode, enabled in (("cold first turn", "0"), ("pre-warm on accept", "1")):
+        url, process = app_on_stubs(stub_port, 1, args.app_logs, extra_env={"PREWARM_ON_ACCEPT": enabled})
+        try:
+            first, steady = asyncio.run(run_sessions(url, clips, args.sessions, args.turns, args.speaking_time,
+                                                     args.session_gap, args.audio_format))
+            for error in first["errors"][:1]:
+                print(f"   ❌ {mode}: {error}")
+            results[mode] = {"first": summarize(first), "steady": summarize(steady)}
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print(f"\n{'mode':<22}{'first TTFA p50':>16}{'steady TTFA p50':>17}{'first turn p50':>16}{'steady turn p50':>17}")
+    print("-" * 88)
+    for mode, report in results.items():
+        print(f"{mode:<22}{report['first']['time_to_first_audio']['p50'] or '-':>16}"
+              f"{report['steady']['time_to_first_audio']['p50'] or '-':>17}"
+              f"{report['first']['turn_time']['p50'] or '-':>16}{report['steady']['turn_time']['p50'] or '-':>17}")
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump({"config": vars(args) | {"func": None}, "report": results}, report_file, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+
+def run_stt_upload(args):
+    """Upload bytes and STT latency per upload encoding, on sample recordings"""
+    import contextlib
+
+    stub_port = _free_port()
+    start_stub_server(stub_config_from_args(args), stub_port)
+    os.environ.update(stub_environment(stub_port))
+    import main as assistant_module  # after the environment points the SDK clients at the stubs
+
+    clips = {}
+    for path in args.audio or []:
+        with open(path, "rb") as audio_file:
+            clips[os.path.basename(path)] = audio_file.read()
+    clips = clips or sample_recordings()
+
+    async def measure() -> List[Dict]:
+        assistant = assistant_module.VoiceAssistant()
+        uploaded_bytes = assistant_module.STT_UPLOAD_BYTES.values
+        rows = []
+        for upload_format in args.formats:
+            assistant.upload_format = upload_format
+            for name, clip in clips.items():
+                sizes, latencies = [], []
+                for _ in range(args.repeats):
+                    before = uploaded_bytes.get(("uploaded",), 0.0)
+                    started = time.perf_counter()
+                    await assistant.speech_to_text(clip)
+                    latencies.append(time.perf_counter() - started)
+                    sizes.append(uploaded_bytes.get(("uploaded",), 0.0) - before)
+                rows.append({
+                    "clip": name, "format": upload_format, "received_bytes": len(clip),
+                    "uploaded_bytes": int(sum(sizes) / len(sizes)),
+                    "stt_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                    "stt_p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                })
+        return rows
+
+    with contextlib.redirect_stdout(sys.stdout if args.app_logs else io.StringIO()):
+        rows = asyncio.run(measure())
+
+    print(f"\n{'clip':<24}{'format':<10}{'received KB':>12}{'uploaded KB':>12}{'ratio':>8}"
+          f"{'STT p50 ms':>12}{'STT p95 ms':>12}")
+    print("-" * 90)
+    for row in rows:
+        print(f"{row['clip']:<24}{row['format']:<10}{row['received_bytes'] / 1024:>12.1f}"
+              f"{row['uploaded_bytes'] / 1024:>12.1f}{row['uploaded_bytes'] / row['received_bytes']:>8.2f}"
+              f"{row['stt_p50_ms']:>12}{row['stt_p95_ms']:>12}")
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump({"config": vars(args) | {"func": None}, "report": rows}, report_file, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+
+def run_stream_stt(args):
+    """Endpoint-to-transcript latency of local Whisper on the finished clip vs streamed partial decoding"""
+    import contextlib
+    import main as assistant_module
+
+    whisper_stub = StubWhisper(stub_config_from_args(args))
+    chunk_seconds = 0.25
+
+    async def measure(seconds: float) -> Dict:
+        clip = make_test_audio(seconds)
+        with wave.open(io.BytesIO(clip)) as wav_file:
+            pcm = wav_file.readframes(wav_file.getnframes())
+        local_stt = assistant_module.LocalWhisperClient(backend="inprocess", transcriber=whisper_stub.transcribe,
+                                                        window_transcriber=whisper_stub.transcribe_window)
+        batch, streamed, first_partial, partials, mismatches = [], [], [], [], 0
+        for _ in range(args.repeats):
+            started = time.perf_counter()
+            batch_text = await local_stt.transcribe(clip)
+            batch.append(time.perf_counter() - started)
+            
+            # The user speaks in real time; the clock for both modes starts when they stop
+            partial_at = []
+            
+            async def on_partial(stable: str, text: str):
+                partial_at.append(time.perf_counter())
+            
+            stream = assistant_module.StreamingTranscription(local_stt, on_partial)
+            speech_started = time.perf_counter()
+            chunk_bytes = int(chunk_seconds * 16000) * 2
+            for offset in range(0, len(pcm), chunk_bytes):
+                stream.feed(pcm[offset:offset + chunk_bytes])
+                await asyncio.sleep(chunk_seconds)
+            started = time.perf_counter()
+            stream_text = await stream.finish()
+            streamed.append(time.perf_counter() - started)
+            partials.append(stream.partials)
+            if partial_at:
+                first_partial.append(partial_at[0] - speech_started)
+            mismatches += stream_text != batch_text
+        return {
+            "speech_seconds": seconds,
+            "batch_p50_ms": round(percentile(batch, 50) * 1000, 1),
+            "streaming_p50_ms": round(percentile(streamed, 50) * 1000, 1),
+            "first_partial_ms": round(percentile(first_partial, 50) * 1000, 1) if first_partial else None,
+            "partials": round(sum(partials) / len(partials), 1),
+            "transcript_mismatches": mismatches,
+        }
+
+    with contextlib.redirect_stdout(sys.stdout if args.app_logs else io.StringIO()):
+        rows = [asyncio.run(measure(seconds)) for seconds in args.seconds]
+
+    print(f"\n{'speech s':>9}{'batch final ms':>16}{'streaming final ms':>20}{'first partial ms':>18}{'partials':>10}{'mismatches':>12}")
+    print("-" * 85)
+    for row in rows:
+        print(f"{row['speech_seconds']:>9.1f}{row['batch_p50_ms']:>16}{row['streaming_p50_ms']:>20}"
+              f"{str(row['first_partial_ms']):>18}{row['partials']:>10}{row['transcript_mismatches']:>12}")
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump({"config": vars(args) | {"func": None}, "report": rows}, report_file, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+
+# Reply sentences of typical lengths for the local TTS benchmark
+TTS_SAMPLE_SENTENCES = [
+    "Sure!",
+    "Mohan is a data scientist at Cohere Health.",
+    "He builds machine learning systems that turn clinical data into reliable predictions for care teams.",
+    ("Before that, he worked on forecasting and natural language processing projects, shipping models "
+     "to production and monitoring them long after launch, which is where most of the hard work happens."),
+]
+
+
+def run_local_tts(args):
+    """Real-time factor and latency of the in-process CPU TTS voice on a single core"""
+    import main as assistant_module
+
+    if hasattr(os, "sched_setaffinity"):
+        # One core, like a busy container where every other core serves sessions
+        os.sched_setaffinity(0, {min(os.sched_getaffinity(0))})
+    engine = assistant_module.LocalTTS(args.model or assistant_module.LOCAL_TTS_MODEL, threads=1)
+    if not engine.available():
+        sys.exit(f"Local TTS voice not found at {engine.model_path} (pip install -r requirements-local.txt and download a voice)")
+
+    started = time.perf_counter()
+    asyncio.run(engine.warm())
+    load_seconds = time.perf_counter() - started
+    engine.synthesize_pcm("Warm up.")
+
+    rows = []
+    for sentence in TTS_SAMPLE_SENTENCES:
+        synth, encoded = [], []
+        audio_seconds = 0.0
+        for _ in range(args.repeats):
+            started = time.perf_counter()
+            pcm = engine.synthesize_pcm(sentence)
+            synth.append(time.perf_counter() - started)
+            audio_seconds = len(pcm) / (2 * engine.sample_rate)
+            started = time.perf_counter()
+            asyncio.run(engine.synthesize(sentence, args.audio_format))
+            encoded.append(time.perf_counter() - started)
+        rows.append({
+            "chars": len(sentence),
+            "audio_seconds": round(audio_seconds, 2),
+            "synth_p50_ms": round(percentile(synth, 50) * 1000, 1),
+            "rtf": round(percentile(synth, 50) / audio_seconds, 3) if audio_seconds else None,
+            "encoded_p50_ms": round(percentile(encoded, 50) * 1000, 1),
+        })
+
+    print(f"\n🗣️  {os.path.basename(engine.model_path)}: loaded in {load_seconds:.2f}s, "
+          f"{engine.sample_rate} Hz, 1 core")
+    print(f"{'chars':>6}{'audio s':>9}{'synth p50 ms':>14}{'RTF':>8}{f'{args.audio_format} p50 ms':>18}")
+    print("-" * 55)
+    for row in rows:
+        print(f"{row['chars']:>6}{row['audio_seconds']:>9}{row['synth_p50_ms']:>14}{str(row['rtf']):>8}"
+              f"{row['encoded_p50_ms']:>18}")
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump({"config": vars(args) | {"func": None}, "load_seconds": round(load_seconds, 3),
+                       "report": rows}, report_file, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+
+# LLM-style replies with the markup speech normalization removes
+SAMPLE_REPLIES = [
+    ("Here are the **latest AI news** this week:\n\n"
+     "1. **OpenAI** released a new model (see https://openai.com/blog/new-model?utm_source=news).\n"
+     "2. *Meta* raised $1.5B for data centers...\n"
+     "3. Nvidia stock is up ~12% vs. last week, i.e. a 3x gain since 2020-2023.\n\n"
+     "I searched the web for this (results from news.google.com and reuters.com), so details may change."),
+    ("Mohan is a Data Scientist at **Cohere Health** (a healthcare technology company). His key skills:\n"
+     "- **Machine learning**: forecasting, NLP, etc.\n- **MLOps**: deploying models with Docker & Kubernetes\n"
+     "- **Analytics**: SQL, Python (pandas, scikit-learn)\n\nYou can find more at [his profile]"
+     "(https://www.linkedin.com/in/mohan-bhosale) 🚀"),
+    "Mohan builds machine learning systems that turn clinical data into reliable predictions for care teams.",
+]
+
+# Input -> expected spoken text for the symbol rules; run_normalize reports any that drift
+SPEECH_EXAMPLES = [
+    ("He writes C# and F# services.", "He writes C sharp and F sharp services."),
+    ("## Skills\nPython, C#", "Skills. Python, C sharp"),
+    ("Ranked #1 in the league", "Ranked number 1 in the league"),
+    ("Call 555-1234 after 5 pm", "Call 555-1234 after 5 pm"),
+    ("He worked there 2020-2023.", "He worked there 2020 to 2023."),
+    ("It takes 5-10 minutes", "It takes 5 to 10 minutes"),
+    ("They won 3-2 last night", "They won 3-2 last night"),
+    ("Tag it #python", "Tag it #python"),
+    ("So 2*3=6 and 4 * 5 = 20", "So 2 times 3 equals 6 and 4 times 5 equals 20"),
+    ("- **Note**: *really* fast", "Note: really fast."),
+]
+
+
+def run_normalize(args):
+    """Characters and estimated audio seconds speech normalization removes from replies"""
+    import main as assistant_module
+
+    if args.recordings:
+        replies = [turn["response"] for session in load_sessions(args.recordings)
+                   for turn in session["turns"] if turn.get("response")]
+    else:
+        replies = SAMPLE_REPLIES
+    if not replies:
+        sys.exit("No replies found in the recordings")
+
+    mismatches = [(text, expected, assistant_module.normalize_for_speech(text))
+                  for text, expected in SPEECH_EXAMPLES
+                  if assistant_module.normalize_for_speech(text) != expected]
+    for text, expected, spoken in mismatches:
+        print(f"❌ {text!r}: expected {expected!r}, got {spoken!r}")
+    print(f"{len(SPEECH_EXAMPLES) - len(mismatches)}/{len(SPEECH_EXAMPLES)} speech examples match")
+
+    removed, costs = [], []
+    for reply in replies:
+        started = time.perf_counter()
+        spoken = assistant_module.normalize_for_speech(reply)
+        costs.append(time.perf_counter() - started)
+        removed.append(max(0, len(reply) - len(spoken)))
+        if args.show:
+            print(f"\n📝 {reply}\n🗣️  {spoken}")
+
+    total_chars = sum(len(reply) for reply in replies)
+    saved_seconds = [chars / assistant_module.SPEECH_CHARS_PER_SECOND for chars in removed]
+    print(f"\n{len(replies)} replies, {total_chars} characters: {sum(removed)} removed "
+          f"({sum(removed) / total_chars:.1%}), ~{sum(saved_seconds):.1f}s of audio not synthesized")
+    print(f"per reply: removed p50 {percentile(removed, 50):.0f} / p95 {percentile(removed, 95):.0f} chars, "
+          f"saved p50 {percentile(saved_seconds, 50):.1f}s, normalize p50 {percentile(costs, 50) * 1e6:.0f} µs")
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump({"config": vars(args) | {"func": None}, "replies": len(replies), "chars": total_chars,
+                       "removed_chars": removed, "normalize_seconds": costs}, report_file, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+
+# Queries users ask, most popular first (drawn Zipf-like), across the search cache's topic TTLs
+SEARCH_QUERIES = [
+    "latest AI news",
+    "bitcoin price today",
+    "weather in Pune today",
+    "current stock market",
+    "latest tech trends",
+    "who won the match today",
+    "recent space missions",
+    "new releases this week",
+    "how does a heat pump work",
+    "history of the Marathi language",
+    "best programming languages to learn",
+    "what is quantum computing",
+]
+
+
+def run_search_cache(args):
+    """Search latency and hit ratio: live only, cache on demand, cache with background refresh of hot topics"""
+    import contextlib
+    import random
+
+    stub_port = _free_port()
+    start_stub_server(stub_config_from_args(args), stub_port)
+    os.environ.update(stub_environment(stub_port))
+    import main as assistant_module  # after the environment points the search client at the stubs
+
+    # Compress time so a short run spans many TTLs: every interval shrinks by the same factor
+    scale = args.time_scale
+    assistant_module.SEARCH_TOPIC_TTLS = [(keywords, ttl * scale) for keywords, ttl in assistant_module.SEARCH_TOPIC_TTLS]
+    assistant_module.SEARCH_DEFAULT_TTL *= scale
+    assistant_module.SEARCH_REFRESH_TICK *= scale
+    assistant_module.SEARCH_HOT_HALF_LIFE *= scale
+    weights = [1 / rank for rank in range(1, len(SEARCH_QUERIES) + 1)]
+
+    async def measure(mode: str) -> Dict:
+        assistant_module.SEARCH_CACHE = mode != "live"
+        searcher = assistant_module.WebSearcher()
+        refresher = asyncio.create_task(searcher.run_refresher()) if mode == "cache+refresh" else None
+        cache_results = assistant_module.CACHE_REQUESTS.values
+        refreshes = assistant_module.SEARCH_REFRESHES.values
+        before = {result: cache_results.get(("search", result), 0.0) for result in ("hit", "stale", "miss")}
+        refreshes_before = sum(refreshes.values())
+        rng = random.Random(7)
+        latencies = []
+
+        async def search(query: str):
+            started = time.perf_counter()
+            await searcher.search_and_summarize(query)
+            latencies.append(time.perf_counter() - started)
+
+        tasks = []
+        deadline = time.perf_counter() + args.duration
+        while time.perf_counter() < deadline:
+            tasks.append(asyncio.create_task(search(rng.choices(SEARCH_QUERIES, weights)[0])))
+            await asyncio.sleep(rng.expovariate(args.rate))
+        await asyncio.gather(*tasks)
+        if refresher:
+            refresher.cancel()
+
+        counts = {result: cache_results.get(("search", result), 0.0) - before[result] for result in before}
+        served = sum(counts.values()) or 1
+        return {
+            "mode": mode,
+            "searches": len(latencies),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "hit_ratio": round((counts["hit"] + counts["stale"]) / served, 3) if mode != "live" else 0.0,
+            "stale_ratio": round(counts["stale"] / served, 3) if mode != "live" else 0.0,
+            "background_refreshes": int(sum(refreshes.values()) - refreshes_before),
+        }
+
+    rows = []
+    for mode in ("live", "cache", "cache+refresh"):
+        with contextlib.redirect_stdout(sys.stdout if args.app_logs else io.StringIO()):
+            rows.append(asyncio.run(measure(mode)))
+
+    print(f"\n{'mode':<16}{'searches':>10}{'p50 ms':>10}{'p95 ms':>10}{'hit ratio':>11}{'stale':>8}{'refreshes':>11}")
+    print("-" * 76)
+    for row in rows:
+        print(f"{row['mode']:<16}{row['searches']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+              f"{row['hit_ratio']:>11}{row['stale_ratio']:>8}{row['background_refreshes']:>11}")
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump({"config": vars(args) | {"func": None}, "report": rows}, report_file, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+
+def run_groq_limits(args):
+    """Voice turns and a background batch job under Groq rate limits, unpaced vs the rate-limit scheduler"""
+    import contextlib
+    import random
+
+    stub_config = stub_config_from_args(args)
+    stub_port = _free_port()
+    start_stub_server(stub_config, stub_port)
+    os.environ.update(stub_environment(stub_port))
+    import main as assistant_module  # after the environment points the SDK clients at the stubs
+
+    clip = make_test_audio(2.0)
+    whisper_stub = StubWhisper(stub_config)
+
+    async def measure(mode: str) -> Dict:
+        assistant = assistant_module.VoiceAssistant()
+        assistant.groq_limits.enabled = mode == "scheduler"
+        # Groq's model fallbacks end at CPU Whisper, as in production
+        assistant.local_stt = assistant_module.LocalWhisperClient(backend="inprocess", transcriber=whisper_stub.transcribe)
+        waits = assistant_module.GROQ_QUEUE_WAIT.series
+        limited = assistant_module.GROQ_RATE_LIMITED.values
+        before_limited = dict(limited)
+        before_waits = {key: dict(series) for key, series in waits.items()}
+        rng = random.Random(11)
+        stt_times, turn_times, outcomes, batch_done = [], [], {"ok": 0, "busy": 0, "error": 0}, [0]
+        deadline = time.perf_counter() + args.duration
+
+        async def turn():
+            started = time.perf_counter()
+            text = await assistant.speech_to_text(clip)
+            stt_times.append(time.perf_counter() - started)
+            try:
+                reply = await assistant.generate_response(text or "Tell me about Mohan's current role")
+                outcomes["error" if reply == assistant_module.LLM_ERROR_REPLY else "ok"] += 1
+            except assistant_module.CapacityExceeded:
+                outcomes["busy"] += 1
+            turn_times.append(time.perf_counter() - started)
+
+        async def batch_worker():
+            assistant_module._groq_priority.set("background")
+            while time.perf_counter() < deadline:
+                await assistant.speech_to_text(clip)
+                batch_done[0] += 1
+
+        workers = [asyncio.create_task(batch_worker()) for _ in range(args.batch_workers)]
+        turns = []
+        while time.perf_counter() < deadline:
+            turns.append(asyncio.create_task(turn()))
+            await asyncio.sleep(rng.expovariate(args.turn_rate))
+        await asyncio.gather(*turns, *workers)
+
+        def mean_wait(priority: str) -> Optional[float]:
+            total = count = 0.0
+            for key, series in waits.items():
+                if key[1] == priority:
+                    old = before_waits.get(key, {"sum": 0.0, "count": 0})
+                    total += series["sum"] - old["sum"]
+                    count += series["count"] - old["count"]
+            return round(total / count * 1000, 1) if count else None
+
+        def limited_count(reason: str) -> int:
+            return int(sum(value - before_limited.get(key, 0.0) for key, value in limited.items() if key[1] == reason))
+
+        return {
+            "mode": mode,
+            "turns": len(turn_times),
+            "stt_p50_ms": round(percentile(stt_times, 50) * 1000, 1),
+            "stt_p95_ms": round(percentile(stt_times, 95) * 1000, 1),
+            "turn_p50_ms": round(percentile(turn_times, 50) * 1000, 1),
+            "turn_p95_ms": round(percentile(turn_times, 95) * 1000, 1),
+            "llm_ok": outcomes["ok"], "llm_busy": outcomes["busy"], "llm_error": outcomes["error"],
+            "batch_clips": batch_done[0],
+            "refused_429": limited_count("429"),
+            "shed": limited_count("shed"),
+            "interactive_wait_ms": mean_wait("interactive"),
+            "background_wait_ms": mean_wait("background"),
+        }
+
+    rows = []
+    for mode in ("unpaced", "scheduler"):
+        with contextlib.redirect_stdout(sys.stdout if args.app_logs else io.StringIO()):
+            rows.append(asyncio.run(measure(mode)))
+
+    print(f"\n{'mode':<11}{'turns':>6}{'STT p50':>9}{'STT p95':>9}{'turn p50':>10}{'turn p95':>10}"
+          f"{'ok/busy/err':>13}{'batch':>7}{'429s':>6}{'shed':>6}{'wait ms int/bg':>16}")
+    print("-" * 103)
+    for row in rows:
+        outcomes = f"{row['llm_ok']}/{row['llm_busy']}/{row['llm_error']}"
+        waits = f"{row['interactive_wait_ms']}/{row['background_wait_ms']}"
+        print(f"{row['mode']:<11}{row['turns']:>6}{row['stt_p50_ms']:>9}{row['stt_p95_ms']:>9}{row['turn_p50_ms']:>10}"
+              f"{row['turn_p95_ms']:>10}{outcomes:>13}{row['batch_clips']:>7}{row['refused_429']:>6}"
+              f"{row['shed']:>6}{waits:>16}")
+    print("(429s counts refusals after the Groq SDK's own retries; STT falls back to the next model, then CPU Whisper)")
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump({"config": vars(args) | {"func": None}, "report": rows}, report_file, indent=2)
+        print(f"💾 Wrote {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Voice assistant performance benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    imports_parser = subparsers.add_parser("imports", help="Import-time profile of main.py")
+    imports_parser.add_argument("--top", type=int, default=25, help="Slowest imports to list")
+    imports_parser.add_argument("--json", help="Write the full report to this file")
+    imports_parser.set_defaults(func=run_imports)
+
+    e2e_parser = subparsers.add_parser("e2e", help="Offline end-to-end latency/throughput benchmark")
+    e2e_parser.add_argument("--clients", type=int, default=8, help="Concurrent simulated users")
+    e2e_parser.add_argument("--turns", type=int, default=5, help="Questions per user")
+    e2e_parser.add_argument("--think-time", type=float, default=0.5, help="Seconds between a user's turns")
+    e2e_parser.add_argument("--audio", nargs="*", help="Recorded clips to send (default: synthetic speech)")
+    e2e_parser.add_argument("--audio-format", help="TTS format to negotiate (opus, mp3-48k, mp3-96k, pcm)")
+    e2e_parser.add_argument("--stub-port", type=int, default=0)
+    e2e_parser.add_argument("--app-port", type=int, default=0)
+    e2e_parser.add_argument("--app-logs", action="store_true", help="Show the app's console output")
+    e2e_parser.add_argument("--json", help="Write the report to this file (for CI comparisons)")
+    add_stub_arguments(e2e_parser)
+    e2e_parser.set_defaults(func=run_e2e)
+
+    replay_parser = subparsers.add_parser("replay", help="Replay recorded sessions for capacity planning")
+    replay_parser.add_argument("recordings", nargs="+", help="*.session.gz files or directories of them")
+    replay_parser.add_argument("--speedup", type=float, default=1.0,
+                               help="Compress session arrivals and turn gaps by this factor")
+    replay_parser.add_argument("--concurrency", type=int, default=50, help="Maximum simultaneous sessions")
+    replay_parser.add_argument("--mix", choices=("all", "search", "long"), default="all",
+                               help="Replay every session, only search-heavy ones, or only long answers")
+    replay_parser.add_argument("--long-chars", type=int, default=600, help="Answer length counted as long")
+    replay_parser.add_argument("--loop", type=int, default=1, help="Repeat the recorded traffic N times")
+    replay_parser.add_argument("--audio-format", help="Override the recorded TTS format")
+    replay_parser.add_argument("--target", help="WebSocket URL of a deployment (default: local stubbed app)")
+    replay_parser.add_argument("--app-logs", action="store_true", help="Show the local app's console output")
+    replay_parser.add_argument("--json", help="Write the report to this file")
+    add_stub_arguments(replay_parser)
+    replay_parser.set_defaults(func=run_replay)
+
+    ttfa_parser = subparsers.add_parser("ttfa", help="Time-to-first-audio vs reply length")
+    ttfa_parser.add_argument("--reply-lengths", type=int, nargs="+",
+                             default=[15, 60, 150, 300], help="Reply lengths in words")
+    ttfa_parser.add_argument("--turns", type=int, default=5, help="Turns per reply length and mode")
+    ttfa_parser.add_argument("--parallelism", type=int, default=3, help="TTS_PARALLELISM for the sentence mode")
+    ttfa_parser.add_argument("--audio-format", help="TTS format to negotiate")
+    ttfa_parser.add_argument("--app-logs", action="store_true", help="Show the apps' console output")
+    ttfa_parser.add_argument("--json", help="Write the report to this file")
+    add_stub_arguments(ttfa_parser)
+    ttfa_parser.set_defaults(func=run_ttfa)
+
+    pool_parser = subparsers.add_parser("edge-pool", help="Edge TTS connection pool against per-request connects")
+    pool_parser.add_argument("--pool-size", type=int, default=6, help="EDGE_TTS_POOL_SIZE for the pooled mode")
+    pool_parser.add_argument("--clients", type=int, default=4, help="Concurrent simulated users")
+    pool_parser.add_argument("--turns", type=int, default=5, help="Questions per user")
+    pool_parser.add_argument("--think-time", type=float, default=0.5, help="Seconds between a user's turns")
+    pool_parser.add_argument("--audio-format", help="TTS format to negotiate")
+    pool_parser.add_argument("--app-logs", action="store_true", help="Show the apps' console output")
+    pool_parser.add_argument("--json", help="Write the report to this file")
+    add_stub_arguments(pool_parser)
+    pool_parser.set_defaults(func=run_edge_pool)
+
+    prewarm_parser = subparsers.add_parser("prewarm", help="First-turn latency with and without pre-warming")
+    prewarm_parser.add_argument("--sessions", type=int, default=5, help="Sequential sessions per mode")
+    prewarm_parser.add_argument("--turns", type=int, default=3, help="Questions per session")
+    prewarm_parser.add_argument("--speaking-time", type=float, default=2.0,
+                                help="Seconds the user speaks before each question is sent")
+    prewarm_parser.add_argument("--session-gap", type=float, default=8.0,
+                                help="Idle seconds between sessions, letting connections go cold")
+    prewarm_parser.add_argument("--audio-format", help="TTS format to negotiate")
+    prewarm_parser.add_argument("--app-logs", action="store_true", help="Show the apps' console output")
+    prewarm_parser.add_argument("--json", help="Write the report to this file")
+    add_stub_arguments(prewarm_parser)
+    # Model a TTS service that drops sockets left idle between sparse sessions
+    prewarm_parser.set_defaults(func=run_prewarm, edge_idle_timeout_s=5.0)
+
+    upload_parser = subparsers.add_parser("stt-upload", help="STT upload size and latency per upload encoding")
+    upload_parser.add_argument("--audio", nargs="*", help="Recorded clips (default: synthetic sample recordings)")
+    upload_parser.add_argument("--formats", nargs="+", default=["original", "wav", "flac", "opus"],
+                               help="STT_UPLOAD_FORMAT values to compare")
+    upload_parser.add_argument("--repeats", type=int, default=5, help="STT calls per clip and format")
+    upload_parser.add_argument("--app-logs", action="store_true", help="Show the assistant's console output")
+    upload_parser.add_argument("--json", help="Write the report to this file")
+    add_stub_arguments(upload_parser)
+    # A short-lived HTTPS upload rarely reaches line rate (TCP slow start), so model a modest effective rate
+    upload_parser.set_defaults(func=run_stt_upload, stt_upload_kbps=8000.0)
+
+    stream_parser = subparsers.add_parser("stream-stt",
+                                          help="Local Whisper endpoint latency: finished clip vs streamed partials")
+    stream_parser.add_argument("--seconds", type=float, nargs="+", default=[3.0, 6.0, 10.0],
+                               help="Utterance lengths to speak (in real time)")
+    stream_parser.add_argument("--repeats", type=int, default=3, help="Utterances per length")
+    stream_parser.add_argument("--app-logs", action="store_true", help="Show the assistant's console output")
+    stream_parser.add_argument("--json", help="Write the report to this file")
+    add_stub_arguments(stream_parser)
+    stream_parser.set_defaults(func=run_stream_stt)
+
+    local_tts_parser = subparsers.add_parser("local-tts", help="Local CPU TTS real-time factor on one core")
+    local_tts_parser.add_argument("--model", help="Piper .onnx voice (default: LOCAL_TTS_MODEL)")
+    local_tts_parser.add_argument("--audio-format", default="mp3-48k", help="Encoding timed end to end")
+    local_tts_parser.add_argument("--repeats", type=int, default=5, help="Syntheses per sentence")
+    local_tts_parser.add_argument("--json", help="Write the report to this file")
+    local_tts_parser.set_defaults(func=run_local_tts)
+
+    normalize_parser = subparsers.add_parser("normalize", help="Text speech normalization removes before TTS")
+    normalize_parser.add_argument("recordings", nargs="*",
+                                  help="*.session.gz files or directories (default: built-in sample replies)")
+    normalize_parser.add_argument("--show", action="store_true", help="Print each reply and its spoken form")
+    normalize_parser.add_argument("--json", help="Write the report to this file")
+    normalize_parser.set_defaults(func=run_normalize)
+
+    search_parser = subparsers.add_parser("search-cache",
+                                          help="Search latency with live searches, the cache, and background refresh")
+    search_parser.add_argument("--duration", type=float, default=30.0, help="Seconds of traffic per mode")
+    search_parser.add_argument("--rate", type=float, default=4.0, help="Searches per second (Poisson arrivals)")
+    search_parser.add_argument("--time-scale", type=float, default=0.02,
+                               help="Multiplier on cache TTLs, refresh tick and popularity half-life")
+    search_parser.add_argument("--app-logs", action="store_true", help="Show the assistant's console output")
+    search_parser.add_argument("--json", help="Write the report to this file")
+    add_stub_arguments(search_parser)
+    search_parser.set_defaults(func=run_search_cache)
+
+    limits_parser = subparsers.add_parser("groq-limits",
+                                          help="Voice turns and batch work under Groq rate limits, with and "
+                                               "without the scheduler")
+    limits_parser.add_argument("--duration", type=float, default=60.0, help="Seconds of traffic per mode")
+    limits_parser.add_argument("--turn-rate", type=float, default=0.25, help="Voice turns per second (Poisson)")
+    limits_parser.add_argument("--batch-workers", type=int, default=2,
+                               help="Concurrent background batch transcriptions")
+    limits_parser.add_argument("--app-logs", action="store_true", help="Show the assistant's console output")
+    limits_parser.add_argument("--json", help="Write the report to this file")
+    add_stub_arguments(limits_parser)
+    # A free-tier-like budget per model, well below what the batch job alone would use
+    limits_parser.set_defaults(func=run_groq_limits, groq_rpm=30.0, groq_tpm=6000.0)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,44 +7,106 @@ Author: Mohan Bhosale
 Technologies: Groq API, Modal, FastAPI, WebSocket, Whisper, Edge TTS
 """
 
+from __future__ import annotations
+
 import modal
 import json
 import asyncio
 import base64
+import contextvars
+import functools
+import gzip
+import hashlib
+import heapq
+import itertools
 import os
-from typing import Optional, Dict, List
-
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
-from groq import Groq
-import openai
-
-# Modal image configuration with required dependencies
-image = modal.Image.debian_slim().pip_install([
-    "fastapi[all]==0.104.1",
-    "websockets==12.0",
-    "groq==0.4.1",
-    "openai==1.3.8",
-    "python-multipart==0.0.6",
-    "aiofiles==23.2.1",
-    "requests==2.31.0",
-    "torch==2.1.0",
-    "transformers==4.35.2",
-    "datasets[audio]==2.14.6",
-    "librosa==0.10.1",
-    "soundfile==0.12.1",
-    "edge-tts==6.1.9",
-    "whisper==1.1.10",
-    "torchaudio==2.1.0",
-    "numpy==1.24.3",
-    "scipy==1.11.4",
-    "beautifulsoup4==4.12.2",
-    "duckduckgo-search==3.9.6",
-    "httpx==0.24.1",
-])
+import queue
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Dict, List, Set, Tuple, Union
+
+# In-process CPU TTS voice (Piper), baked into the gateway image and loaded once per container.
+# "fallback" speaks when Edge and OpenAI TTS both fail (instead of a beep), "first" also speaks each
+# reply's first sentence without a network round trip (in a different voice from the rest), "off"
+# disables it and keeps Piper and onnxruntime out of the gateway image.
+LOCAL_TTS_MODE = os.getenv("LOCAL_TTS_MODE", "fallback")
+LOCAL_TTS_VOICE = os.getenv("LOCAL_TTS_VOICE", "en_US-lessac-low")
+LOCAL_TTS_DIR = os.getenv("LOCAL_TTS_DIR", "/models/piper")
+_PIPER_VOICES_URL = "https://huggingface.co/rhasspy/piper-voices/resolve/v1.0.0"
+
+
+def _download_piper_voice():
+    """Fetch the LOCAL_TTS_VOICE model and config into LOCAL_TTS_DIR (image build step)"""
+    import urllib.request
+    
+    language, speaker, quality = LOCAL_TTS_VOICE.split("-")
+    os.makedirs(LOCAL_TTS_DIR, exist_ok=True)
+    for suffix in (".onnx", ".onnx.json"):
+        url = f"{_PIPER_VOICES_URL}/{language.split('_')[0]}/{language}/{speaker}/{quality}/{LOCAL_TTS_VOICE}{suffix}"
+        urllib.request.urlretrieve(url, os.path.join(LOCAL_TTS_DIR, LOCAL_TTS_VOICE + suffix))
+
+
+# Slim gateway image: only what the default path (Groq STT + LLM, Edge TTS, web search) imports,
+# plus ffmpeg so the speech gate can decode browser WebM/Opus clips. torch and Whisper live in
+# whisper_image and are only pulled in by the fallback worker below.
+api_image = (
+    modal.Image.debian_slim()
+    .apt_install("ffmpeg")
+    .pip_install([
+        "fastapi[all]==0.104.1",
+        "websockets==12.0",
+        "groq==0.9.0",
+        "openai==1.3.8",
+        "python-multipart==0.0.6",
+        "aiofiles==23.2.1",
+        "requests==2.31.0",
+        "soundfile==0.12.1",
+        "edge-tts==6.1.9",
+        "numpy==1.24.3",
+        "beautifulsoup4==4.12.2",
+        "duckduckgo-search==3.9.6",
+        "httpx==0.24.1",
+    ])
+    .env({"LOCAL_TTS_MODE": LOCAL_TTS_MODE})
+)
+if LOCAL_TTS_MODE != "off":
+    # A small Piper voice for the local TTS fallback. The voice baked in is the one containers load
+    # (Modal does not forward the deploy environment)
+    api_image = (
+        api_image
+        .pip_install(["piper-tts==1.2.0", "onnxruntime==1.16.3"])
+        .env({"LOCAL_TTS_VOICE": LOCAL_TTS_VOICE, "LOCAL_TTS_DIR": LOCAL_TTS_DIR})
+        .run_function(_download_piper_voice)
+    )
+
+# Heavy image for the local Whisper fallback worker; model weights are baked in at build time
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "base")
+whisper_image = (
+    modal.Image.debian_slim()
+    .apt_install("ffmpeg")
+    .pip_install([
+        "openai-whisper==20231117",
+        "torch==2.1.0",
+        "numpy==1.24.3",
+    ])
+    .run_commands(f"python -c \"import whisper; whisper.load_model('{LOCAL_WHISPER_MODEL}')\"")
+    # Containers load the model baked in above rather than re-reading an unset variable ("base")
+    .env({"LOCAL_WHISPER_MODEL": LOCAL_WHISPER_MODEL})
+)
 
 # Create Modal app
-app = modal.App("mohan-voice-assistant", image=image)
+app = modal.App("mohan-voice-assistant", image=api_image)
+
+# Gateway-only imports; skipped inside the Whisper worker container
+with api_image.imports():
+    from fastapi import Body, FastAPI, File, Header, HTTPException, UploadFile, WebSocket, WebSocketDisconnect
+    from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 
 # Import context from external file (kept private)
 try:
@@ -63,513 +125,4037 @@ except ImportError:
     """
     print("⚠️  Personal context file not found. Using fallback context.")
 
+# Provider endpoint overrides for pointing the app at local stub servers (see benchmark.py).
+# Groq and OpenAI SDKs read GROQ_BASE_URL / OPENAI_BASE_URL themselves.
+EDGE_TTS_URL = os.getenv("EDGE_TTS_URL", "")
+SEARCH_API_URL = os.getenv("SEARCH_API_URL", "")
+
+# Web search summaries are cached in memory per container, fresh for a TTL set by how volatile the
+# topic is. The most requested queries are re-searched in the background before they expire, so hot
+# topics ("ai news", "bitcoin price") never wait on a live search in a turn.
+SEARCH_CACHE = os.getenv("SEARCH_CACHE", "1") == "1"
+SEARCH_CACHE_SIZE = 256
+SEARCH_HOT_TOPICS = int(os.getenv("SEARCH_HOT_TOPICS", "10"))  # Queries kept fresh in the background
+SEARCH_HOT_MIN_REQUESTS = 2.0   # Decayed request count before a query is refreshed in the background...
+SEARCH_HOT_HALF_LIFE = 3600.0   # ...which halves every this many seconds, so forgotten topics stop refreshing
+SEARCH_REFRESH_TICK = 15.0      # Seconds between background refresh passes
+SEARCH_REFRESH_AHEAD = 0.8      # Hot entries are refreshed once this fraction of their TTL has passed
+SEARCH_STALE_FACTOR = 2.0       # Expired entries up to this many TTLs old are served while refreshing
+SEARCH_RETRY_BASE = 60.0        # Background refreshes of a query that failed or found nothing wait this long,
+SEARCH_RETRY_MAX = 3600.0       # doubling per consecutive failure up to this, instead of retrying every tick
+# Freshness in seconds by topic, most volatile first; the first group with a keyword in the query wins
+SEARCH_TOPIC_TTLS = [
+    (("price", "stock", "market", "crypto", "bitcoin"), 120),
+    (("breaking", "today", "happening now", "news"), 600),
+    (("latest", "recent", "current", "this week", "update", "trending", "new releases"), 1800),
+]
+SEARCH_DEFAULT_TTL = 3600
+
+# Open provider connections when a session connects, while the user is still speaking its first question
+PREWARM_ON_ACCEPT = os.getenv("PREWARM_ON_ACCEPT", "1") == "1"
+# Idle provider HTTP connections are kept this long (httpx's 5s default is shorter than a spoken question)
+PROVIDER_KEEPALIVE_SECONDS = 60.0
+
+# TTS output formats a client can negotiate ("hello" message), each requested natively from the
+# backends instead of transcoding. bytes_per_second is the approximate size of one second of speech;
+# "local" is the ffmpeg encoding of local TTS output (None: WAV at the voice's own rate).
+AUDIO_FORMATS = {
+    "opus": {"edge": "webm-24khz-16bit-mono-opus", "openai": "opus", "bytes_per_second": 3000,
+             "local": ["-c:a", "libopus", "-b:a", "24k", "-f", "webm"]},
+    "mp3-48k": {"edge": "audio-24khz-48kbitrate-mono-mp3", "openai": "mp3", "bytes_per_second": 6000,
+                "local": ["-c:a", "libmp3lame", "-b:a", "48k", "-f", "mp3"]},
+    "mp3-96k": {"edge": "audio-24khz-96kbitrate-mono-mp3", "openai": "mp3", "bytes_per_second": 12000,
+                "local": ["-c:a", "libmp3lame", "-b:a", "96k", "-f", "mp3"]},
+    "pcm": {"edge": "riff-24khz-16bit-mono-pcm", "openai": "wav", "bytes_per_second": 48000, "local": None},
+}
+DEFAULT_AUDIO_FORMAT = "mp3-48k"
+
+# Edge readaloud voice and the browser version its Sec-MS-GEC token claims
+EDGE_TTS_VOICE = "Microsoft Server Speech Text to Speech Voice (en-US, AriaNeural)"
+EDGE_CHROMIUM_VERSION = "130.0.2849.68"
+EDGE_TTS_TIMEOUT = 20.0
+# Warm Edge connections kept per container (0 connects per request). Idle ones are pinged every
+# EDGE_TTS_PING_INTERVAL seconds and dropped if the pong does not come back in as long.
+EDGE_TTS_POOL_SIZE = int(os.getenv("EDGE_TTS_POOL_SIZE", "6"))
+EDGE_TTS_PING_INTERVAL = 20.0
+
+# Local CPU TTS (Piper) in the gateway process (see LOCAL_TTS_MODE above). Synthesis is limited to
+# LOCAL_TTS_THREADS cores and one sentence at a time, so it cannot starve the event loop.
+LOCAL_TTS_MODEL = os.getenv("LOCAL_TTS_MODEL", os.path.join(LOCAL_TTS_DIR, f"{LOCAL_TTS_VOICE}.onnx"))
+LOCAL_TTS_THREADS = int(os.getenv("LOCAL_TTS_THREADS", "1"))
+
+# Replies are spoken sentence by sentence: the first sentence is synthesized immediately and the rest
+# share TTS_PARALLELISM concurrent synthesis calls per turn. 0 synthesizes the whole reply in one call.
+TTS_PARALLELISM = int(os.getenv("TTS_PARALLELISM", "3"))
+MIN_SENTENCE_CHARS = 40  # Shorter sentences (after the first) are merged to avoid choppy playback
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Replies are rewritten into what a listener should hear before TTS: markdown, URLs, parentheticals and
+# symbols are not read out, so no synthesis time or audio is spent on them
+SPEECH_NORMALIZE = os.getenv("SPEECH_NORMALIZE", "1") == "1"
+SPEECH_CHARS_PER_SECOND = 15.0  # Speaking rate for converting removed characters to audio seconds saved
+_SPEECH_ABBREVIATIONS = [
+    (re.compile(r"\be\.g\.,?", re.I), "for example,"),
+    (re.compile(r"\bi\.e\.,?", re.I), "that is,"),
+    (re.compile(r"\betc\.(?=\s+[A-Z]|\s*$)"), "and so on."),
+    (re.compile(r"\betc\."), "and so on"),
+    (re.compile(r"\bvs\.?(?=\s)", re.I), "versus"),
+    (re.compile(r"\bapprox\.(?=\s)", re.I), "approximately"),
+    (re.compile(r"\bw/(?=\s)"), "with"),
+    (re.compile(r"\bDr\.(?=\s+[A-Z])"), "Doctor"),
+    (re.compile(r"\b([CF])#(?![\w#])"), r"\1 sharp"),
+]
+_SPEECH_MAGNITUDES = {"k": "thousand", "m": "million", "mm": "million", "b": "billion", "bn": "billion",
+                      "t": "trillion"}
+_SPEECH_CURRENCIES = {"$": "dollars", "€": "euros", "£": "pounds"}
+
+# Cheap speech gate on decoded PCM before any paid STT call: silent, noise-only and too-short clips are
+# rejected in the container, and leading/trailing silence is trimmed from what gets uploaded
+SPEECH_GATE = os.getenv("SPEECH_GATE", "1") == "1"
+GATE_FRAME_MS = 30
+GATE_SILENCE_DBFS = -45.0         # Frames quieter than this (RMS, dB full scale) are silence
+GATE_NOISE_MARGIN_DB = 6.0        # Speech frames must also stand this far above the clip's noise floor
+GATE_MAX_FLATNESS = 0.4           # Flatter spectra are broadband noise (white noise is ~0.56, vowels < 0.1)
+GATE_MIN_SPEECH_SECONDS = 0.3     # Less detected speech than this is not worth an STT call
+GATE_MIN_SPEECH_RATIO = 0.05      # Long clips with only stray speech-like frames are noise
+GATE_TRIM_PADDING_SECONDS = 0.25  # Audio kept either side of the detected speech
+
+# Clips are downmixed and resampled to Whisper's native 16 kHz mono, then re-encoded for STT upload:
+# "opus" (smallest; ffmpeg's libopus, FLAC without ffmpeg), "flac" (lossless), "wav" or "original"
+# (forward the client's bytes). Whatever is picked, the client's bytes are sent if they are smaller.
+STT_UPLOAD_FORMAT = os.getenv("STT_UPLOAD_FORMAT", "opus")
+STT_SAMPLE_RATE = 16000
+STT_OPUS_BITRATE = "24k"  # Speech-tuned Opus; transparent for Whisper at a fraction of the browser's 128k
+# Largest clip accepted for STT, per voice turn and per /api/transcribe file (about 10 minutes of
+# browser Opus, several times STREAM_MAX_SECONDS of streamed PCM)
+MAX_AUDIO_BYTES = int(os.getenv("MAX_AUDIO_BYTES", str(10 * 1024 * 1024)))
+
+# Streaming local STT: the client streams 16 kHz PCM while the user speaks and local Whisper re-decodes
+# the uncommitted audio every STREAM_STEP_SECONDS, sending "transcription_partial" messages. Segments two
+# consecutive decodes agree on are committed, so the decode at the endpoint only covers the last few seconds.
+STREAMING_STT = os.getenv("STREAMING_STT", "0") == "1"
+STREAM_STEP_SECONDS = 1.0     # New audio between partial decodes (skipped while every worker is busy)
+STREAM_WINDOW_SECONDS = 15.0  # Uncommitted audio beyond this is committed from the latest hypothesis
+STREAM_MAX_SECONDS = 120.0    # Audio buffered per turn; later chunks are dropped
+STREAM_PROMPT_CHARS = 200     # Committed text passed back to Whisper as context for the next window
+
+# Session recording for replay load tests (benchmark.py replay). Off unless set, since it stores
+# users' raw audio and the assistant's answers on disk.
+SESSION_RECORD_DIR = os.getenv("SESSION_RECORD_DIR", "")
+
+# Fixed assistant phrases, rendered to audio once (at image build, or at startup for anything new)
+# and played from memory instead of going through TTS on every use
+STATIC_PHRASES = {
+    "greeting": ("Hi! I'm Jackie, Mohan's AI assistant. I can tell you about his experience as a Data Scientist, "
+                 "his current work at Cohere Health, technical skills, and achievements. You can also ask me about "
+                 "current AI and tech trends!"),
+    "unclear_audio": ("I didn't catch that clearly. Could you please speak a bit louder and more clearly? "
+                      "I'm here to answer any questions about Mohan's experience in data science!"),
+}
+STATIC_AUDIO_DIR = os.getenv("STATIC_AUDIO_DIR", os.path.join(os.path.expanduser("~"), ".cache", "static_audio"))
+# Spoken (and returned) when the LLM call fails
+LLM_ERROR_REPLY = ("I apologize, but I'm having trouble processing that request right now. "
+                   "However, I'd be happy to tell you about Mohan's experience in data science "
+                   "and his current work at Cohere Health. Could you please try asking your question again?")
+
+# Text-only REST API (/api/chat, /api/transcribe) for integrations that do not need the voice loop
+API_MAX_MESSAGE_CHARS = 2000
+API_MAX_BATCH_FILES = int(os.getenv("API_MAX_BATCH_FILES", "50"))
+# Total audio per /api/transcribe request; each file is also capped at MAX_AUDIO_BYTES
+API_MAX_BATCH_BYTES = int(os.getenv("API_MAX_BATCH_BYTES", str(64 * 1024 * 1024)))
+API_MULTIPART_OVERHEAD = 1024  # Body bytes allowed per file on top of its audio (part headers, boundary)
+# Clips of one batch request transcribed at once; all requests also share the "stt" stage limit
+API_BATCH_CONCURRENCY = int(os.getenv("API_BATCH_CONCURRENCY", "4"))
+
 # Store active WebSocket connections
 active_connections: Dict[int, WebSocket] = {}
 
+# Per-connection pipeline queues: a slow client backs up its own turn instead of buffering without limit
+INBOUND_QUEUE_SIZE = 4
+OUTBOUND_QUEUE_SIZE = 32
 
-class WebSearcher:
-    """Handles web search functionality using DuckDuckGo API"""
+# Seconds without any client message (the page pings every 15s) before a connection is dropped
+HEARTBEAT_TIMEOUT = 45.0
+
+# Per-container capacity. MAX_ACTIVE_SESSIONS also sets Modal's allow_concurrent_inputs, so a
+# burst spills onto new containers instead of degrading every conversation on this one.
+MAX_ACTIVE_SESSIONS = int(os.getenv("MAX_ACTIVE_SESSIONS", "10"))
+MAX_CONTAINERS = int(os.getenv("MAX_CONTAINERS", "10"))
+STAGE_CONCURRENCY = {
+    "stt": int(os.getenv("STT_CONCURRENCY", "4")),
+    "llm": int(os.getenv("LLM_CONCURRENCY", "6")),
+    # Concurrent syntheses, not turns: a reply runs up to 1 + TTS_PARALLELISM sentences at once
+    "tts": int(os.getenv("TTS_CONCURRENCY", "16")),
+    "search": int(os.getenv("SEARCH_CONCURRENCY", "3")),
+}
+# Turns already waiting on a saturated stage before new ones are rejected with a retry hint
+MAX_STAGE_QUEUE_DEPTH = int(os.getenv("MAX_STAGE_QUEUE_DEPTH", "8"))
+# Modal does not pass the deploy shell's environment into containers, so the capacity settings
+# resolved at deploy time are set on the gateway image: Modal's routing and the AdmissionController
+# inside each container then read the same values
+CAPACITY_ENV = {
+    "MAX_ACTIVE_SESSIONS": str(MAX_ACTIVE_SESSIONS),
+    "MAX_CONTAINERS": str(MAX_CONTAINERS),
+    **{f"{stage.upper()}_CONCURRENCY": str(limit) for stage, limit in STAGE_CONCURRENCY.items()},
+    "MAX_STAGE_QUEUE_DEPTH": str(MAX_STAGE_QUEUE_DEPTH),
+}
+RETRY_AFTER_SECONDS = 5
+
+
+class CapacityExceeded(Exception):
+    """Raised when a pipeline stage is saturated and its wait queue is full"""
     
-    def __init__(self):
-        """Initialize web search capabilities"""
-        pass
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(f"{stage} stage at capacity, retry in {retry_after}s")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounds concurrent sessions and per-stage work (STT, LLM, TTS, search) in one container"""
     
-    async def search_web(self, query: str, max_results: int = 5) -> List[Dict]:
+    def __init__(self,
+                 max_sessions: int = MAX_ACTIVE_SESSIONS,
+                 stage_limits: Optional[Dict[str, int]] = None,
+                 max_queue_depth: int = MAX_STAGE_QUEUE_DEPTH,
+                 retry_after: int = RETRY_AFTER_SECONDS):
         """
-        Search the web using DuckDuckGo
+        Initialize admission limits
         
         Args:
-            query: Search query string
-            max_results: Maximum number of results to return
-            
-        Returns:
-            List of search results with title, url, snippet, and source
+            max_sessions: Maximum concurrent WebSocket sessions
+            stage_limits: Concurrent calls allowed per pipeline stage
+            max_queue_depth: Waiters allowed per saturated stage before rejecting
+            retry_after: Seconds suggested to rejected clients before retrying
         """
-        try:
-            from duckduckgo_search import DDGS
-            
-            print(f"🔍 Searching web for: '{query}'")
-            
-            with DDGS() as ddgs:
-                results = []
-                search_results = ddgs.text(query, max_results=max_results)
-                
-                for result in search_results:
-                    results.append({
-                        'title': result.get('title', ''),
-                        'url': result.get('href', ''),
-                        'snippet': result.get('body', ''),
-                        'source': result.get('href', '').split('/')[2] if result.get('href') else ''
-                    })
-                
-                print(f"✅ Found {len(results)} search results")
-                return results
-                
-        except Exception as e:
-            print(f"❌ Web search failed: {e}")
-            return []
+        self.max_sessions = max_sessions
+        self.max_queue_depth = max_queue_depth
+        self.retry_after = retry_after
+        self.semaphores = {name: asyncio.Semaphore(limit)
+                           for name, limit in (stage_limits or STAGE_CONCURRENCY).items()}
+        self.waiting = {name: 0 for name in self.semaphores}
     
-    async def get_page_content(self, url: str, max_chars: int = 2000) -> str:
+    def admit_session(self) -> bool:
+        """Check whether another WebSocket session fits in this container"""
+        return len(active_connections) < self.max_sessions
+    
+    def stage_free(self, name: str) -> bool:
+        """Check whether a stage has a slot free right now, for work that should never queue"""
+        return not self.semaphores[name].locked()
+    
+    @asynccontextmanager
+    async def stage(self, name: str, reject_when_full: bool = True):
         """
-        Fetch and extract text content from a webpage
+        Hold a concurrency slot for a pipeline stage
         
         Args:
-            url: URL to fetch content from
-            max_chars: Maximum characters to return
+            name: Stage name ("stt", "llm", "tts" or "search")
+            reject_when_full: Raise when the queue is full; False waits regardless, for work a
+                turn already committed to (the rest of a reply that has started playing)
             
+        Raises:
+            CapacityExceeded: If the stage is saturated and its queue is full
+        """
+        semaphore = self.semaphores[name]
+        if reject_when_full and semaphore.locked() and self.waiting[name] >= self.max_queue_depth:
+            raise CapacityExceeded(name, self.retry_after)
+        
+        self.waiting[name] += 1
+        queued_at = time.perf_counter()
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting[name] -= 1
+        trace_annotate(**{f"{name}_queue_wait_ms": round((time.perf_counter() - queued_at) * 1000, 2)})
+        
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+def admitted(stage: str):
+    """Decorate a VoiceAssistant coroutine so it runs inside an admission stage slot"""
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            async with self.admission.stage(stage):
+                return await method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Per-turn tracing: "none", "jsonl" (one span per line) or "otel" (OpenTelemetry API, optional dependency)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_FILE = os.getenv("TRACE_FILE", "")  # JSON lines destination; stdout when empty
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class TraceFileWriter:
+    """Appends JSON lines to a file from a background thread, so turns never wait on disk I/O"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.lines: queue.SimpleQueue = queue.SimpleQueue()
+        self.thread: Optional[threading.Thread] = None
+    
+    def write(self, lines: str):
+        """Queue lines for the writer thread (started on first use)"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+            self.thread.start()
+        self.lines.put(lines)
+    
+    def _run(self):
+        while True:
+            # Everything queued while the last write ran goes out in one append
+            batch = [self.lines.get()]
+            while True:
+                try:
+                    batch.append(self.lines.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.path, "a") as trace_file:
+                    trace_file.write("".join(batch))
+            except OSError as e:
+                print(f"⚠️ Could not write traces to {self.path}: {e}")
+
+
+_trace_writer = TraceFileWriter(TRACE_FILE)
+
+
+class Span:
+    """One timed stage of a turn (e.g. "stt", "stt.groq", "tts.edge") with free-form attributes"""
+    
+    def __init__(self, name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = dict(attrs)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = 0.0
+    
+    def set(self, **attrs):
+        """Attach attributes such as provider, sizes or fallback reasons"""
+        self.attrs.update(attrs)
+    
+    def finish(self):
+        """Record the span's duration"""
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+    
+    def to_dict(self, trace_id: str) -> Dict:
+        """Serialize for JSON lines export"""
+        return {
+            "trace_id": trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 2),
+            **self.attrs,
+        }
+
+
+class TurnTrace:
+    """Collects the spans of one voice turn and exports them when the turn ends"""
+    
+    def __init__(self, turn_id: int):
+        self.trace_id = uuid.uuid4().hex
+        self.turn_id = turn_id
+        self.spans: List[Span] = []
+    
+    def summary(self) -> Dict:
+        """
+        Summarize the turn for the client
+        
         Returns:
-            Extracted text content
+            Total duration plus one entry per top-level stage with its provider and fallbacks
         """
+        roots = [span for span in self.spans if span.parent_id is None]
+        stage_parent = roots[0].span_id if roots else None
+        stages = []
+        for span in self.spans:
+            if span.parent_id != stage_parent:
+                continue
+            fallbacks = [
+                {"provider": child.name, "reason": child.attrs.get("error") or child.attrs.get("outcome")}
+                for child in self.spans
+                if child.parent_id == span.span_id and child.attrs.get("outcome") != "ok"
+            ]
+            stages.append({
+                "stage": span.name,
+                "ms": round(span.duration_ms, 1),
+                "provider": span.attrs.get("provider"),
+                "fallbacks": fallbacks,
+            })
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round(roots[0].duration_ms, 1) if roots else 0.0,
+            "stages": stages,
+        }
+    
+    def record_metrics(self):
+        """Feed stage latencies and provider outcomes into the /metrics registry"""
+        roots = {span.span_id for span in self.spans if span.parent_id is None}
+        stages = {span.span_id: span for span in self.spans if span.parent_id in roots}
+        for span in stages.values():
+            STAGE_LATENCY.observe(span.duration_ms / 1000, stage=span.name)
+            # Stages without provider sub-spans (the LLM call) count as a single provider attempt
+            if "provider" in span.attrs and not any(child.parent_id == span.span_id for child in self.spans):
+                PROVIDER_CALLS.inc(provider=f"{span.name}.{span.attrs['provider']}",
+                                   outcome=span.attrs.get("outcome", "ok"))
+        for span in self.spans:
+            if span.parent_id in stages:
+                PROVIDER_CALLS.inc(provider=span.name, outcome=span.attrs.get("outcome", "ok"))
+    
+    def export(self):
+        """Write the turn's spans to the configured exporter"""
+        if TRACE_EXPORTER == "jsonl":
+            lines = "".join(json.dumps(span.to_dict(self.trace_id)) + "\n" for span in self.spans)
+            if TRACE_FILE:
+                _trace_writer.write(lines)
+            else:
+                print(lines, end="")
+        elif TRACE_EXPORTER == "otel":
+            self._export_otel()
+    
+    def _export_otel(self):
+        """Replay spans into the OpenTelemetry API (configure the SDK/exporter via OTEL_* settings)"""
         try:
-            import httpx
-            from bs4 import BeautifulSoup
-            
-            print(f"📄 Fetching content from: {url}")
+            from opentelemetry import trace as otel_trace
+        except ImportError:
+            print("⚠️ TRACE_EXPORTER=otel but opentelemetry is not installed")
+            return
+        
+        tracer = otel_trace.get_tracer("mohan-voice-assistant")
+        otel_spans = {}
+        for span in sorted(self.spans, key=lambda item: item.start):
+            parent = otel_spans.get(span.parent_id)
+            otel_span = tracer.start_span(
+                span.name,
+                context=otel_trace.set_span_in_context(parent) if parent else None,
+                start_time=int(span.start * 1e9),
+                attributes={key: value for key, value in span.attrs.items()
+                            if isinstance(value, (str, bool, int, float))},
+            )
+            otel_spans[span.span_id] = otel_span
+        for span in self.spans:
+            otel_spans[span.span_id].end(end_time=int((span.start + span.duration_ms / 1000) * 1e9))
+
+
+@contextmanager
+def trace_span(name: str, **attrs):
+    """
+    Time a block as a span of the current turn's trace
+    
+    Yields None when no trace is active, so instrumented code also runs untraced.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    
+    parent = _current_span.get()
+    span = Span(name, parent.span_id if parent else None, attrs)
+    trace.spans.append(span)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.set(outcome="cancelled" if isinstance(e, asyncio.CancelledError) else "error",
+                 error=span.attrs.get("error") or str(e))
+        raise
+    finally:
+        span.finish()
+        _current_span.reset(token)
+
+
+def trace_annotate(**attrs):
+    """Attach attributes to the innermost active span, if any"""
+    span = _current_span.get()
+    if span is not None:
+        span.set(**attrs)
+
+
+def _payload_size(value: Any) -> Optional[int]:
+    """Size of a traced argument or result (bytes for audio, characters for text)"""
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return None
+
+
+def traced(name: str):
+    """
+    Decorate a coroutine method so each call is recorded as a span
+    
+    The span records input/output sizes and an outcome of "ok", "empty"
+    (the provider returned nothing, so the caller falls back) or "error".
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            with trace_span(name) as span:
+                result = await method(self, *args, **kwargs)
+                if span is not None:
+                    span.set(in_size=_payload_size(args[0]) if args else None,
+                             out_size=_payload_size(result))
+                    if "outcome" not in span.attrs:
+                        span.set(outcome="ok" if result else ("error" if "error" in span.attrs else "empty"))
+                return result
+        return wrapper
+    return decorator
+
+
+class _Metric:
+    """Base for metrics exposed in the Prometheus text format"""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+    
+    def _key(self, labels: Dict[str, Any]) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+    
+    def _label_str(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{label}="{value}"' for label, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+    
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic counter"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        super().__init__(name, help_text, labels)
+        self.values: Dict[tuple, float] = {}
+    
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+    
+    def render(self) -> List[str]:
+        return super().render() + [f"{self.name}{self._label_str(key)} {value}" for key, value in self.values.items()]
+
+
+class Gauge(_Metric):
+    """Point-in-time value, read from a callback at scrape time"""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, help_text: str, callback):
+        super().__init__(name, help_text)
+        self.callback = callback
+    
+    def render(self) -> List[str]:
+        return super().render() + [f"{self.name} {self.callback()}"]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram"""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = ()):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+        self.series: Dict[tuple, Dict] = {}
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self.series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][i] += 1
+        series["sum"] += value
+        series["count"] += 1
+    
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, series in self.series.items():
+            for bound, count in zip(self.buckets, series["counts"]):
+                bucket_label = self._label_str(key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_label} {count}")
+            inf_label = self._label_str(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_label} {series['count']}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {series['sum']}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Per-container metrics served at /metrics"""
+    
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+    
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 20.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# How often the event loop is sampled for lag
+LOOP_LAG_INTERVAL = 0.5
+
+metrics = MetricsRegistry()
+TIME_TO_FIRST_AUDIO = metrics.register(Histogram(
+    "voice_time_to_first_audio_seconds", "Time from receiving a turn's audio to sending its first audio",
+    labels=("session_turn",), buckets=LATENCY_BUCKETS))
+TURN_DURATION = metrics.register(Histogram(
+    "voice_turn_duration_seconds", "Whole-turn latency, first turn of a session vs later (steady) turns",
+    labels=("session_turn",), buckets=LATENCY_BUCKETS))
+STAGE_LATENCY = metrics.register(Histogram(
+    "voice_stage_duration_seconds", "Per-turn stage latency (stt, search, llm, tts)",
+    labels=("stage",), buckets=LATENCY_BUCKETS))
+PROVIDER_CALLS = metrics.register(Counter(
+    "voice_provider_calls_total", "Provider attempts by outcome (ok, or empty/error causing a fallback)",
+    labels=("provider", "outcome")))
+AUDIO_BYTES = metrics.register(Counter(
+    "voice_audio_bytes_total", "Audio bytes received from and sent to clients", labels=("direction",)))
+CACHE_REQUESTS = metrics.register(Counter(
+    "voice_cache_requests_total", "Cache lookups by cache and result (hit/stale/miss)", labels=("cache", "result")))
+EVENT_LOOP_LAG = metrics.register(Histogram(
+    "voice_event_loop_lag_seconds", "Delay of a periodic event loop wake-up beyond its schedule",
+    buckets=LAG_BUCKETS))
+ACTIVE_CONNECTIONS = metrics.register(Gauge(
+    "voice_active_connections", "Open WebSocket sessions in this container", lambda: len(active_connections)))
+
+
+async def monitor_event_loop_lag():
+    """Sample event loop lag forever; anything blocking the loop shows up as a late wake-up"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - started - LOOP_LAG_INTERVAL))
+
+
+# Diagnostic mode for staging: asyncio debug mode plus a watchdog thread that logs the stack of
+# whatever is blocking the event loop for longer than SLOW_CALLBACK_MS
+LOOP_DIAGNOSTICS = os.getenv("LOOP_DIAGNOSTICS", "0") == "1"
+SLOW_CALLBACK_THRESHOLD = float(os.getenv("SLOW_CALLBACK_MS", "100")) / 1000
+# Enables the /admin endpoints (loop stalls, on-demand sampling profiler); disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+LOOP_STALLS = metrics.register(Counter(
+    "voice_event_loop_stalls_total", "Event loop stalls longer than SLOW_CALLBACK_MS (diagnostic mode)"))
+
+
+class LoopDiagnostics:
+    """Event loop blocking detector and on-demand sampling profiler"""
+    
+    def __init__(self, threshold: float = SLOW_CALLBACK_THRESHOLD):
+        """
+        Initialize diagnostics
+        
+        Args:
+            threshold: Seconds the loop may be unresponsive before a stall is logged
+        """
+        self.threshold = threshold
+        self.loop_thread_id: Optional[int] = None
+        self.last_beat = time.perf_counter()
+        self.stalls: deque = deque(maxlen=20)
+        self.profiling = False
+    
+    def attach(self, enable_watchdog: bool = LOOP_DIAGNOSTICS):
+        """
+        Attach to the running event loop (call from a coroutine on that loop)
+        
+        Args:
+            enable_watchdog: Turn on asyncio debug mode and the blocking-detector thread
+        """
+        loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        if not enable_watchdog:
+            return
+        
+        # asyncio also logs every callback slower than the threshold
+        loop.slow_callback_duration = self.threshold
+        loop.set_debug(True)
+        asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True).start()
+        print(f"🩺 Event loop diagnostics on (threshold {self.threshold * 1000:.0f} ms)")
+    
+    async def _heartbeat(self):
+        """Prove the loop is responsive several times per threshold"""
+        while True:
+            self.last_beat = time.perf_counter()
+            await asyncio.sleep(self.threshold / 4)
+    
+    def _watchdog(self):
+        """Watch the heartbeat from a separate thread and capture the loop's stack while it is stuck"""
+        stall = None
+        while True:
+            time.sleep(self.threshold / 4)
+            blocked_for = time.perf_counter() - self.last_beat
             
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(url, follow_redirects=True)
-                
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # Remove unwanted elements
-                    for element in soup(["script", "style", "nav", "header", "footer"]):
-                        element.decompose()
-                    
-                    # Extract and clean text
-                    text = soup.get_text()
-                    lines = (line.strip() for line in text.splitlines())
-                    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                    text = ' '.join(chunk for chunk in chunks if chunk)
-                    
-                    # Limit text length
-                    if len(text) > max_chars:
-                        text = text[:max_chars] + "..."
-                    
-                    print(f"✅ Extracted {len(text)} characters")
-                    return text
-                    
-        except Exception as e:
-            print(f"❌ Failed to fetch content from {url}: {e}")
+            if blocked_for > self.threshold and stall is None:
+                frame = sys._current_frames().get(self.loop_thread_id)
+                stall = {
+                    "detected_at": time.time(),
+                    "stack": traceback.format_stack(frame) if frame else [],
+                    "beat": self.last_beat,
+                }
+                print(f"🐌 Event loop blocked for {blocked_for * 1000:.0f} ms at:\n{''.join(stall['stack'][-8:])}")
             
-        return ""
+            elif stall is not None and self.last_beat != stall["beat"]:
+                # Loop resumed: record how long the stall lasted
+                stall["duration_ms"] = round((self.last_beat - stall.pop("beat")) * 1000, 1)
+                self.stalls.append(stall)
+                LOOP_STALLS.inc()
+                print(f"🐌 Event loop stall ended after {stall['duration_ms']} ms")
+                stall = None
     
-    async def search_and_summarize(self, query: str) -> str:
+    async def profile(self, seconds: float, interval: float = 0.005) -> str:
         """
-        Search web and return formatted summary
+        Sample the event loop thread's stack for a while
         
         Args:
-            query: Search query string
+            seconds: How long to sample
+            interval: Seconds between samples
             
         Returns:
-            Formatted search results summary
+            Collapsed stacks ("frame;frame;frame count" per line), the input format of
+            flamegraph.pl and speedscope, heaviest first
         """
+        if self.profiling:
+            raise RuntimeError("A profile is already running")
+        
+        def _sample() -> Dict[str, int]:
+            counts: Dict[str, int] = {}
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                frame = sys._current_frames().get(self.loop_thread_id)
+                if frame is not None:
+                    stack = ";".join(
+                        f"{os.path.basename(entry.filename)}:{entry.name}:{entry.lineno}"
+                        for entry in traceback.extract_stack(frame)
+                    )
+                    counts[stack] = counts.get(stack, 0) + 1
+                time.sleep(interval)
+            return counts
+        
+        self.profiling = True
         try:
-            results = await self.search_web(query, max_results=3)
-            
-            if not results:
-                return "I couldn't find current information on that topic. Could you try rephrasing your question?"
-            
-            # Format search results
-            search_summary = f"Here's what I found about '{query}':\n\n"
-            
-            for i, result in enumerate(results, 1):
-                search_summary += f"{i}. **{result['title']}** ({result['source']})\n"
-                search_summary += f"   {result['snippet']}\n\n"
-            
-            # Get detailed content from first result
-            if results[0]['url']:
-                detailed_content = await self.get_page_content(results[0]['url'])
-                if detailed_content:
-                    search_summary += f"**Additional details from {results[0]['source']}:**\n"
-                    search_summary += f"{detailed_content[:800]}...\n\n"
-            
-            search_summary += f"*Information retrieved from web search - {len(results)} sources*"
-            return search_summary
-            
-        except Exception as e:
-            print(f"❌ Search and summarize failed: {e}")
-            return "I encountered an issue while searching for current information. Please try again."
+            counts = await asyncio.to_thread(_sample)
+        finally:
+            self.profiling = False
+        
+        return "".join(f"{stack} {count}\n"
+                       for stack, count in sorted(counts.items(), key=lambda item: item[1], reverse=True))
 
 
-class VoiceAssistant:
-    """Main voice assistant class handling speech-to-text, LLM, and text-to-speech"""
+loop_diagnostics = LoopDiagnostics()
+
+
+# Provider circuit breakers: consecutive failures that open a breaker, and how long it stays open
+# before one half-open probe call is let through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+HEALTH_WINDOW = 20            # Recent calls per provider in its health score...
+HEALTH_WINDOW_SECONDS = 120   # ...within this long, so a demoted provider is retried once its failures age out
+HEALTH_LATENCY_BUDGET = 5.0   # Seconds; slower median successes lower the score proportionally
+HEALTH_DEMOTE_SCORE = 0.5     # Providers scoring below this are tried after healthier ones
+
+# Groq rate limits: requests are queued and paced per model against the request and token budgets
+# Groq reports in its x-ratelimit-* headers, interactive turns ahead of background work. Budgets
+# belong to the account, so the headers also keep every container's view of them in step.
+GROQ_RATE_LIMITING = os.getenv("GROQ_RATE_LIMITING", "1") == "1"
+GROQ_MAX_QUEUE_SECONDS = float(os.getenv("GROQ_MAX_QUEUE_SECONDS", "3"))  # Longest an interactive request waits...
+GROQ_BACKGROUND_QUEUE_SECONDS = 10.0  # ...and a background one (batch transcription), before falling back
+GROQ_BACKGROUND_RESERVE = 0.2         # Share of each budget background requests leave for interactive turns
+GROQ_CHARS_PER_TOKEN = 4              # Prompt token estimate until Groq reports the remaining budget
+GROQ_MAX_RETRY_AFTER = 60.0           # Retry hint cap when a budget reports no refill rate (an endless wait)
+
+SPEECH_GATE_RESULTS = metrics.register(Counter(
+    "voice_speech_gate_total", "Speech gate verdicts per clip (speech, silence, noise, too_short, undecodable)",
+    labels=("result",)))
+SPEECH_GATE_SAVED_BYTES = metrics.register(Counter(
+    "voice_speech_gate_saved_bytes_total", "STT upload bytes avoided by rejecting clips", labels=("reason",)))
+STT_UPLOAD_BYTES = metrics.register(Counter(
+    "voice_stt_upload_bytes_total", "Speech clip bytes received from clients vs uploaded to STT (after "
+    "trimming, resampling and re-encoding)", labels=("stage",)))
+SPEECH_GATE_SECONDS = metrics.register(Histogram(
+    "voice_speech_gate_seconds", "Time to decode and analyze a clip in the speech gate",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)))
+PREWARM_RESULTS = metrics.register(Counter(
+    "voice_prewarm_total", "Session pre-warm attempts by target and outcome (ok, error, skipped)",
+    labels=("target", "outcome")))
+PREWARM_DURATION = metrics.register(Histogram(
+    "voice_prewarm_duration_seconds", "Time to warm each provider connection", labels=("target",),
+    buckets=LATENCY_BUCKETS))
+EDGE_TTS_CONNECTIONS = metrics.register(Counter(
+    "voice_edge_tts_connections_total",
+    "Edge TTS pool events (opened, reused, stale, dropped, failed)", labels=("event",)))
+STREAM_PARTIALS = metrics.register(Counter(
+    "voice_stt_stream_partials_total", "Streaming STT partial decodes by outcome (sent, unchanged, busy, error)",
+    labels=("outcome",)))
+STREAM_FINALIZE_SECONDS = metrics.register(Histogram(
+    "voice_stt_stream_finalize_seconds", "Endpoint to final transcript with streaming local STT",
+    buckets=LATENCY_BUCKETS))
+SEARCH_PREFETCH = metrics.register(Counter(
+    "voice_search_prefetch_total", "Web searches started from partial transcripts (started, hit, miss)",
+    labels=("outcome",)))
+SPEECH_REMOVED_CHARS = metrics.register(Histogram(
+    "voice_tts_normalize_removed_chars", "Reply characters per turn not sent to TTS after speech normalization",
+    buckets=(0, 10, 25, 50, 100, 250, 500, 1000, 2500)))
+SPEECH_SAVED_SECONDS = metrics.register(Histogram(
+    "voice_tts_normalize_saved_seconds", "Estimated audio seconds per turn not synthesized thanks to speech "
+    "normalization", buckets=(0, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 60.0)))
+API_REQUESTS = metrics.register(Counter(
+    "voice_api_requests_total", "REST API requests (and batch clips) by endpoint and outcome (ok, busy, invalid)",
+    labels=("endpoint", "outcome")))
+SEARCH_REFRESHES = metrics.register(Counter(
+    "voice_search_refresh_total", "Background search cache refreshes by outcome (ok, empty, error, busy)",
+    labels=("outcome",)))
+GROQ_QUEUE_WAIT = metrics.register(Histogram(
+    "voice_groq_queue_wait_seconds", "Time Groq requests waited for rate-limit budget, by model and priority",
+    labels=("model", "priority"), buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)))
+GROQ_RATE_LIMITED = metrics.register(Counter(
+    "voice_groq_rate_limited_total", "Groq requests given up for rate limits, by model and reason (shed: no "
+    "budget within the queue limit, 429: refused by Groq)", labels=("model", "reason")))
+CIRCUIT_TRANSITIONS = metrics.register(Counter(
+    "voice_provider_circuit_transitions_total", "Circuit breaker state changes by provider and new state",
+    labels=("provider", "state")))
+
+# Failures reported by the provider call in progress (see provider_error)
+_provider_failures: contextvars.ContextVar = contextvars.ContextVar("provider_failures", default=None)
+
+# Priority of Groq requests made in this context: "interactive" (voice turns, chat) or "background"
+_groq_priority: contextvars.ContextVar = contextvars.ContextVar("groq_priority", default="interactive")
+
+
+def provider_error(e: Exception):
+    """Record a swallowed provider exception on the current span and for the provider's circuit breaker"""
+    trace_annotate(error=str(e))
+    failures = _provider_failures.get()
+    if failures is not None:
+        failures.append(str(e))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker with a rolling health score for one provider
     
-    def __init__(self):
-        """Initialize the voice assistant with API clients and models"""
-        # Initialize Groq client for fast LLM inference
-        self.groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        
-        # Initialize OpenAI client for fallback STT/TTS (optional)
-        self.openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None
+    closed:    calls pass; BREAKER_FAILURE_THRESHOLD consecutive failures open it
+    open:      calls are skipped until the cooldown has passed
+    half_open: a single probe call is let through; success closes, failure re-opens
+    """
+    
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        # (monotonic time, succeeded, latency in seconds) of recent calls
+        self.outcomes: deque = deque(maxlen=HEALTH_WINDOW)
+    
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now (claims the probe when half-open)"""
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self._transition("half_open")
+        if self.state == "half_open":
+            if self.probing:
+                return False
+            self.probing = True
+        return self.state != "open"
+    
+    def record(self, ok: bool, latency: float):
+        """Account for a finished call"""
+        self.outcomes.append((time.monotonic(), ok, latency))
+        self.probing = False
+        if ok:
+            self.consecutive_failures = 0
+            if self.state != "closed":
+                self._transition("closed")
+            return
         
-        # Initialize local models (loaded on first use)
-        self.local_whisper = None
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            if self.state != "open":
+                self._transition("open")
+    
+    def abandon(self):
+        """Release the half-open probe of a call that was cancelled before finishing"""
+        self.probing = False
+    
+    def health(self) -> float:
+        """
+        Score in [0, 1]: success rate over recent calls, discounted when the median success is over budget
         
-        # Initialize web search
-        self.web_searcher = WebSearcher()
+        The rate starts from one assumed success, so a single failure does not demote a provider.
+        """
+        horizon = time.monotonic() - HEALTH_WINDOW_SECONDS
+        recent = [(ok, latency) for at, ok, latency in self.outcomes if at >= horizon]
+        success_rate = (sum(1 for ok, _ in recent if ok) + 1) / (len(recent) + 1)
+        latencies = sorted(latency for ok, latency in recent if ok)
+        median = latencies[len(latencies) // 2] if latencies else 0.0
+        return success_rate * min(1.0, HEALTH_LATENCY_BUDGET / median) if median else success_rate
     
-    async def speech_to_text(self, audio_data: bytes) -> str:
+    def snapshot(self) -> Dict:
+        """State for the admin endpoint"""
+        return {
+            "state": self.state,
+            "health": round(self.health(), 3),
+            "consecutive_failures": self.consecutive_failures,
+            "calls": len(self.outcomes),
+        }
+    
+    def _transition(self, state: str):
+        icon = {"open": "🔴", "half_open": "🟡", "closed": "🟢"}[state]
+        print(f"{icon} Circuit {self.name}: {self.state} -> {state}")
+        self.state = state
+        CIRCUIT_TRANSITIONS.inc(provider=self.name, state=state)
+
+
+class ProviderRegistry:
+    """
+    Circuit breakers and health scores for every STT/TTS provider, keyed by span name
+    
+    Providers with an open breaker are skipped without a request, so an outage
+    costs one timeout per cooldown instead of one per turn.
+    """
+    
+    def __init__(self):
+        self.breakers: Dict[str, CircuitBreaker] = {}
+    
+    def breaker(self, name: str) -> CircuitBreaker:
+        """Get or create the breaker for a provider"""
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(name)
+        return self.breakers[name]
+    
+    def health(self, name: str) -> float:
+        """Health of a provider, or of its best sub-provider (e.g. "stt.groq" -> its models)"""
+        if name in self.breakers:
+            return self.breakers[name].health()
+        children = [breaker.health() for key, breaker in self.breakers.items() if key.startswith(name + ".")]
+        return max(children) if children else 1.0
+    
+    def rank(self, names: List[str]) -> List[str]:
+        """Keep the preferred order, but move providers with a poor health score behind healthy ones"""
+        return sorted(names, key=lambda name: self.health(name) < HEALTH_DEMOTE_SCORE)
+    
+    async def call(self, name: str, method: Callable[..., Awaitable], *args, empty_is_failure: bool = False):
         """
-        Convert speech to text using multiple STT options with fallbacks
+        Call a provider through its circuit breaker
         
         Args:
-            audio_data: Raw audio data in bytes
+            name: Provider (span) name, e.g. "tts.edge"
+            method: Provider coroutine; it reports swallowed exceptions via provider_error
+            empty_is_failure: Count an empty result as a failure (TTS), not just exceptions (STT)
             
         Returns:
-            Transcribed text string
+            The provider's result, or None if its breaker is open
+            
+        Raises:
+            GroqRateLimited: Passed through without counting for or against the provider
         """
+        breaker = self.breaker(name)
+        if not breaker.allow():
+            with trace_span(name, outcome="skipped", error="circuit open"):
+                pass
+            return None
+        
+        failures: List[str] = []
+        token = _provider_failures.set(failures)
+        started = time.perf_counter()
+        recorded = False
         try:
-            print(f"🎤 Processing audio data: {len(audio_data)} bytes")
-            
-            # Option 1: Groq Whisper (fastest and most cost-effective)
-            if os.getenv("GROQ_API_KEY"):
-                transcription = await self._groq_speech_to_text(audio_data)
-                if transcription:
-                    return transcription
-            
-            # Option 2: Local Whisper (completely free)
-            transcription = await self._local_speech_to_text(audio_data)
-            if transcription:
-                return transcription
-            
-            # Option 3: OpenAI Whisper (fallback)
-            if self.openai_client:
-                transcription = await self._openai_speech_to_text(audio_data)
-                if transcription:
-                    return transcription
-            
-            print("⚠️ All STT options failed or returned poor results")
-            return ""
-            
-        except Exception as e:
-            print(f"❌ Speech-to-text processing failed: {e}")
-            return ""
+            result = await method(*args)
+            breaker.record(not failures and (bool(result) or not empty_is_failure), time.perf_counter() - started)
+            recorded = True
+            return result
+        except (asyncio.CancelledError, GroqRateLimited):
+            # Over budget is not an outage: rate-limited calls count as neither success nor failure
+            raise
+        except Exception:
+            breaker.record(False, time.perf_counter() - started)
+            recorded = True
+            raise
+        finally:
+            _provider_failures.reset(token)
+            if not recorded:
+                breaker.abandon()
+
+
+class GroqRateLimited(Exception):
+    """Raised when a Groq request gets no rate-limit budget within its queue limit, or Groq answers 429"""
     
-    async def _groq_speech_to_text(self, audio_data: bytes) -> str:
-        """Process audio using Groq Whisper API"""
+    def __init__(self, model: str, retry_after: float):
+        retry_after = min(retry_after, GROQ_MAX_RETRY_AFTER)
+        super().__init__(f"Groq {model} rate limited, retry in {retry_after:.1f}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Groq reset header ("7.66s", "2m59.56s", "120ms") or a retry-after value ("3")"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    return sum(float(number) * scale[unit] for number, unit in parts) if parts else None
+
+
+class TokenBucket:
+    """Local copy of one server-side budget (requests or tokens of a model), refilling continuously"""
+    
+    def __init__(self, window: float):
+        # Unlimited until a response reports the budget; window is the period Groq's limit covers
+        self.window = window
+        self.capacity = float("inf")
+        self.level = float("inf")
+        self.rate = 0.0
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        if self.level < self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, cost: float, reserve: float = 0.0) -> float:
+        """Seconds until cost can be spent leaving reserve (a share of capacity) unspent"""
+        if self.capacity == float("inf"):
+            return 0.0
+        self._refill()
+        # A request larger than the whole budget can still go once the budget is full
+        missing = min(cost + reserve * self.capacity, self.capacity) - self.level
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else float("inf")
+    
+    def spend(self, cost: float):
+        self._refill()
+        self.level -= min(cost, self.capacity)
+    
+    def sync(self, limit: float, remaining: float, reset: Optional[float]):
+        """Adopt the budget Groq reported; reset is the time until it is full again"""
+        self.capacity = limit
+        self.level = remaining
+        self.updated = time.monotonic()
+        if reset and remaining < limit:
+            self.rate = (limit - remaining) / reset
+        elif self.rate <= 0:
+            self.rate = limit / self.window
+
+
+class GroqModelBudget:
+    """Request and token buckets of one Groq model, with the requests waiting on them"""
+    
+    def __init__(self):
+        # Groq reports requests per day and tokens per minute
+        self.buckets = {"requests": TokenBucket(window=86400), "tokens": TokenBucket(window=60)}
+        self.queue: List[Tuple[int, int]] = []
+        self.changed = asyncio.Event()
+        self.blocked_until = 0.0
+    
+    def wait_time(self, tokens: float, reserve: float) -> float:
+        blocked = max(0.0, self.blocked_until - time.monotonic())
+        return max(blocked, self.buckets["requests"].wait_time(1, reserve),
+                   self.buckets["tokens"].wait_time(tokens, reserve))
+    
+    def notify(self):
+        """Wake every waiter to re-check its place in the queue and the budget"""
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class GroqRateLimiter:
+    """
+    Client-side scheduler for Groq's per-model request and token budgets
+    
+    Budgets are learned from x-ratelimit-* response headers and spent locally before each request,
+    so requests are queued and paced instead of being refused with 429. Waiters are served in
+    priority order (interactive before background, then first come first served), and background
+    requests leave GROQ_BACKGROUND_RESERVE of each budget for interactive turns. A request that
+    would not get budget within its queue limit raises GroqRateLimited at once, so callers fall
+    back or answer busy instead of waiting.
+    """
+    
+    PRIORITIES = {"interactive": 0, "background": 1}
+    
+    def __init__(self, enabled: bool = GROQ_RATE_LIMITING):
+        self.enabled = enabled
+        self.models: Dict[str, GroqModelBudget] = {}
+        self._tickets = itertools.count()
+    
+    def budget(self, model: str) -> GroqModelBudget:
+        """Get or create the budget of a model"""
+        if model not in self.models:
+            self.models[model] = GroqModelBudget()
+        return self.models[model]
+    
+    async def acquire(self, model: str, tokens: float = 0, priority: Optional[str] = None) -> float:
+        """
+        Wait for budget to send one request, in priority order
+        
+        Args:
+            model: Groq model the request is for
+            tokens: Estimated tokens the request uses (0 for transcriptions)
+            priority: "interactive" or "background" (default: the priority set for this context)
+            
+        Returns:
+            Seconds spent waiting
+            
+        Raises:
+            GroqRateLimited: If the budget would not allow the request within the priority's queue limit
+        """
+        priority = priority or _groq_priority.get()
+        max_wait = GROQ_MAX_QUEUE_SECONDS if priority == "interactive" else GROQ_BACKGROUND_QUEUE_SECONDS
+        reserve = GROQ_BACKGROUND_RESERVE if priority == "background" else 0.0
+        budget = self.budget(model)
+        ticket = (self.PRIORITIES[priority], next(self._tickets))
+        heapq.heappush(budget.queue, ticket)
+        # A waiter that was first in line may now be behind this request
+        budget.notify()
+        started = time.perf_counter()
         try:
-            import tempfile
-            import wave
+            while True:
+                left = max_wait - (time.perf_counter() - started)
+                wait = budget.wait_time(tokens, reserve) if budget.queue[0] == ticket else None
+                if wait == 0:
+                    break
+                if left <= 0 or (wait is not None and wait > left):
+                    GROQ_RATE_LIMITED.inc(model=model, reason="shed")
+                    raise GroqRateLimited(model, wait if wait is not None else max_wait)
+                try:
+                    await asyncio.wait_for(budget.changed.wait(), timeout=min(left, wait) if wait is not None else left)
+                except asyncio.TimeoutError:
+                    pass
+            budget.buckets["requests"].spend(1)
+            budget.buckets["tokens"].spend(tokens)
+        finally:
+            budget.queue.remove(ticket)
+            heapq.heapify(budget.queue)
+            budget.notify()
+        
+        waited = time.perf_counter() - started
+        GROQ_QUEUE_WAIT.observe(waited, model=model, priority=priority)
+        if waited >= 0.001:
+            trace_annotate(queue_ms=round(waited * 1000, 1))
+        return waited
+    
+    def observe(self, model: str, headers):
+        """Sync a model's buckets with the x-ratelimit-* headers of a Groq response"""
+        budget = self.budget(model)
+        for kind, bucket in budget.buckets.items():
+            try:
+                limit = float(headers.get(f"x-ratelimit-limit-{kind}"))
+                remaining = float(headers.get(f"x-ratelimit-remaining-{kind}"))
+            except (TypeError, ValueError):
+                continue
+            bucket.sync(limit, remaining, _parse_duration(headers.get(f"x-ratelimit-reset-{kind}")))
+        budget.notify()
+    
+    async def call(self, model: str, create: Callable[..., Awaitable], tokens: float = 0, **kwargs):
+        """
+        Send one Groq request within the model's budgets
+        
+        Args:
+            model: Groq model, also passed to create
+            create: A `with_raw_response.create` method of the Groq client
+            tokens: Estimated tokens the request uses
+            **kwargs: Request parameters
             
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                tmp_file.write(audio_data)
-                tmp_file.flush()
+        Returns:
+            The parsed response (an async stream for stream=True)
+            
+        Raises:
+            GroqRateLimited: If no budget came free in time, or Groq answered 429
+        """
+        if self.enabled:
+            await self.acquire(model, tokens)
+        try:
+            raw = await create(model=model, **kwargs)
+        except Exception as e:
+            response = getattr(e, "response", None)
+            if response is None:
+                raise
+            if self.enabled:
+                self.observe(model, response.headers)
+            if getattr(e, "status_code", None) != 429:
+                raise
+            retry_after = _parse_duration(response.headers.get("retry-after")) or 1.0
+            GROQ_RATE_LIMITED.inc(model=model, reason="429")
+            budget = self.budget(model)
+            budget.blocked_until = max(budget.blocked_until, time.monotonic() + retry_after)
+            raise GroqRateLimited(model, retry_after) from e
+        if self.enabled:
+            self.observe(model, raw.headers)
+        return await raw.parse()
+
+
+class WebSearcher:
+    """Handles web search functionality using DuckDuckGo API, with a cache kept fresh for hot topics"""
+    
+    def __init__(self, admission: Optional["AdmissionController"] = None):
+        """
+        Initialize web search capabilities
+        
+        Args:
+            admission: Shared admission controller; background refreshes take a "search" slot
+        """
+        self.admission = admission or AdmissionController()
+        # Shared across searches so the search API connection stays warm; created on first use
+        self.http_client = None
+        # Cache key -> {"query", "summary", "fetched_at", "ttl"}, least recently used first
+        self.cache: OrderedDict = OrderedDict()
+        # Cache key -> [decayed request count, latest query text]
+        self.popularity: Dict[str, List] = {}
+        # Searches in flight per cache key, shared by concurrent requests and background refreshes,
+        # and how many callers are waiting on each
+        self.refreshing: Dict[str, asyncio.Task] = {}
+        self.waiters: Dict[str, int] = {}
+        # Cache key -> [consecutive failed or empty refreshes, time before which it is not refreshed again]
+        self.failures: Dict[str, List] = {}
+        # Refreshes started for stale entries, held so they are not garbage-collected mid-flight
+        self.background: Set[asyncio.Task] = set()
+    
+    def _client(self):
+        import httpx
+        
+        if self.http_client is None:
+            self.http_client = httpx.AsyncClient(
+                timeout=10.0, limits=httpx.Limits(keepalive_expiry=PROVIDER_KEEPALIVE_SECONDS))
+        return self.http_client
+    
+    async def warm(self):
+        """Open the search API connection (or import DDGS) before the first search needs it"""
+        if SEARCH_API_URL:
+            await self._client().head(SEARCH_API_URL)
+        else:
+            await asyncio.to_thread(__import__, "duckduckgo_search")
+    
+    @traced("search.ddg")
+    async def search_web(self, query: str, max_results: int = 5) -> List[Dict]:
+        """
+        Search the web using DuckDuckGo
+        
+        Args:
+            query: Search query string
+            max_results: Maximum number of results to return
+            
+        Returns:
+            List of search results with title, url, snippet, and source
+        """
+        try:
+            print(f"🔍 Searching web for: '{query}'")
+            
+            if SEARCH_API_URL:
+                search_results = await self._search_api(query, max_results)
+            else:
+                from duckduckgo_search import DDGS
                 
-                # Validate audio file
-                try:
-                    with wave.open(tmp_file.name, 'rb') as wav_file:
-                        duration = wav_file.getnframes() / wav_file.getframerate()
-                        if duration < 0.5:
-                            print("⚠️ Audio too short, skipping...")
-                            os.unlink(tmp_file.name)
-                            return ""
-                except Exception as e:
-                    print(f"⚠️ Could not validate audio file: {e}")
+                def _search() -> List[Dict]:
+                    with DDGS() as ddgs:
+                        return list(ddgs.text(query, max_results=max_results) or [])
                 
-                # Try Groq Whisper models
-                models = ["whisper-large-v3", "distil-whisper-large-v3-en"]
+                # DDGS is synchronous; run it off the event loop so the socket stays responsive
+                search_results = await asyncio.to_thread(_search)
+            
+            results = []
+            for result in search_results:
+                results.append({
+                    'title': result.get('title', ''),
+                    'url': result.get('href', ''),
+                    'snippet': result.get('body', ''),
+                    'source': result.get('href', '').split('/')[2] if result.get('href') else ''
+                })
+            
+            print(f"✅ Found {len(results)} search results")
+            return results
                 
-                for model in models:
-                    try:
-                        with open(tmp_file.name, "rb") as audio_file:
-                            response = self.groq_client.audio.transcriptions.create(
-                                model=model,
-                                file=audio_file,
-                                response_format="text",
-                                language="en",
-                                temperature=0.0
-                            )
-                        
-                        transcription = response.strip() if response else ""
-                        print(f"✅ Groq {model}: '{transcription}'")
-                        
-                        # Filter out common misrecognitions
-                        if transcription and len(transcription) > 2:
-                            if transcription.lower() not in ["thank you", "thank you.", "thanks", "thanks."]:
-                                os.unlink(tmp_file.name)
-                                return transcription
-                                
-                    except Exception as e:
-                        print(f"❌ Groq {model} failed: {e}")
-                        continue
+        except Exception as e:
+            print(f"❌ Web search failed: {e}")
+            trace_annotate(error=str(e))
+            return []
+    
+    async def _search_api(self, query: str, max_results: int) -> List[Dict]:
+        """Query a DDGS-compatible JSON search endpoint (SEARCH_API_URL), e.g. a benchmark stub"""
+        response = await self._client().get(SEARCH_API_URL, params={"q": query, "max_results": max_results})
+        response.raise_for_status()
+        return response.json()
+    
+    @traced("search.fetch_page")
+    async def get_page_content(self, url: str, max_chars: int = 2000) -> str:
+        """
+        Fetch and extract text content from a webpage
+        
+        Args:
+            url: URL to fetch content from
+            max_chars: Maximum characters to return
+            
+        Returns:
+            Extracted text content
+        """
+        try:
+            from bs4 import BeautifulSoup
+            
+            print(f"📄 Fetching content from: {url}")
+            
+            response = await self._client().get(url, follow_redirects=True)
+            
+            if response.status_code == 200:
+                soup = BeautifulSoup(response.text, 'html.parser')
                 
-                os.unlink(tmp_file.name)
+                # Remove unwanted elements
+                for element in soup(["script", "style", "nav", "header", "footer"]):
+                    element.decompose()
+                
+                # Extract and clean text
+                text = soup.get_text()
+                lines = (line.strip() for line in text.splitlines())
+                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+                text = ' '.join(chunk for chunk in chunks if chunk)
+                
+                # Limit text length
+                if len(text) > max_chars:
+                    text = text[:max_chars] + "..."
+                
+                print(f"✅ Extracted {len(text)} characters")
+                return text
                 
         except Exception as e:
-            print(f"❌ Groq Whisper processing failed: {e}")
+            print(f"❌ Failed to fetch content from {url}: {e}")
+            trace_annotate(error=str(e))
+            
+        return ""
+    
+    @traced("search")
+    async def search_and_summarize(self, query: str) -> str:
+        """
+        Search web and return formatted summary, from the cache when it is fresh enough
+        
+        Args:
+            query: Search query string
+            
+        Returns:
+            Formatted search results summary
+        """
+        key = self.cache_key(query)
+        entry = self.cache.get(key) if SEARCH_CACHE else None
+        if SEARCH_CACHE:
+            count = self.popularity.get(key, [0.0])[0]
+            self.popularity[key] = [count + 1, query]
+        
+        age = time.time() - entry["fetched_at"] if entry else 0.0
+        if entry and age < entry["ttl"] * SEARCH_STALE_FACTOR:
+            result = "hit" if age < entry["ttl"] else "stale"
+            if result == "stale":
+                # Serve what we have now; the next request gets the refreshed summary
+                task = asyncio.create_task(self._background_refresh(key, query))
+                self.background.add(task)
+                task.add_done_callback(self._background_done)
+            self.cache.move_to_end(key)
+            CACHE_REQUESTS.inc(cache="search", result=result)
+            trace_annotate(cache=result, cache_age_s=round(age, 1))
+            return entry["summary"]
+        
+        if SEARCH_CACHE:
+            CACHE_REQUESTS.inc(cache="search", result="miss")
+            trace_annotate(cache="miss")
+        try:
+            summary = await self._refresh(key, query)
+        except Exception as e:
+            print(f"❌ Search and summarize failed: {e}")
+            return "I encountered an issue while searching for current information. Please try again."
+        if summary is None:
+            return "I couldn't find current information on that topic. Could you try rephrasing your question?"
+        return summary
+    
+    @staticmethod
+    def cache_key(query: str) -> str:
+        """Queries with the same words (any order, case or punctuation) share a cache entry"""
+        return " ".join(sorted(set(re.findall(r"[a-z0-9']+", query.lower()))))
+    
+    @staticmethod
+    def topic_ttl(query: str) -> float:
+        """Seconds a summary for this query stays fresh, by how volatile its topic is"""
+        query = query.lower()
+        for keywords, ttl in SEARCH_TOPIC_TTLS:
+            if any(keyword in query for keyword in keywords):
+                return ttl
+        return SEARCH_DEFAULT_TTL
+    
+    def hot_topics(self) -> List[Tuple[str, str]]:
+        """(cache key, query) of the most requested queries, most requested first"""
+        ranked = sorted(self.popularity.items(), key=lambda item: item[1][0], reverse=True)
+        return [(key, query) for key, (count, query) in ranked[:SEARCH_HOT_TOPICS] if count >= SEARCH_HOT_MIN_REQUESTS]
+    
+    async def run_refresher(self):
+        """Keep hot topics fresh in the cache; runs for the container's lifetime"""
+        while True:
+            await asyncio.sleep(SEARCH_REFRESH_TICK)
+            decay = 0.5 ** (SEARCH_REFRESH_TICK / SEARCH_HOT_HALF_LIFE)
+            for key in list(self.popularity):
+                self.popularity[key][0] *= decay
+                if self.popularity[key][0] < 0.1:
+                    del self.popularity[key]
+                    self.failures.pop(key, None)
+            
+            for key, query in self.hot_topics():
+                entry = self.cache.get(key)
+                if entry is None or time.time() - entry["fetched_at"] >= entry["ttl"] * SEARCH_REFRESH_AHEAD:
+                    # One at a time, so background work never competes with turns for many connections
+                    await self._background_refresh(key, query)
+    
+    async def _background_refresh(self, key: str, query: str):
+        """Refresh one cache entry unless it is backing off or searches are busy, logging instead of raising"""
+        if key in self.refreshing or self.failures.get(key, [0, 0.0])[1] > time.time():
+            return
+        # Never queues: a busy search stage belongs to turns, and the next tick tries again
+        if not self.admission.stage_free("search"):
+            SEARCH_REFRESHES.inc(outcome="busy")
+            return
+        try:
+            async with self.admission.stage("search"):
+                summary = await self._refresh(key, query)
+            SEARCH_REFRESHES.inc(outcome="ok" if summary is not None else "empty")
+        except Exception as e:
+            print(f"⚠️  Background search refresh for '{query}' failed: {e}")
+            SEARCH_REFRESHES.inc(outcome="error")
+    
+    def _background_done(self, task: asyncio.Task):
+        """Drop a finished stale-entry refresh, logging any error it did not handle itself"""
+        self.background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️  Background search refresh failed: {task.exception()}")
+    
+    def _record_failure(self, key: str):
+        """Back off background refreshes of a key exponentially after each consecutive failure"""
+        count = self.failures.get(key, [0, 0.0])[0] + 1
+        self.failures[key] = [count, time.time() + min(SEARCH_RETRY_BASE * 2 ** (count - 1), SEARCH_RETRY_MAX)]
+    
+    async def _refresh(self, key: str, query: str) -> Optional[str]:
+        """Search and cache a summary, joining a search for the same key already in flight"""
+        task = self.refreshing.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, query))
+            self.refreshing[key] = task
+            task.add_done_callback(lambda _: self.refreshing.pop(key, None))
+        # A cancelled caller only cancels the search when nobody else waits on it (a superseded
+        # prefetch, an abandoned turn); otherwise the search goes on for the others
+        self.waiters[key] = self.waiters.get(key, 0) + 1
+        try:
+            summary = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.waiters[key] == 1:
+                task.cancel()
+            raise
+        finally:
+            self.waiters[key] -= 1
+            if not self.waiters[key]:
+                del self.waiters[key]
+        return summary
+    
+    async def _fetch(self, key: str, query: str) -> Optional[str]:
+        """One live search for a key, cached on success and backed off on failure"""
+        try:
+            summary = await self._summarize(query)
+        except Exception:
+            self._record_failure(key)
+            raise
+        if summary is None:
+            self._record_failure(key)
+            return None
+        self.failures.pop(key, None)
+        if SEARCH_CACHE:
+            self.cache[key] = {"query": query, "summary": summary, "fetched_at": time.time(),
+                               "ttl": self.topic_ttl(query)}
+            self.cache.move_to_end(key)
+            while len(self.cache) > SEARCH_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return summary
+    
+    async def _summarize(self, query: str) -> Optional[str]:
+        """Live search plus page extract, formatted for the LLM; None if nothing was found"""
+        results = await self.search_web(query, max_results=3)
+        if not results:
+            return None
+        
+        # Format search results
+        search_summary = f"Here's what I found about '{query}':\n\n"
+        
+        for i, result in enumerate(results, 1):
+            search_summary += f"{i}. **{result['title']}** ({result['source']})\n"
+            search_summary += f"   {result['snippet']}\n\n"
+        
+        # Get detailed content from first result
+        if results[0]['url']:
+            detailed_content = await self.get_page_content(results[0]['url'])
+            if detailed_content:
+                search_summary += f"**Additional details from {results[0]['source']}:**\n"
+                search_summary += f"{detailed_content[:800]}...\n\n"
+        
+        search_summary += f"*Information retrieved from web search - {len(results)} sources*"
+        return search_summary
+
+
+class _EdgeConnection:
+    """One authenticated Edge readaloud WebSocket and the output format it is configured for"""
+    
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.output_format: Optional[str] = None
+        self.requests = 0
+    
+    @property
+    def open(self) -> bool:
+        return self.websocket.open
+    
+    async def close(self):
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+
+
+class EdgeTTSClient:
+    """
+    Minimal Microsoft Edge readaloud client with a pool of warm connections
+    
+    Speaks the same WebSocket protocol as the edge-tts package, but lets each
+    request choose its outputFormat and sends the Sec-MS-GEC token the service
+    now requires (edge-tts 6.1.9 hard-codes MP3 and predates the token).
+    
+    The service answers one synthesis at a time per socket, so concurrent requests
+    are spread over up to pool_size kept-alive connections; extra requests open
+    overflow connections that are closed afterwards. Idle sockets are health checked
+    by WebSocket pings and replaced when they die.
+    """
+    
+    def __init__(self, url: str = "", voice: str = EDGE_TTS_VOICE, pool_size: int = EDGE_TTS_POOL_SIZE):
+        """
+        Initialize the client
+        
+        Args:
+            url: Service URL including TrustedClientToken (default: the public Edge endpoint)
+            voice: Full Edge voice name
+            pool_size: Idle connections kept warm between requests (0 = connect per request)
+        """
+        from edge_tts.constants import TRUSTED_CLIENT_TOKEN, WSS_URL
+        
+        self.url = url or WSS_URL
+        self.token = TRUSTED_CLIENT_TOKEN
+        self.voice = voice
+        self.pool_size = pool_size
+        # Most recently used last, so the warmest connection is handed out first
+        self._idle: List[_EdgeConnection] = []
+    
+    def _sec_ms_gec(self) -> str:
+        """SHA-256 of the current 5-minute window in Windows file time ticks plus the client token"""
+        seconds = int(time.time()) + 11644473600
+        seconds -= seconds % 300
+        return hashlib.sha256(f"{seconds * 10_000_000}{self.token}".encode("ascii")).hexdigest().upper()
+    
+    def _connect_url(self) -> str:
+        return (f"{self.url}&Sec-MS-GEC={self._sec_ms_gec()}&Sec-MS-GEC-Version=1-{EDGE_CHROMIUM_VERSION}"
+                f"&ConnectionId={uuid.uuid4().hex}")
+    
+    async def _connect(self) -> _EdgeConnection:
+        """Open and authenticate a new connection"""
+        import websockets
+        
+        major_version = EDGE_CHROMIUM_VERSION.split(".")[0]
+        headers = {
+            "Pragma": "no-cache",
+            "Cache-Control": "no-cache",
+            "Origin": "chrome-extension://jdiccldimpdaibmpdkjnbmckianbfold",
+            "User-Agent": (f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                           f"Chrome/{major_version}.0.0.0 Safari/537.36 Edg/{major_version}.0.0.0"),
+        }
+        try:
+            websocket = await asyncio.wait_for(
+                websockets.connect(self._connect_url(), extra_headers=headers, max_size=None,
+                                   ping_interval=EDGE_TTS_PING_INTERVAL, ping_timeout=EDGE_TTS_PING_INTERVAL),
+                timeout=EDGE_TTS_TIMEOUT)
+        except BaseException:
+            EDGE_TTS_CONNECTIONS.inc(event="failed")
+            raise
+        EDGE_TTS_CONNECTIONS.inc(event="opened")
+        return _EdgeConnection(websocket)
+    
+    def _prune(self):
+        """Forget idle connections that the service closed or the keepalive pings found dead"""
+        live = [connection for connection in self._idle if connection.open]
+        if len(live) < len(self._idle):
+            EDGE_TTS_CONNECTIONS.inc(len(self._idle) - len(live), event="dropped")
+            self._idle = live
+    
+    def _checkout(self) -> Optional[_EdgeConnection]:
+        """Take the warmest live idle connection"""
+        self._prune()
+        return self._idle.pop() if self._idle else None
+    
+    async def _release(self, connection: _EdgeConnection):
+        """Return a connection to the pool, or close it if the pool is full"""
+        self._prune()
+        if connection.open and len(self._idle) < self.pool_size:
+            self._idle.append(connection)
+        else:
+            await connection.close()
+    
+    async def warm(self, count: Optional[int] = None):
+        """
+        Open connections ahead of demand so the first syntheses skip the handshake
+        
+        Args:
+            count: Idle connections wanted (default: pool_size)
+            
+        Raises:
+            Exception: The first connection error, if no connection could be opened
+        """
+        wanted = min(self.pool_size if count is None else count, self.pool_size)
+        self._prune()
+        results = await asyncio.gather(*(self._connect() for _ in range(wanted - len(self._idle))),
+                                       return_exceptions=True)
+        errors = [result for result in results if not isinstance(result, _EdgeConnection)]
+        for result in results:
+            if isinstance(result, _EdgeConnection):
+                await self._release(result)
+        if errors and len(errors) == len(results):
+            raise errors[0]
+    
+    async def close(self):
+        """Close every idle connection"""
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(connection.close() for connection in idle))
+    
+    async def synthesize(self, text: str, output_format: str) -> bytes:
+        """
+        Synthesize text on a pooled connection
+        
+        Args:
+            text: Plain text to speak
+            output_format: Edge outputFormat, e.g. "webm-24khz-16bit-mono-opus"
+            
+        Returns:
+            Encoded audio in the requested format
+        """
+        import websockets
+        
+        connection = self._checkout()
+        reused = connection is not None
+        if connection is None:
+            connection = await self._connect()
+        else:
+            EDGE_TTS_CONNECTIONS.inc(event="reused")
+        trace_annotate(connection="reused" if reused else "new")
+        
+        try:
+            audio = await self._request(connection, text, output_format)
+        except (websockets.ConnectionClosed, OSError):
+            await connection.close()
+            if not reused:
+                raise
+            # The service may drop an idle socket between pings; retry once on a fresh connection
+            EDGE_TTS_CONNECTIONS.inc(event="stale")
+            connection = await self._connect()
+            try:
+                audio = await self._request(connection, text, output_format)
+            except BaseException:
+                await connection.close()
+                raise
+        except BaseException:
+            # Timed out or cancelled mid-request: the socket may still deliver that audio, so never reuse it
+            await connection.close()
+            raise
+        
+        await self._release(connection)
+        return audio
+    
+    async def _request(self, connection: _EdgeConnection, text: str, output_format: str) -> bytes:
+        """Send one SSML request (plus speech.config if the format changed) and collect its audio until turn.end"""
+        from xml.sax.saxutils import escape
+        
+        websocket = connection.websocket
+        timestamp = time.strftime("%a %b %d %Y %H:%M:%S GMT+0000 (Coordinated Universal Time)", time.gmtime())
+        if connection.output_format != output_format:
+            await websocket.send(
+                f"X-Timestamp:{timestamp}\r\nContent-Type:application/json; charset=utf-8\r\nPath:speech.config\r\n\r\n"
+                '{"context":{"synthesis":{"audio":{"metadataoptions":{'
+                '"sentenceBoundaryEnabled":false,"wordBoundaryEnabled":false},'
+                f'"outputFormat":"{output_format}"'
+                "}}}}\r\n"
+            )
+            connection.output_format = output_format
+        request_id = uuid.uuid4().hex
+        await websocket.send(
+            f"X-RequestId:{request_id}\r\nContent-Type:application/ssml+xml\r\n"
+            f"X-Timestamp:{timestamp}Z\r\nPath:ssml\r\n\r\n"
+            "<speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xml:lang='en-US'>"
+            f"<voice name='{self.voice}'><prosody pitch='+0Hz' rate='+0%' volume='+0%'>"
+            f"{escape(text)}</prosody></voice></speak>"
+        )
+        connection.requests += 1
+        
+        # Frames are matched to this request by X-RequestId, so nothing left over on a reused
+        # connection can leak into this reply
+        request_header = f"X-RequestId:{request_id}"
+        audio = bytearray()
+        while True:
+            message = await asyncio.wait_for(websocket.recv(), timeout=EDGE_TTS_TIMEOUT)
+            if isinstance(message, bytes):
+                header_length = int.from_bytes(message[:2], "big")
+                header = message[2:2 + header_length]
+                if b"Path:audio" in header and request_header.encode() in header:
+                    audio += message[2 + header_length:]
+            elif "Path:turn.end" in message and request_header in message:
+                return bytes(audio)
+
+
+class LocalTTS:
+    """In-process Piper voice on the CPU, loaded once per container"""
+    
+    def __init__(self, model_path: str = LOCAL_TTS_MODEL, threads: int = LOCAL_TTS_THREADS):
+        """
+        Initialize the engine (the model is loaded by warm() or the first synthesis)
+        
+        Args:
+            model_path: Piper .onnx voice; its .onnx.json config sits next to it
+            threads: onnxruntime threads per synthesis
+        """
+        self.model_path = model_path
+        self.threads = threads
+        self.voice = None
+        self._loading: Optional[asyncio.Task] = None
+        # One synthesis at a time: each already uses every thread it is given
+        self._slot = asyncio.Semaphore(1)
+    
+    def available(self) -> bool:
+        """True if the voice model is present (Piper itself is imported on load)"""
+        return os.path.exists(self.model_path)
+    
+    async def warm(self):
+        """Load the voice in a worker thread, once; concurrent callers share the load"""
+        if self.voice is not None:
+            return
+        if self._loading is None or (self._loading.done() and self._loading.exception()):
+            self._loading = asyncio.create_task(asyncio.to_thread(self._load))
+        await asyncio.shield(self._loading)
+    
+    def _load(self):
+        """Build the Piper voice with a thread-limited onnxruntime session"""
+        import onnxruntime
+        from piper.config import PiperConfig
+        from piper.voice import PiperVoice
+        
+        started = time.perf_counter()
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        with open(f"{self.model_path}.json", encoding="utf-8") as config_file:
+            config = PiperConfig.from_dict(json.load(config_file))
+        session = onnxruntime.InferenceSession(self.model_path, sess_options=options,
+                                               providers=["CPUExecutionProvider"])
+        self.voice = PiperVoice(config=config, session=session)
+        print(f"🗣️  Local TTS voice loaded in {time.perf_counter() - started:.2f}s ({os.path.basename(self.model_path)})")
+    
+    @property
+    def sample_rate(self) -> int:
+        """Output sample rate of the loaded voice"""
+        return self.voice.config.sample_rate
+    
+    def synthesize_pcm(self, text: str) -> bytes:
+        """
+        Synthesize text on the calling thread
+        
+        Args:
+            text: Text to speak
+            
+        Returns:
+            16-bit mono PCM at sample_rate
+        """
+        return b"".join(self.voice.synthesize_stream_raw(text, sentence_silence=0.1))
+    
+    async def synthesize(self, text: str, audio_format: str = DEFAULT_AUDIO_FORMAT) -> bytes:
+        """
+        Synthesize text off the event loop, encoded like the network backends' output
+        
+        Args:
+            text: Text to speak
+            audio_format: AUDIO_FORMATS key
+            
+        Returns:
+            Encoded audio (WAV if the format needs ffmpeg and it is unavailable)
+        """
+        await self.warm()
+        async with self._slot:
+            pcm = await asyncio.to_thread(self.synthesize_pcm, text)
+        trace_annotate(audio_seconds=round(len(pcm) / (2 * self.sample_rate), 2))
+        
+        encoding = AUDIO_FORMATS[audio_format]["local"]
+        if encoding:
+            encoded = await _ffmpeg(["-f", "s16le", "-ar", str(self.sample_rate), "-ac", "1", "-i", "pipe:0",
+                                     "-ar", "24000", *encoding, "pipe:1"], pcm)
+            if encoded:
+                return encoded
+        import numpy as np
+        
+        return await asyncio.to_thread(_encode_pcm, np.frombuffer(pcm, dtype="<i2"), self.sample_rate)
+
+
+async def _ffmpeg(args: List[str], data: bytes) -> Optional[bytes]:
+    """Pipe data through ffmpeg, returning its output (None if ffmpeg is missing or fails)"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-nostdin", "-loglevel", "error", *args,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    except FileNotFoundError:
+        return None
+    try:
+        output, _ = await process.communicate(data)
+    finally:
+        if process.returncode is None:
+            process.kill()
+    return output if process.returncode == 0 and output else None
+
+
+def _resample(samples, sample_rate: int, target_rate: int):
+    """Band-limited (FFT) resampling of a whole clip"""
+    import numpy as np
+    
+    if sample_rate == target_rate or not len(samples):
+        return samples
+    count = int(round(len(samples) * target_rate / sample_rate))
+    bins = count // 2 + 1
+    spectrum = np.fft.rfft(samples)
+    # Downsampling drops everything above the new Nyquist frequency; upsampling zero-pads
+    spectrum = spectrum[:bins] if bins <= len(spectrum) else np.pad(spectrum, (0, bins - len(spectrum)))
+    return (np.fft.irfft(spectrum, count) * (count / len(samples))).astype(np.float32)
+
+
+async def decode_pcm(audio_data: bytes) -> Optional[Any]:
+    """
+    Decode a client clip to 16 kHz mono float32 PCM
+    
+    WAV/FLAC/OGG decode in-process with soundfile; browser WebM/Opus (and anything
+    else) goes through ffmpeg, installed in api_image.
+    
+    Args:
+        audio_data: Encoded clip as received from the client
+        
+    Returns:
+        Samples at STT_SAMPLE_RATE, or None if the clip could not be decoded
+    """
+    import io
+    import numpy as np
+    import soundfile as sf
+    
+    try:
+        samples, sample_rate = sf.read(io.BytesIO(audio_data), dtype="float32", always_2d=True)
+    except Exception:
+        pcm = await _ffmpeg(["-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(STT_SAMPLE_RATE), "pipe:1"],
+                            audio_data)
+        return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768 if pcm else None
+    
+    samples = samples.mean(axis=1)
+    if sample_rate != STT_SAMPLE_RATE:
+        samples = await asyncio.to_thread(_resample, samples, sample_rate, STT_SAMPLE_RATE)
+    return samples
+
+
+async def encode_for_stt(samples, upload_format: str = STT_UPLOAD_FORMAT) -> Optional[bytes]:
+    """
+    Encode 16 kHz mono PCM for STT upload
+    
+    Args:
+        samples: Mono float32 PCM at STT_SAMPLE_RATE
+        upload_format: "opus", "flac", "wav" or "original"
+        
+    Returns:
+        Encoded clip, or None for "original"
+    """
+    if upload_format == "original":
+        return None
+    if upload_format == "opus":
+        encoded = await _ffmpeg(["-f", "f32le", "-ar", str(STT_SAMPLE_RATE), "-ac", "1", "-i", "pipe:0",
+                                 "-c:a", "libopus", "-b:a", STT_OPUS_BITRATE, "-application", "voip",
+                                 "-f", "ogg", "pipe:1"], samples.astype("<f4").tobytes())
+        if encoded:
+            return encoded
+        # No ffmpeg: libsndfile's Opus encoder costs ~40 ms per second of audio, so fall back to FLAC
+        upload_format = "flac"
+    return await asyncio.to_thread(_encode_pcm, samples, STT_SAMPLE_RATE, upload_format.upper())
+
+
+def analyze_speech(samples, sample_rate: int) -> Dict:
+    """
+    Decide whether a clip holds speech from per-frame energy and spectral flatness
+    
+    Frames count as speech when they are above GATE_SILENCE_DBFS, stand out from the
+    clip's own noise floor and have a peaky (voiced) rather than flat (noise) spectrum.
+    
+    Args:
+        samples: Mono float32 PCM in [-1, 1]
+        sample_rate: Sample rate of samples
+        
+    Returns:
+        {"speech", "reason" (speech/silence/noise/too_short), "speech_seconds", "speech_ratio",
+         "start", "end"}, start/end being the sample range of the speech plus padding
+    """
+    import numpy as np
+    
+    frame = max(1, int(sample_rate * GATE_FRAME_MS / 1000))
+    count = len(samples) // frame
+    result = {"speech": False, "reason": "too_short", "speech_seconds": 0.0, "speech_ratio": 0.0,
+              "start": 0, "end": len(samples)}
+    if count == 0:
+        return result
+    
+    frames = np.asarray(samples[:count * frame], dtype=np.float32).reshape(count, frame)
+    rms_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-12)
+    energetic = rms_db > GATE_SILENCE_DBFS
+    power = np.abs(np.fft.rfft(frames * np.hanning(frame), axis=1)) ** 2 + 1e-12
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    voiced = (energetic & (rms_db > np.percentile(rms_db, 10) + GATE_NOISE_MARGIN_DB)
+              & (flatness < GATE_MAX_FLATNESS))
+    
+    frame_seconds = frame / sample_rate
+    energetic_seconds = float(energetic.sum()) * frame_seconds
+    result["speech_seconds"] = round(float(voiced.sum()) * frame_seconds, 3)
+    result["speech_ratio"] = round(float(voiced.mean()), 3)
+    if energetic_seconds < GATE_MIN_SPEECH_SECONDS:
+        result["reason"] = "silence" if energetic_seconds == 0 else "too_short"
+        return result
+    if result["speech_seconds"] < GATE_MIN_SPEECH_SECONDS or result["speech_ratio"] < GATE_MIN_SPEECH_RATIO:
+        result["reason"] = "noise"
+        return result
+    
+    speech_frames = np.flatnonzero(voiced)
+    padding = int(GATE_TRIM_PADDING_SECONDS * sample_rate)
+    result.update(
+        speech=True,
+        reason="speech",
+        start=max(0, int(speech_frames[0]) * frame - padding),
+        end=min(len(samples), (int(speech_frames[-1]) + 1) * frame + padding),
+    )
+    return result
+
+
+def _encode_pcm(samples, sample_rate: int, container: str = "WAV") -> bytes:
+    """16-bit mono WAV or FLAC bytes"""
+    import io
+    import soundfile as sf
+    
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, sample_rate, format=container, subtype="PCM_16")
+    return buffer.getvalue()
+
+
+class VoiceAssistant:
+    """Main voice assistant class handling speech-to-text, LLM, and text-to-speech"""
+    
+    def __init__(self, admission: Optional["AdmissionController"] = None):
+        """
+        Initialize the voice assistant with API clients and models
+        
+        Args:
+            admission: Shared admission controller bounding per-stage concurrency
+        """
+        self.admission = admission or AdmissionController()
+        
+        # SDKs are imported lazily to keep module import (and cold start) cheap
+        from groq import AsyncGroq, DefaultAsyncHttpxClient
+        import httpx
+        import openai
+        
+        # Initialize Groq client for fast LLM inference. Async clients let a
+        # cancelled turn abort its in-flight HTTP request instead of waiting on it.
+        # Longer keep-alive, so a connection pre-warmed on accept survives the user's first question.
+        self.groq_client = AsyncGroq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                max_connections=100, max_keepalive_connections=20, keepalive_expiry=PROVIDER_KEEPALIVE_SECONDS)),
+        )
+        
+        # Initialize OpenAI client for fallback STT/TTS (optional)
+        self.openai_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None
+        
+        # Local Whisper fallback runs in a separate worker service
+        self.local_stt = LocalWhisperClient()
+        
+        # Initialize web search
+        self.web_searcher = WebSearcher(self.admission)
+        
+        # Edge TTS client (EDGE_TTS_URL points it at a stub for offline benchmarks)
+        self.edge_tts = EdgeTTSClient(EDGE_TTS_URL)
+        
+        # CPU voice in this process, for when the network TTS services are down (LOCAL_TTS_MODE)
+        self.local_tts = LocalTTS() if LOCAL_TTS_MODE != "off" else None
+        
+        # Circuit breakers, so providers known to be down are skipped instead of timing out every turn
+        self.providers = ProviderRegistry()
+        
+        # Paces Groq requests within the account's rate limits, interactive turns first
+        self.groq_limits = GroqRateLimiter()
+        
+        # Encoding of speech clips sent to STT providers
+        self.upload_format = STT_UPLOAD_FORMAT
+        
+        # Shared pre-warm run, so sessions connecting together do not each open connections
+        self._prewarm_task: Optional[asyncio.Task] = None
+    
+    def prewarm(self) -> asyncio.Task:
+        """
+        Start warming provider connections in the background (or join the run already in progress)
+        
+        Called when a session connects, so the handshakes overlap with the user speaking
+        instead of landing on the first turn.
+        
+        Returns:
+            Task resolving to each target's outcome ("ok", "skipped" or the error)
+        """
+        if self._prewarm_task is None or self._prewarm_task.done():
+            self._prewarm_task = asyncio.create_task(self._prewarm())
+        return self._prewarm_task
+    
+    async def _prewarm(self) -> Dict[str, str]:
+        """Warm every target concurrently; targets whose circuit is open are skipped"""
+        targets = {
+            # Cheap authenticated GET that opens the HTTP/TLS connection STT and the LLM reuse
+            "groq": self.groq_client.models.list,
+            "tts.edge": self.edge_tts.warm,
+            "search": self.web_searcher.warm,
+            "stt.local_whisper": self.local_stt.warm,
+        }
+        if self.local_tts is not None and self.local_tts.available():
+            # Loads the voice at container start (the startup pre-warm), not on the first failover
+            targets["tts.local"] = self.local_tts.warm
+        
+        async def warm(target: str, method: Callable[[], Awaitable]) -> str:
+            breaker = self.providers.breakers.get(target)
+            if breaker is not None and breaker.state == "open":
+                PREWARM_RESULTS.inc(target=target, outcome="skipped")
+                return "skipped"
+            started = time.perf_counter()
+            try:
+                await method()
+            except Exception as e:
+                print(f"⚠️  Pre-warm of {target} failed: {e}")
+                PREWARM_RESULTS.inc(target=target, outcome="error")
+                return str(e)
+            PREWARM_DURATION.observe(time.perf_counter() - started, target=target)
+            PREWARM_RESULTS.inc(target=target, outcome="ok")
+            return "ok"
+        
+        outcomes = await asyncio.gather(*(warm(target, method) for target, method in targets.items()))
+        return dict(zip(targets, outcomes))
+    
+    @traced("stt")
+    @admitted("stt")
+    async def speech_to_text(self, audio_data: bytes) -> str:
+        """
+        Convert speech to text using multiple STT options with fallbacks
+        
+        Args:
+            audio_data: Raw audio data in bytes
+            
+        Returns:
+            Transcribed text string
+        """
+        try:
+            print(f"🎤 Processing audio data: {len(audio_data)} bytes")
+            
+            audio_data = await self._prepare_upload(audio_data)
+            if audio_data is None:
+                return ""
+            
+            # Preferred order: Groq Whisper (fastest; each model has its own breaker), local Whisper
+            # (free), OpenAI Whisper. Unhealthy providers move to the back, open breakers are skipped.
+            providers = {}
+            if os.getenv("GROQ_API_KEY"):
+                providers["stt.groq"] = ("groq", self._groq_speech_to_text)
+            providers["stt.local_whisper"] = ("local_whisper", self._local_speech_to_text)
+            if self.openai_client:
+                providers["stt.openai"] = ("openai", self._openai_speech_to_text)
+            
+            for name in self.providers.rank(list(providers)):
+                label, method = providers[name]
+                if name == "stt.groq":
+                    transcription = await method(audio_data)
+                else:
+                    transcription = await self.providers.call(name, method, audio_data)
+                if transcription:
+                    trace_annotate(provider=label)
+                    return transcription
+            
+            print("⚠️ All STT options failed or returned poor results")
+            return ""
+            
+        except Exception as e:
+            print(f"❌ Speech-to-text processing failed: {e}")
+            return ""
+    
+    @traced("stt")
+    async def streaming_speech_to_text(self, stream: "StreamingTranscription") -> Optional[str]:
+        """
+        Finalize a streamed turn's transcript at the endpoint
+        
+        Args:
+            stream: The turn's streaming transcription
+            
+        Returns:
+            Transcript ("" if the speech gate rejects the audio), or None if local Whisper
+            failed and the audio should go through speech_to_text instead
+        """
+        started = time.perf_counter()
+        if SPEECH_GATE:
+            analysis = analyze_speech(stream.samples(), STT_SAMPLE_RATE)
+            SPEECH_GATE_SECONDS.observe(time.perf_counter() - started)
+            SPEECH_GATE_RESULTS.inc(result=analysis["reason"])
+            trace_annotate(gate=analysis["reason"], speech_seconds=analysis["speech_seconds"])
+            if not analysis["speech"]:
+                print(f"🔇 Speech gate rejected streamed audio: {analysis['reason']}")
+                stream.cancel()
+                return ""
+        
+        try:
+            transcription = (await stream.finish()).strip()
+        except Exception as e:
+            print(f"❌ Streaming local Whisper failed: {e}")
+            trace_annotate(error=str(e))
+            return None
+        
+        STREAM_FINALIZE_SECONDS.observe(time.perf_counter() - started)
+        trace_annotate(provider="local_whisper_streaming", partials=stream.partials,
+                       audio_seconds=round(stream.seconds, 2))
+        print(f"✅ Streaming local Whisper: '{transcription}' ({stream.partials} partials)")
+        if len(transcription) > 2 and transcription.lower() not in ["thank you", "thank you.", "thanks", "thanks."]:
+            return transcription
+        return None
+    
+    def prefetch_search(self, text: str, current: Optional[Tuple[str, asyncio.Task]] = None
+                        ) -> Optional[Tuple[str, asyncio.Task]]:
+        """
+        Start the web search a partial transcript calls for, before the user has finished speaking
+        
+        The search runs in the "search" admission stage like any other; replacing it cancels the
+        previous search outright, unless another turn is waiting on the same query.
+        
+        Args:
+            text: Committed part of the partial transcript
+            current: Search already prefetched for an earlier partial
+            
+        Returns:
+            (query, task) of the search for this transcript, or current if none is needed yet
+        """
+        if not self._needs_web_search(text):
+            return current
+        query = self._extract_search_query(text)
+        if current is not None:
+            if current[0] == query:
+                return current
+            current[1].cancel()
+        SEARCH_PREFETCH.inc(outcome="started")
+        task = asyncio.create_task(self._search(query))
+        # A prefetch that is never used may still have failed (e.g. at capacity); nobody awaits it then
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return query, task
+    
+    async def _search(self, query: str) -> str:
+        """Search and summarize within the search stage's admission limit"""
+        async with self.admission.stage("search"):
+            return await self.web_searcher.search_and_summarize(query)
+    
+    async def _prepare_upload(self, audio_data: bytes) -> Optional[bytes]:
+        """
+        Gate and compact a clip before any STT provider sees it
+        
+        The clip is decoded to 16 kHz mono, checked for speech (SPEECH_GATE), trimmed to
+        the speech and re-encoded as STT_UPLOAD_FORMAT.
+        
+        Args:
+            audio_data: Encoded clip from the client
+            
+        Returns:
+            The clip to upload (the client's bytes if re-encoding does not make it smaller), or
+            None if it holds no speech. Clips that cannot be decoded are passed through unchanged.
+        """
+        STT_UPLOAD_BYTES.inc(len(audio_data), stage="received")
+        started = time.perf_counter()
+        samples = await decode_pcm(audio_data)
+        if samples is None:
+            SPEECH_GATE_RESULTS.inc(result="undecodable")
+            trace_annotate(gate="undecodable")
+            STT_UPLOAD_BYTES.inc(len(audio_data), stage="uploaded")
+            return audio_data
+        
+        if SPEECH_GATE:
+            analysis = analyze_speech(samples, STT_SAMPLE_RATE)
+            SPEECH_GATE_SECONDS.observe(time.perf_counter() - started)
+            SPEECH_GATE_RESULTS.inc(result=analysis["reason"])
+            trace_annotate(gate=analysis["reason"], speech_seconds=analysis["speech_seconds"])
+            
+            if not analysis["speech"]:
+                print(f"🔇 Speech gate rejected clip: {analysis['reason']} "
+                      f"({analysis['speech_seconds']}s speech, ratio {analysis['speech_ratio']})")
+                SPEECH_GATE_SAVED_BYTES.inc(len(audio_data), reason="rejected")
+                return None
+            samples = samples[analysis["start"]:analysis["end"]]
+        
+        encoded = await encode_for_stt(samples, self.upload_format)
+        upload = encoded if encoded and len(encoded) < len(audio_data) else audio_data
+        trace_annotate(upload_bytes=len(upload), upload_mime=_sniff_audio_mime(upload),
+                       prepare_ms=round((time.perf_counter() - started) * 1000, 1))
+        STT_UPLOAD_BYTES.inc(len(upload), stage="uploaded")
+        return upload
+    
+    @traced("stt.groq")
+    async def _groq_speech_to_text(self, audio_data: bytes) -> str:
+        """Process audio using Groq Whisper API"""
+        try:
+            import tempfile
+            
+            # Too-short and silent clips were already rejected by the speech gate
+            suffix = "." + _audio_extension(_sniff_audio_mime(audio_data))
+            with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp_file:
+                tmp_file.write(audio_data)
+                tmp_file.flush()
+                
+                # Try Groq Whisper models, skipping any whose breaker is open
+                models = ["whisper-large-v3", "distil-whisper-large-v3-en"]
+                
+                breakers = {f"stt.groq.{model}": model for model in models}
+                
+                for name in self.providers.rank(list(breakers)):
+                    try:
+                        transcription = await self.providers.call(name, self._groq_model_transcribe,
+                                                                  breakers[name], tmp_file.name)
+                    except GroqRateLimited:
+                        continue
+                    if transcription:
+                        os.unlink(tmp_file.name)
+                        return transcription
+                
+                os.unlink(tmp_file.name)
+                
+        except Exception as e:
+            print(f"❌ Groq Whisper processing failed: {e}")
+            trace_annotate(error=str(e))
+        
+        return ""
+    
+    async def _groq_model_transcribe(self, model: str, path: str) -> str:
+        """Transcribe with one Groq Whisper model, filtering common misrecognitions"""
+        with trace_span(f"stt.groq.{model}", model=model):
+            try:
+                with open(path, "rb") as audio_file:
+                    response = await self.groq_limits.call(
+                        model,
+                        self.groq_client.audio.transcriptions.with_raw_response.create,
+                        file=audio_file,
+                        language="en",
+                        temperature=0.0
+                    )
+                
+                transcription = response.text.strip() if response.text else ""
+                print(f"✅ Groq {model}: '{transcription}'")
+                
+                # Filter out common misrecognitions
+                if transcription and len(transcription) > 2:
+                    if transcription.lower() not in ["thank you", "thank you.", "thanks", "thanks."]:
+                        trace_annotate(outcome="ok", out_size=len(transcription))
+                        return transcription
+                trace_annotate(outcome="empty", error="filtered or empty transcription")
+                
+            except GroqRateLimited as e:
+                # The caller falls through to the next model; the breaker records nothing for this call
+                print(f"🚦 {e}")
+                trace_annotate(outcome="rate_limited", error=str(e))
+                raise
+            except Exception as e:
+                print(f"❌ Groq {model} failed: {e}")
+                provider_error(e)
+                trace_annotate(outcome="error")
+        
+        return ""
+    
+    @traced("stt.local_whisper")
+    async def _local_speech_to_text(self, audio_data: bytes) -> str:
+        """Process audio using the local Whisper worker service (fallback only)"""
+        try:
+            transcription = await self.local_stt.transcribe(audio_data)
+            print(f"✅ Local Whisper: '{transcription}'")
+            
+            if transcription and len(transcription) > 2:
+                return transcription
+            
+        except LocalWhisperQueueFull as e:
+            print(f"🚦 Skipping local Whisper: {e}")
+            trace_annotate(error=str(e))
+        except Exception as e:
+            print(f"❌ Local Whisper failed: {e}")
+            provider_error(e)
+        
+        return ""
+    
+    @traced("stt.openai")
+    async def _openai_speech_to_text(self, audio_data: bytes) -> str:
+        """Process audio using OpenAI Whisper API"""
+        try:
+            mime = _sniff_audio_mime(audio_data)
+            audio_file = (f"audio.{_audio_extension(mime)}", audio_data, mime.split(";")[0])
+            response = await self.openai_client.audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                language="en",
+                temperature=0.0
+            )
+            
+            transcription = response.text.strip() if response.text else ""
+            print(f"✅ OpenAI Whisper: '{transcription}'")
+            
+            if transcription and len(transcription) > 2:
+                return transcription
+                
+        except Exception as e:
+            print(f"❌ OpenAI Whisper failed: {e}")
+            provider_error(e)
+        
+        return ""
+    
+    async def generate_response(self, user_message: str,
+                                search_prefetch: Optional[Tuple[str, asyncio.Task]] = None) -> str:
+        """
+        Generate response using Groq LLM with optional web search
+        
+        Args:
+            user_message: User's input message
+            search_prefetch: (query, task) of a search started from a partial transcript; used if
+                the final message asks for the same query, cancelled otherwise
+            
+        Returns:
+            Generated response text
+        """
+        try:
+            print(f"🧠 Generating response for: '{user_message}'")
+            system_context, max_tokens = await self._response_context(user_message, search_prefetch)
+            
+            with trace_span("llm", provider="groq", model="llama-3.3-70b-versatile",
+                            in_size=len(system_context) + len(user_message)):
+                async with self.admission.stage("llm"):
+                    completion = await self.groq_limits.call(
+                        "llama-3.3-70b-versatile",
+                        self.groq_client.chat.completions.with_raw_response.create,
+                        tokens=(len(system_context) + len(user_message)) // GROQ_CHARS_PER_TOKEN + max_tokens,
+                        messages=[
+                            {"role": "system", "content": system_context},
+                            {"role": "user", "content": user_message}
+                        ],
+                        max_tokens=max_tokens,
+                        temperature=0.7,
+                        stream=False
+                    )
+                
+                response = completion.choices[0].message.content
+                trace_annotate(outcome="ok", out_size=len(response),
+                               completion_tokens=getattr(completion.usage, "completion_tokens", None))
+            print(f"✅ Generated response: {len(response)} characters")
+            return response
+        
+        except CapacityExceeded:
+            raise
+        except GroqRateLimited as e:
+            print(f"🚦 {e}")
+            raise CapacityExceeded("llm", max(1, round(e.retry_after))) from e
+        except Exception as e:
+            print(f"❌ Groq LLM Error: {e}")
+            return LLM_ERROR_REPLY
+    
+    async def stream_response(self, user_message: str) -> AsyncIterator[str]:
+        """
+        Generate a response like generate_response, yielding text as the LLM produces it
+        
+        Args:
+            user_message: User's input message
+            
+        Yields:
+            Text deltas (LLM_ERROR_REPLY if the LLM fails before producing any)
+            
+        Raises:
+            CapacityExceeded: If the search or LLM stage is saturated
+        """
+        produced = False
+        try:
+            print(f"🧠 Streaming response for: '{user_message}'")
+            system_context, max_tokens = await self._response_context(user_message)
+            
+            async with self.admission.stage("llm"):
+                stream = await self.groq_limits.call(
+                    "llama-3.3-70b-versatile",
+                    self.groq_client.chat.completions.with_raw_response.create,
+                    tokens=(len(system_context) + len(user_message)) // GROQ_CHARS_PER_TOKEN + max_tokens,
+                    messages=[
+                        {"role": "system", "content": system_context},
+                        {"role": "user", "content": user_message}
+                    ],
+                    max_tokens=max_tokens,
+                    temperature=0.7,
+                    stream=True
+                )
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        produced = True
+                        yield delta
+        
+        except CapacityExceeded:
+            raise
+        except GroqRateLimited as e:
+            print(f"🚦 {e}")
+            raise CapacityExceeded("llm", max(1, round(e.retry_after))) from e
+        except Exception as e:
+            print(f"❌ Groq LLM Error: {e}")
+            if not produced:
+                yield LLM_ERROR_REPLY
+    
+    async def _response_context(self, user_message: str,
+                                search_prefetch: Optional[Tuple[str, asyncio.Task]] = None) -> Tuple[str, int]:
+        """System prompt (with web results when the message needs current information) and token budget"""
+        try:
+            # Regular response for Mohan-specific questions
+            system_context = MOHAN_CONTEXT
+            max_tokens = 800
+            
+            # Check if we need current information
+            if self._needs_web_search(user_message):
+                print("🌐 Searching web for current information...")
+                
+                # Extract search query
+                search_query = self._extract_search_query(user_message)
+                if search_prefetch is not None and search_prefetch[0] == search_query:
+                    SEARCH_PREFETCH.inc(outcome="hit")
+                    trace_annotate(search_prefetched=True)
+                    web_info = await search_prefetch[1]
+                    search_prefetch = None
+                else:
+                    web_info = await self._search(search_query)
+                
+                # Enhanced context with web information
+                system_context = MOHAN_CONTEXT + f"""
+
+CURRENT INFORMATION FROM WEB SEARCH:
+{web_info}
+
+INSTRUCTIONS: You now have access to current information from the web search above.
+Use this information to answer questions about current events, latest news, trends, etc.
+Always mention that you searched the web for current information.
+Combine Mohan's expertise with current information when relevant.
+"""
+                max_tokens = 1000
+            
+            return system_context, max_tokens
+        finally:
+            if search_prefetch is not None:
+                SEARCH_PREFETCH.inc(outcome="miss")
+                search_prefetch[1].cancel()
+    
+    def _needs_web_search(self, user_message: str) -> bool:
+        """Determine if a question requires current information from the web"""
+        current_info_keywords = [
+            "latest", "recent", "current", "today", "this week", "this month", "2024", "2025",
+            "news", "breaking", "update", "trending", "happening now", "what's new",
+            "current events", "recent developments", "latest trends", "new releases",
+            "market", "stock", "price", "crypto", "bitcoin", "ai news", "technology news"
+        ]
+        
+        user_lower = user_message.lower()
+        return any(keyword in user_lower for keyword in current_info_keywords)
+    
+    def _extract_search_query(self, user_message: str) -> str:
+        """Extract search query from user message"""
+        # Remove question words and clean up for better search
+        query = user_message.replace("what's", "").replace("what is", "").replace("tell me about", "")
+        query = query.replace("what are", "").replace("?", "").strip()
+        return query
+    
+    @traced("tts")
+    async def text_to_speech(self, text: str, audio_format: str = DEFAULT_AUDIO_FORMAT) -> bytes:
+        """
+        Convert text to speech using multiple TTS options with fallbacks
+        
+        Args:
+            text: Text to convert to speech
+            audio_format: AUDIO_FORMATS key requested from each backend
+            
+        Returns:
+            Audio data in bytes (the beep fallback, and local TTS without ffmpeg, is WAV)
+        """
+        trace_annotate(audio_format=audio_format)
+        return await self._synthesize(text, audio_format)
+    
+    @traced("tts")
+    async def speak_sentences(self, sentences: List[str], audio_format: str,
+                              emit: Callable[[int, bytes], Awaitable[None]]) -> int:
+        """
+        Synthesize sentences in parallel and emit their audio in order
+        
+        The first sentence starts immediately; the others share TTS_PARALLELISM
+        synthesis slots. Every synthesis holds its own "tts" stage slot; only the
+        first sentence can be rejected at capacity, later ones wait rather than cut
+        a reply off mid-way. Each sentence is emitted as soon as it and every
+        sentence before it are ready, so playback can start before the whole
+        reply is synthesized.
+        
+        Args:
+            sentences: Reply split by split_sentences
+            audio_format: AUDIO_FORMATS key requested from each backend
+            emit: Coroutine called with (index, audio) in sentence order
+            
+        Returns:
+            Total audio bytes emitted
+            
+        Raises:
+            CapacityExceeded: If the "tts" stage is saturated before the first sentence
+        """
+        trace_annotate(audio_format=audio_format, sentences=len(sentences),
+                       in_size=sum(len(sentence) for sentence in sentences))
+        slots = asyncio.Semaphore(max(TTS_PARALLELISM, 1))
+        
+        async def synthesize(index: int, sentence: str) -> bytes:
+            if index == 0:
+                return await self._synthesize(sentence, audio_format, local_first=LOCAL_TTS_MODE == "first")
+            async with slots:
+                return await self._synthesize(sentence, audio_format, reject_when_full=False)
+        
+        tasks = [asyncio.create_task(synthesize(index, sentence)) for index, sentence in enumerate(sentences)]
+        total_bytes = 0
+        try:
+            for index, task in enumerate(tasks):
+                audio_data = await task
+                total_bytes += len(audio_data)
+                await emit(index, audio_data)
+        finally:
+            # A cancelled turn stops the sentences still being synthesized
+            for task in tasks:
+                task.cancel()
+        
+        trace_annotate(out_size=total_bytes)
+        return total_bytes
+    
+    async def _synthesize(self, text: str, audio_format: str, local_first: bool = False,
+                          reject_when_full: bool = True) -> bytes:
+        """
+        Run the TTS fallback chain: Edge, then OpenAI, then the local voice, then a beep
+        
+        Holds one "tts" stage slot for the synthesis. Providers with open breakers are skipped;
+        local_first moves the local voice to the front.
+        """
+        async with self.admission.stage("tts", reject_when_full=reject_when_full):
+            return await self._synthesize_admitted(text, audio_format, local_first)
+    
+    async def _synthesize_admitted(self, text: str, audio_format: str, local_first: bool) -> bytes:
+        """The fallback chain of _synthesize, inside its stage slot"""
+        try:
+            # Option 1: Edge TTS (Microsoft's free service); option 2: OpenAI TTS (if API key available);
+            # option 3: local CPU voice (no network, lower quality)
+            providers = {"tts.edge": ("edge", self._edge_text_to_speech)}
+            if self.openai_client:
+                providers["tts.openai"] = ("openai", self._openai_text_to_speech)
+            if self.local_tts is not None and self.local_tts.available():
+                providers["tts.local"] = ("local", self._local_text_to_speech)
+                if local_first:
+                    providers = {"tts.local": providers.pop("tts.local"), **providers}
+            
+            for name in self.providers.rank(list(providers)):
+                label, method = providers[name]
+                audio_data = await self.providers.call(name, method, text, audio_format, empty_is_failure=True)
+                if audio_data:
+                    trace_annotate(provider=label)
+                    return audio_data
+            
+            # Option 4: Simple beep as final fallback
+            trace_annotate(provider="beep")
+            return self._generate_simple_beep()
+            
+        except Exception as e:
+            print(f"❌ All TTS options failed: {e}")
+            return self._generate_simple_beep()
+    
+    @traced("tts.edge")
+    async def _edge_text_to_speech(self, text: str, audio_format: str = DEFAULT_AUDIO_FORMAT) -> bytes:
+        """Generate speech using Microsoft Edge TTS in the requested output format"""
+        try:
+            audio_data = await self.edge_tts.synthesize(text, AUDIO_FORMATS[audio_format]["edge"])
+            
+            if audio_data:
+                print("✅ Edge TTS generation successful")
+                return audio_data
+                
+        except Exception as e:
+            print(f"❌ Edge TTS failed: {e}")
+            provider_error(e)
+        
+        return b""
+    
+    @traced("tts.openai")
+    async def _openai_text_to_speech(self, text: str, audio_format: str = DEFAULT_AUDIO_FORMAT) -> bytes:
+        """Generate speech using OpenAI TTS in the requested output format"""
+        try:
+            response = await self.openai_client.audio.speech.create(
+                model="tts-1",
+                voice="alloy",
+                input=text,
+                response_format=AUDIO_FORMATS[audio_format]["openai"]
+            )
+            print("✅ OpenAI TTS generation successful")
+            return response.content
+            
+        except Exception as e:
+            print(f"❌ OpenAI TTS failed: {e}")
+            provider_error(e)
+        
+        return b""
+    
+    @traced("tts.local")
+    async def _local_text_to_speech(self, text: str, audio_format: str = DEFAULT_AUDIO_FORMAT) -> bytes:
+        """Generate speech with the in-process CPU voice"""
+        try:
+            audio_data = await self.local_tts.synthesize(text, audio_format)
+            print("✅ Local TTS generation successful")
+            return audio_data
+            
+        except Exception as e:
+            print(f"❌ Local TTS failed: {e}")
+            provider_error(e)
+        
+        return b""
+    
+    def _generate_simple_beep(self) -> bytes:
+        """Generate a simple beep as absolute fallback"""
+        try:
+            import numpy as np
+            import io
+            import soundfile as sf
+            
+            # Generate simple beep
+            sample_rate = 22050
+            duration = 0.5
+            frequency = 440
+            
+            t = np.linspace(0, duration, int(sample_rate * duration))
+            beep = np.sin(2 * np.pi * frequency * t) * 0.3
+            
+            buffer = io.BytesIO()
+            sf.write(buffer, beep, sample_rate, format='WAV')
+            print("⚠️ Using simple beep fallback")
+            return buffer.getvalue()
+            
+        except:
+            print("❌ Even beep generation failed")
+            return b""
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split a reply into sentences for incremental synthesis
+    
+    The first sentence is kept as-is so the first audio arrives quickly; later
+    fragments shorter than MIN_SENTENCE_CHARS are merged with their neighbours.
+    """
+    sentences: List[str] = []
+    for piece in _SENTENCE_END.split(text.strip()):
+        if not piece:
+            continue
+        if len(sentences) > 1 and len(sentences[-1]) < MIN_SENTENCE_CHARS:
+            sentences[-1] += " " + piece
+        else:
+            sentences.append(piece)
+    if len(sentences) > 2 and len(sentences[-1]) < MIN_SENTENCE_CHARS:
+        last = sentences.pop()
+        sentences[-1] += " " + last
+    return sentences
+
+
+def normalize_for_speech(text: str) -> str:
+    """
+    Rewrite reply text into what should be spoken
+    
+    Strips markdown (emphasis, headings, list markers, tables, code, link targets), collapses
+    URLs to their domain, drops parentheticals and emoji, turns ellipses into pauses and expands
+    abbreviations and number symbols (currency, %, ranges, multipliers, * and =).
+    
+    A "#" is only dropped as heading syntax; "C#" and "#1" are spoken as words. Hyphenated
+    numbers are only read as ranges when ascending, so phone-like "555-1234" is kept.
+    
+    Args:
+        text: LLM reply or other display text
+        
+    Returns:
+        Plain speakable text (may be empty)
+    """
+    import unicodedata
+    
+    text = re.sub(r"```.*?(```|$)", " ", text, flags=re.S)
+    text = re.sub(r"!\[[^\]]*\]\([^)]*\)", "", text)
+    text = re.sub(r"\[([^\]]+)\]\([^)]*\)", r"\1", text)
+    
+    # Headings, list items and table rows become sentences of their own
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or re.fullmatch(r"[-*_=|:\s]{3,}", line):
+            continue
+        structural = bool(re.match(r"(#{1,6}\s|>|[-*+•]\s|\d+[.)]\s)", line)) or line.startswith("|")
+        line = re.sub(r"^(#{1,6}\s+|>\s?|[-*+•]\s+|\d+[.)]\s+)", "", line)
+        if "|" in line:
+            line = ", ".join(cell.strip() for cell in line.strip("|").split("|") if cell.strip())
+        if structural and line and line[-1] not in ".!?:;,":
+            line += "."
+        lines.append(line)
+    text = " ".join(lines)
+    
+    text = re.sub(r"(\*\*|__)(.+?)\1", r"\2", text)
+    text = re.sub(r"(?<!\w)[*_](\S(?:.*?\S)?)[*_](?!\w)", r"\1", text)
+    text = re.sub(r"`([^`]*)`", r"\1", text)
+    # Asterisks between operands are multiplication; any left over elsewhere are markdown
+    text = re.sub(r"(?<=[\d)])\s?\*\s?(?=[\d(])", " times ", text)
+    text = re.sub(r"(?<=\d)\s?=\s?(?=\d)", " equals ", text)
+    text = text.replace("*", "")
+    
+    # URLs are spoken as their domain
+    text = re.sub(r"\b(?:https?://|www\.)(?:www\.)?([\w-]+(?:\.[\w-]+)+)[^\s]*?(?=[.,;:!?)\]]*(?:\s|$))",
+                  r"\1", text)
+    
+    for _ in range(2):
+        text = re.sub(r"\s*\([^()]*\)", "", text)
+        text = re.sub(r"\s*\[[^\[\]]*\]", "", text)
+    text = re.sub(r"\s*(?:\.{3,}|…)\s*(?=$|[A-Z])", ". ", text)
+    text = re.sub(r"\s*(?:\.{3,}|…)\s*", ", ", text)
+    
+    for pattern, replacement in _SPEECH_ABBREVIATIONS:
+        text = pattern.sub(replacement, text)
+    
+    def currency(match: re.Match) -> str:
+        magnitude = _SPEECH_MAGNITUDES.get((match.group(3) or "").lower(), match.group(3) or "")
+        return " ".join(part for part in (match.group(2), magnitude, _SPEECH_CURRENCIES[match.group(1)]) if part)
+    
+    text = re.sub(r"([$€£])\s?(\d[\d,]*(?:\.\d+)?)(?:\s?(k|mm?|bn?|t|thousand|million|billion|trillion)\b)?",
+                  currency, text, flags=re.I)
+    text = re.sub(r"(\d)\s?%", r"\1 percent", text)
+    
+    def numeric_range(match: re.Match) -> str:
+        low, dash, high = match.groups()
+        # 555-1234 style numbers and scores like 3-2 are read as written
+        phone_like = dash == "-" and (len(low) == 3 and len(high) == 4 or abs(len(low) - len(high)) > 1)
+        if int(low) >= int(high) or phone_like:
+            return match.group(0)
+        return f"{low} to {high}"
+    
+    text = re.sub(r"(?<![\d-])(\d{1,4})\s?([-–])\s?(\d{1,4})(?![\d-])", numeric_range, text)
+    text = re.sub(r"\b(\d+(?:\.\d+)?)x\b", r"\1 times", text)
+    text = re.sub(r"#(\d)", r"number \1", text)
+    text = re.sub(r"~\s?(\d)", r"about \1", text)
+    text = re.sub(r"\s*(?:->|→|=>)\s*", " to ", text)
+    text = text.replace("&", " and ")
+    
+    text = "".join(char for char in text
+                   if unicodedata.category(char) != "So" and char not in "\u200d\ufe0f")
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s+([.,;:!?])", r"\1", text)
+    text = re.sub(r"([,;:])(?:\s*[,;:])+", r"\1", text)
+    text = re.sub(r"[,;:]\s*([.!?])", r"\1", text)
+    text = re.sub(r"([.!?])(?:\s*\.)+", r"\1", text)
+    return text.strip(" ,;:")
+
+
+def negotiate_audio_format(preferred: Optional[List[str]]) -> str:
+    """Pick the first AUDIO_FORMATS entry from a client's preference list"""
+    for name in preferred or []:
+        if name in AUDIO_FORMATS:
+            return name
+    return DEFAULT_AUDIO_FORMAT
+
+
+def _sniff_audio_mime(audio_data: bytes) -> str:
+    """MIME type of synthesized or recorded audio from its container signature"""
+    if audio_data[:4] == b"RIFF":
+        return "audio/wav"
+    if audio_data[:4] == b"\x1aE\xdf\xa3":
+        return "audio/webm; codecs=opus"
+    if audio_data[:4] == b"OggS":
+        return "audio/ogg; codecs=opus"
+    if audio_data[:4] == b"fLaC":
+        return "audio/flac"
+    if audio_data[4:8] == b"ftyp":
+        return "audio/mp4"
+    return "audio/mpeg"
+
+
+def _audio_extension(mime: str) -> str:
+    """File extension for a _sniff_audio_mime type; STT APIs pick the decoder by file name"""
+    subtype = mime.split(";")[0].split("/")[1]
+    return "mp3" if subtype == "mpeg" else subtype
+
+
+class StaticAudioCache:
+    """
+    Pre-rendered audio for STATIC_PHRASES in every negotiable AUDIO_FORMATS entry
+    
+    Rendered clips live in memory and in a directory with a manifest.json
+    recording each phrase's text hash and its file and MIME type per format.
+    Phrases whose text is new or changed since the manifest was written are
+    rendered on warm-up, so adding a phrase to STATIC_PHRASES needs no other change.
+    """
+    
+    MANIFEST_VERSION = 2
+    
+    def __init__(self, directory: str = STATIC_AUDIO_DIR, phrases: Optional[Dict[str, str]] = None):
+        """
+        Initialize an empty cache
+        
+        Args:
+            directory: Where rendered clips and manifest.json are stored
+            phrases: Phrase name -> text (defaults to STATIC_PHRASES)
+        """
+        self.directory = directory
+        self.phrases = phrases if phrases is not None else STATIC_PHRASES
+        # (phrase name, audio format) -> (audio bytes, MIME type)
+        self.audio: Dict[Tuple[str, str], Tuple[bytes, str]] = {}
+    
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        return hashlib.sha1(text.encode()).hexdigest()
+    
+    def get(self, name: str, audio_format: str = DEFAULT_AUDIO_FORMAT) -> Optional[Tuple[bytes, str]]:
+        """
+        Look up a rendered phrase
+        
+        Returns:
+            (audio bytes, MIME type), or None if the phrase is not rendered in that format yet
+        """
+        cached = self.audio.get((name, audio_format))
+        CACHE_REQUESTS.inc(cache="static_audio", result="hit" if cached else "miss")
+        return cached
+    
+    async def warm(self, voice_assistant: VoiceAssistant):
+        """Load clips listed in the manifest and render any phrase/format that is missing or outdated"""
+        await asyncio.to_thread(self._load)
+        missing = [(name, audio_format) for name in self.phrases for audio_format in AUDIO_FORMATS
+                   if (name, audio_format) not in self.audio]
+        if not missing:
+            print(f"🔈 Static audio: {len(self.audio)} clips loaded from {self.directory}")
+            return
+        
+        rendered = await asyncio.gather(*(self._render(voice_assistant, self.phrases[name], audio_format)
+                                          for name, audio_format in missing))
+        for key, audio in zip(missing, rendered):
+            if audio:
+                self.audio[key] = (audio, _sniff_audio_mime(audio))
+        print(f"🔈 Static audio: rendered {sum(1 for audio in rendered if audio)}/{len(missing)} clips")
+        await asyncio.to_thread(self._save)
+    
+    async def _render(self, voice_assistant: VoiceAssistant, text: str, audio_format: str) -> bytes:
+        """Synthesize a phrase with a real TTS provider (never cache the beep fallback)"""
+        audio = await voice_assistant._edge_text_to_speech(text, audio_format)
+        if not audio and voice_assistant.openai_client:
+            audio = await voice_assistant._openai_text_to_speech(text, audio_format)
+        return audio
+    
+    def _load(self):
+        """Read clips whose manifest entry matches the current phrase text"""
+        try:
+            with open(os.path.join(self.directory, "manifest.json")) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return
+        if manifest.get("version") != self.MANIFEST_VERSION:
+            return
+        
+        for name, entry in manifest.get("phrases", {}).items():
+            if name not in self.phrases or entry.get("text_sha1") != self._text_hash(self.phrases[name]):
+                continue
+            for audio_format, clip in entry.get("formats", {}).items():
+                try:
+                    with open(os.path.join(self.directory, clip["file"]), "rb") as audio_file:
+                        self.audio[(name, audio_format)] = (audio_file.read(), clip["mime"])
+                except OSError:
+                    continue
+    
+    def _save(self):
+        """Write rendered clips and the manifest (best effort; the cache still works in memory)"""
+        manifest = {"version": self.MANIFEST_VERSION, "phrases": {}}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for (name, audio_format), (audio, mime) in self.audio.items():
+                file_name = f"{name}.{audio_format}.{_audio_extension(mime)}"
+                with open(os.path.join(self.directory, file_name), "wb") as audio_file:
+                    audio_file.write(audio)
+                entry = manifest["phrases"].setdefault(name, {
+                    "text": self.phrases[name],
+                    "text_sha1": self._text_hash(self.phrases[name]),
+                    "formats": {},
+                })
+                entry["formats"][audio_format] = {"file": file_name, "mime": mime, "bytes": len(audio)}
+            with open(os.path.join(self.directory, "manifest.json"), "w") as manifest_file:
+                json.dump(manifest, manifest_file, indent=2)
+        except OSError as e:
+            print(f"⚠️ Could not write static audio to {self.directory}: {e}")
+
+
+def render_static_audio():
+    """Image build step: render STATIC_PHRASES into STATIC_AUDIO_DIR with its manifest"""
+    async def render():
+        voice_assistant = VoiceAssistant()
+        try:
+            await StaticAudioCache().warm(voice_assistant)
+        finally:
+            await voice_assistant.edge_tts.close()
+    
+    asyncio.run(render())
+
+
+class SessionRecorder:
+    """
+    Appends one session's turns to a gzip JSON lines file for replay load testing
+    
+    The first line is a header ({"version", "session_id", "started_at"}); each
+    following line is one turn with its offset from session start, the client
+    audio, transcript, response and per-stage timings. Every write appends a
+    separate gzip member, so a session cut off mid-way still leaves a readable file.
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, directory: str):
+        """
+        Create the recording file for a new session
+        
+        Args:
+            directory: Directory receiving <timestamp>-<session id>.session.gz files
+        """
+        self.session_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.path = os.path.join(
+            directory, f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(self.started_at))}-{self.session_id}.session.gz"
+        )
+        self._header_written = False
+    
+    async def record_turn(self, record: Dict):
+        """Append a turn record without blocking the event loop"""
+        lines = []
+        if not self._header_written:
+            lines.append({"version": self.VERSION, "session_id": self.session_id, "started_at": self.started_at})
+            self._header_written = True
+        lines.append(record)
+        try:
+            await asyncio.to_thread(self._append, "".join(json.dumps(line) + "\n" for line in lines))
+        except OSError as e:
+            print(f"⚠️ Session recording failed: {e}")
+    
+    def _append(self, text: str):
+        """Write lines as a new gzip member"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with gzip.open(self.path, "at") as record_file:
+            record_file.write(text)
+
+
+class ConversationSession:
+    """
+    Per-connection voice pipeline split into reader, processor and writer tasks
+    
+    The reader handles control messages (cancel, ping) immediately, feeds streamed
+    audio to the turn's StreamingTranscription as it arrives and hands complete
+    audio to the processor through a bounded queue; the processor runs each
+    turn as a cancellable task; the writer drains a bounded outbound queue so a
+    slow client applies backpressure to the turn instead of buffering without limit.
+    """
+    
+    def __init__(self, websocket: WebSocket, voice_assistant: VoiceAssistant,
+                 static_audio: Optional[StaticAudioCache] = None):
+        """
+        Initialize a session for an accepted WebSocket
+        
+        Args:
+            websocket: Accepted client WebSocket
+            voice_assistant: Shared assistant used to process turns
+            static_audio: Pre-rendered audio for fixed phrases
+        """
+        self.websocket = websocket
+        self.voice_assistant = voice_assistant
+        self.static_audio = static_audio or StaticAudioCache()
+        self.inbound: asyncio.Queue = asyncio.Queue(maxsize=INBOUND_QUEUE_SIZE)
+        self.outbound: asyncio.Queue = asyncio.Queue(maxsize=OUTBOUND_QUEUE_SIZE)
+        self.turn_id = 0
+        # Turns numbered below this were cancelled or superseded and are skipped
+        self.min_live_turn = 0
+        self.turn_task: Optional[asyncio.Task] = None
+        # perf_counter start and session position ("first"/"steady") of turns that have not sent audio yet
+        self.awaiting_first_audio: Dict[int, tuple] = {}
+        self.turns_started = 0
+        self.recorder = SessionRecorder(SESSION_RECORD_DIR) if SESSION_RECORD_DIR else None
+        # TTS output format, negotiated by the client's "hello" message
+        self.audio_format = DEFAULT_AUDIO_FORMAT
+        # Turn id and transcription of audio still being streamed ("audio_stream" messages)
+        self.stream_turn: Optional[int] = None
+        self.stream: Optional[StreamingTranscription] = None
+    
+    async def run(self):
+        """
+        Run the reader, processor and writer tasks until any of them stops
+        
+        A disconnect, heartbeat timeout or failure in one task tears down the
+        others; the first exception is re-raised to the caller.
+        """
+        tasks = [
+            asyncio.create_task(self._reader()),
+            asyncio.create_task(self._processor()),
+            asyncio.create_task(self._writer()),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception():
+                    raise task.exception()
+        finally:
+            await self.cancel_turn()
+            self._drop_stream()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def cancel_turn(self) -> bool:
+        """
+        Cancel the in-flight turn, aborting its pending STT/LLM/TTS requests
         
-        return ""
+        Returns:
+            True if a running turn was cancelled
+        """
+        task = self.turn_task
+        self.turn_task = None
+        if task is None or task.done():
+            return False
+        
+        task.cancel()
+        await asyncio.wait([task])
+        print(f"🛑 Cancelled turn {self.turn_id}")
+        return True
     
-    async def _local_speech_to_text(self, audio_data: bytes) -> str:
-        """Process audio using local Whisper model"""
-        try:
-            import whisper
-            import io
-            import soundfile as sf
-            import numpy as np
-            from scipy import signal
-            
-            # Load Whisper model if not already loaded
-            if self.local_whisper is None:
-                print("🔄 Loading local Whisper model...")
-                self.local_whisper = whisper.load_model("base")
+    async def send(self, payload: Union[Dict, bytes], turn_id: Optional[int] = None):
+        """
+        Queue a JSON message (or a binary audio frame) for the writer
+        
+        Blocks while the outbound queue is full, pausing the producing turn
+        until the client catches up.
+        """
+        await self.outbound.put((turn_id, payload))
+    
+    async def send_static_audio(self, name: str, header: Dict, turn_id: Optional[int] = None) -> bool:
+        """
+        Send a pre-rendered phrase as a JSON header followed by one binary frame
+        
+        Args:
+            name: STATIC_PHRASES key
+            header: Message announcing the frame; "audio_frame" and "mime" are added
+            turn_id: Turn the audio belongs to
             
-            # Convert audio data to array
-            audio_array, sample_rate = sf.read(io.BytesIO(audio_data))
+        Returns:
+            False if the phrase is not rendered yet (nothing is sent)
+        """
+        cached = self.static_audio.get(name, self.audio_format)
+        if cached is None:
+            return False
+        
+        audio, mime = cached
+        await self.send({**header, "audio_frame": True, "mime": mime}, turn_id)
+        await self.send(audio, turn_id)
+        return True
+    
+    async def _reader(self):
+        """Receive client messages, answering control messages without waiting on turns"""
+        while True:
+            try:
+                data = await asyncio.wait_for(self.websocket.receive_text(), timeout=HEARTBEAT_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"💤 No client heartbeat for {HEARTBEAT_TIMEOUT:.0f}s, closing connection")
+                await self.websocket.close(code=1001)
+                return
             
-            # Convert to mono if stereo
-            if len(audio_array.shape) > 1:
-                audio_array = np.mean(audio_array, axis=1)
+            message = json.loads(data)
+            message_type = message.get("type")
             
-            # Resample to 16kHz if needed
-            if sample_rate != 16000:
-                num_samples = int(len(audio_array) * 16000 / sample_rate)
-                audio_array = signal.resample(audio_array, num_samples)
+            if message_type == "ping":
+                await self.send({"type": "pong", "ts": message.get("ts")})
             
-            # Normalize audio
-            if np.max(np.abs(audio_array)) > 0:
-                audio_array = audio_array / np.max(np.abs(audio_array))
+            elif message_type == "hello":
+                self.audio_format = negotiate_audio_format(message.get("audio_formats"))
+                await self.send({
+                    "type": "audio_format",
+                    "format": self.audio_format,
+                    "bytes_per_second": AUDIO_FORMATS[self.audio_format]["bytes_per_second"],
+                    "streaming_stt": STREAMING_STT,
+                })
             
-            # Check duration
-            duration = len(audio_array) / 16000
-            if duration < 0.5:
-                print("⚠️ Audio too short for transcription")
-                return ""
+            elif message_type == "greeting":
+                await self.send_static_audio("greeting", {"type": "greeting", "text": STATIC_PHRASES["greeting"]})
             
-            # Transcribe
-            result = self.local_whisper.transcribe(
-                audio_array, 
-                fp16=False,
-                language="en",
-                temperature=0.0
-            )
+            elif message_type == "cancel":
+                self.min_live_turn = max(self.min_live_turn, int(message.get("turn", self.turn_id)) + 1)
+                aborted = await self.cancel_turn()
+                if self.stream_turn is not None and self.stream_turn < self.min_live_turn:
+                    self._drop_stream()
+                await self.send({"type": "cancelled", "turn": self.turn_id, "aborted": aborted})
             
-            transcription = result["text"].strip() if result.get("text") else ""
-            print(f"✅ Local Whisper: '{transcription}'")
+            elif message_type == "audio":
+                # Barge-in: a new question supersedes whatever is still queued or in flight
+                turn_id = int(message.get("turn", self.turn_id + 1))
+                self.min_live_turn = max(self.min_live_turn, turn_id)
+                await self.cancel_turn()
+                message["received_at"] = time.time()
+                await self.inbound.put(message)
             
-            if transcription and len(transcription) > 2:
-                return transcription
+            elif message_type == "audio_stream" and STREAMING_STT:
+                turn_id = int(message.get("turn", self.turn_id + 1))
+                if turn_id != self.stream_turn:
+                    if turn_id < self.min_live_turn:
+                        continue
+                    # Barge-in as soon as the user starts speaking, not when they finish
+                    self.min_live_turn = max(self.min_live_turn, turn_id)
+                    await self.cancel_turn()
+                    self._start_stream(turn_id)
+                pcm = base64.b64decode(message["pcm"])
+                AUDIO_BYTES.inc(len(pcm), direction="in")
+                self.stream.feed(pcm)
             
-        except Exception as e:
-            print(f"❌ Local Whisper failed: {e}")
+            elif message_type == "audio_end" and STREAMING_STT:
+                if int(message.get("turn", -1)) != self.stream_turn:
+                    continue
+                message["stream"] = self.stream
+                message["received_at"] = time.time()
+                self.stream_turn, self.stream = None, None
+                await self.inbound.put(message)
+    
+    def _start_stream(self, turn_id: int):
+        """Begin transcribing a new turn's streamed audio, sending partial transcripts as they change"""
+        self._drop_stream()
+        stream = StreamingTranscription(self.voice_assistant.local_stt)
         
-        return ""
+        async def on_partial(stable: str, text: str):
+            # Intent routing runs on the committed words only (two decodes agreed on them), so a search
+            # the question needs is underway early without chasing every unstable hypothesis
+            if stable != stream.prefetched_text:
+                stream.prefetched_text = stable
+                stream.search_prefetch = self.voice_assistant.prefetch_search(stable, stream.search_prefetch)
+            await self.send({"type": "transcription_partial", "turn": turn_id, "stable": stable, "text": text},
+                            turn_id)
+        
+        stream.on_partial = on_partial
+        self.stream_turn, self.stream = turn_id, stream
     
-    async def _openai_speech_to_text(self, audio_data: bytes) -> str:
-        """Process audio using OpenAI Whisper API"""
-        try:
-            audio_file = ("audio.wav", audio_data, "audio/wav")
-            response = self.openai_client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="en",
-                temperature=0.0
-            )
+    def _drop_stream(self):
+        """Abandon audio still being streamed (superseded or disconnected)"""
+        if self.stream is not None:
+            self.stream.cancel()
+        self.stream_turn, self.stream = None, None
+    
+    async def _processor(self):
+        """Run queued audio messages as cancellable turns, one at a time"""
+        while True:
+            message = await self.inbound.get()
+            turn_id = int(message.get("turn", self.turn_id + 1))
+            if turn_id < self.min_live_turn:
+                if message.get("stream") is not None:
+                    message["stream"].cancel()
+                continue
             
-            transcription = response.text.strip() if response.text else ""
-            print(f"✅ OpenAI Whisper: '{transcription}'")
+            self.turn_id = turn_id
+            stream = message.get("stream")
+            if stream is not None:
+                # Streamed PCM was counted as it arrived; keep a WAV for fallback STT and recording
+                audio_data = _encode_pcm(stream.samples(), STT_SAMPLE_RATE)
+                message.update(data=base64.b64encode(audio_data).decode(), mimeType="audio/wav")
+                print(f"📨 Streamed audio ended: {stream.seconds:.1f}s, {stream.partials} partials (turn {turn_id})")
+            else:
+                audio_data = base64.b64decode(message["data"])
+                print(f"📨 Received audio: {len(audio_data)} bytes (turn {turn_id})")
+                AUDIO_BYTES.inc(len(audio_data), direction="in")
+            # The first turn is the one that would pay cold provider connections without pre-warming
+            self.turns_started += 1
+            session_turn = "first" if self.turns_started == 1 else "steady"
+            self.awaiting_first_audio = {turn_id: (time.perf_counter(), session_turn)}
             
-            if transcription and len(transcription) > 2:
-                return transcription
-                
-        except Exception as e:
-            print(f"❌ OpenAI Whisper failed: {e}")
+            self.turn_task = asyncio.create_task(self._traced_turn(turn_id, audio_data, message, session_turn))
+            await asyncio.wait([self.turn_task])
+    
+    async def _writer(self):
+        """Send queued messages in order, dropping output of cancelled turns"""
+        while True:
+            turn_id, payload = await self.outbound.get()
+            if turn_id is not None and turn_id < self.min_live_turn:
+                continue
+            if isinstance(payload, bytes):
+                await self.websocket.send_bytes(payload)
+                audio_size = len(payload)
+            else:
+                await self.websocket.send_text(json.dumps(payload))
+                audio_size = len(payload["audio"]) * 3 // 4 if payload.get("audio") else 0
+            
+            if audio_size:
+                AUDIO_BYTES.inc(audio_size, direction="out")
+                if turn_id in self.awaiting_first_audio:
+                    started, session_turn = self.awaiting_first_audio.pop(turn_id)
+                    TIME_TO_FIRST_AUDIO.observe(time.perf_counter() - started, session_turn=session_turn)
+    
+    async def _traced_turn(self, turn_id: int, audio_data: bytes, message: Dict, session_turn: str = "steady"):
+        """Run a turn under a fresh trace, exporting its spans and optionally summarizing to the client"""
+        trace = TurnTrace(turn_id)
+        _current_trace.set(trace)
+        try:
+            with trace_span("turn", turn=turn_id, audio_bytes_in=len(audio_data), session_turn=session_turn):
+                result = await self._process_audio(turn_id, audio_data, message.get("stream"))
+        finally:
+            trace.record_metrics()
+            trace.export()
         
-        return ""
+        summary = trace.summary()
+        if result:
+            TURN_DURATION.observe(summary["total_ms"] / 1000, session_turn=session_turn)
+        if message.get("trace"):
+            await self.send({"type": "trace", "turn": turn_id, **summary}, turn_id)
+        
+        if self.recorder and result:
+            await self.recorder.record_turn({
+                "turn": turn_id,
+                "offset_s": round(message.get("received_at", time.time()) - self.recorder.started_at, 3),
+                "mime": message.get("mimeType", ""),
+                "audio_b64": message["data"],
+                "audio_format": self.audio_format,
+                "transcript": result["transcript"],
+                "response": result["response"],
+                "response_chars": len(result["response"]),
+                "response_audio_bytes": result["response_audio_bytes"],
+                "search": any(stage["stage"] == "search" for stage in summary["stages"]),
+                "total_ms": summary["total_ms"],
+                "stages_ms": {stage["stage"]: stage["ms"] for stage in summary["stages"]},
+            })
     
-    async def generate_response(self, user_message: str) -> str:
+    async def _process_audio(self, turn_id: int, audio_data: bytes,
+                             stream: Optional[StreamingTranscription] = None) -> Optional[Dict]:
         """
-        Generate response using Groq LLM with optional web search
+        Run one STT -> LLM -> TTS turn and queue the results for the client
         
         Args:
-            user_message: User's input message
-            
+            turn_id: Turn being processed
+            audio_data: The user's clip
+            stream: Streaming transcription of the clip, if it was streamed
+        
         Returns:
-            Generated response text
+            Transcript, response text and response audio size, or None if the turn failed
         """
+        search_prefetch = None
         try:
-            print(f"🧠 Generating response for: '{user_message}'")
+            # Step 1: Convert speech to text (finishing the streamed transcription if there is one)
+            user_text = None
+            if stream is not None:
+                user_text = await self.voice_assistant.streaming_speech_to_text(stream)
+                search_prefetch = stream.search_prefetch
+            if user_text is None:
+                if len(audio_data) > MAX_AUDIO_BYTES:
+                    # Answered like unclear audio rather than uploading an oversized clip to STT
+                    print(f"⚠️ Turn {turn_id} audio too large: {len(audio_data)} bytes > {MAX_AUDIO_BYTES}")
+                else:
+                    user_text = await self.voice_assistant.speech_to_text(audio_data)
             
-            # Check if we need current information
-            if self._needs_web_search(user_message):
-                print("🌐 Searching web for current information...")
+            if user_text and user_text.strip():
+                # Send transcription back to client
+                await self.send({"type": "transcription", "turn": turn_id, "text": user_text.strip()}, turn_id)
                 
-                # Extract search query
-                search_query = self._extract_search_query(user_message)
-                web_info = await self.web_searcher.search_and_summarize(search_query)
-                
-                # Enhanced context with web information
-                enhanced_context = MOHAN_CONTEXT + f"""
-
-CURRENT INFORMATION FROM WEB SEARCH:
-{web_info}
-
-INSTRUCTIONS: You now have access to current information from the web search above.
-Use this information to answer questions about current events, latest news, trends, etc.
-Always mention that you searched the web for current information.
-Combine Mohan's expertise with current information when relevant.
-"""
+                # Step 2: Generate response
+                response_text = await self.voice_assistant.generate_response(user_text.strip(), search_prefetch)
+                search_prefetch = None
+            else:
+                # Handle unclear audio
+                await self.send({
+                    "type": "transcription",
+                    "turn": turn_id,
+                    "text": "[Could not understand audio - please try speaking more clearly]"
+                }, turn_id)
+                response_text = STATIC_PHRASES["unclear_audio"]
                 
-                completion = self.groq_client.chat.completions.create(
-                    model="llama-3.3-70b-versatile",
-                    messages=[
-                        {"role": "system", "content": enhanced_context},
-                        {"role": "user", "content": user_message}
-                    ],
-                    max_tokens=1000,
-                    temperature=0.7,
-                    stream=False
-                )
+                # Pre-rendered reply: no TTS round trip
+                if await self.send_static_audio("unclear_audio",
+                                                {"type": "response", "turn": turn_id, "text": response_text}, turn_id):
+                    trace_annotate(static_audio="unclear_audio")
+                    return {"transcript": "", "response": response_text, "response_audio_bytes": 0}
+            
+            # Markup, URLs and asides are shown to the user but not spoken
+            spoken_text = response_text
+            if SPEECH_NORMALIZE:
+                spoken_text = normalize_for_speech(response_text)
+                removed = max(0, len(response_text) - len(spoken_text))
+                SPEECH_REMOVED_CHARS.observe(removed)
+                SPEECH_SAVED_SECONDS.observe(removed / SPEECH_CHARS_PER_SECOND)
+                trace_annotate(spoken_chars=len(spoken_text), removed_chars=removed)
+            
+            # Send the text right away; audio follows sentence by sentence as binary frames
+            if not spoken_text:
+                sentences = []
+            elif TTS_PARALLELISM > 0:
+                sentences = split_sentences(spoken_text)
             else:
-                # Regular response for Mohan-specific questions
-                completion = self.groq_client.chat.completions.create(
-                    model="llama-3.3-70b-versatile",
-                    messages=[
-                        {"role": "system", "content": MOHAN_CONTEXT},
-                        {"role": "user", "content": user_message}
-                    ],
-                    max_tokens=800,
-                    temperature=0.7,
-                    stream=False
-                )
+                sentences = [spoken_text]
+            await self.send({
+                "type": "response",
+                "turn": turn_id,
+                "text": response_text,
+                "audio_chunks": len(sentences)
+            }, turn_id)
             
-            response = completion.choices[0].message.content
-            print(f"✅ Generated response: {len(response)} characters")
-            return response
+            # Step 3: Convert response to speech
+            async def send_chunk(index: int, audio_data: bytes):
+                await self.send({
+                    "type": "audio_chunk",
+                    "turn": turn_id,
+                    "index": index,
+                    "audio_frame": True,
+                    "mime": _sniff_audio_mime(audio_data)
+                }, turn_id)
+                await self.send(audio_data, turn_id)
             
+            response_audio_bytes = await self.voice_assistant.speak_sentences(sentences, self.audio_format, send_chunk)
+            
+            trace_annotate(audio_bytes_out=response_audio_bytes)
+            return {
+                "transcript": (user_text or "").strip(),
+                "response": response_text,
+                "response_audio_bytes": response_audio_bytes,
+            }
+        
+        except CapacityExceeded as e:
+            print(f"🚦 Turn {turn_id} rejected: {e}")
+            await self.send({
+                "type": "busy",
+                "turn": turn_id,
+                "stage": e.stage,
+                "retry_after": e.retry_after
+            }, turn_id)
         except Exception as e:
-            print(f"❌ Groq LLM Error: {e}")
-            return ("I apologize, but I'm having trouble processing that request right now. "
-                   "However, I'd be happy to tell you about Mohan's experience in data science "
-                   "and his current work at Cohere Health. Could you please try asking your question again?")
+            print(f"❌ Turn {turn_id} failed: {e}")
+        finally:
+            if search_prefetch is not None:
+                search_prefetch[1].cancel()
+
+
+# Local Whisper service. Backends share one interface:
+#   "modal"     - dedicated LocalWhisperWorker containers with their own autoscaling (production)
+#   "process"   - a local process pool, for running the gateway outside Modal
+#   "inprocess" - an in-process stand-in (injectable transcriber) for offline testing
+LOCAL_STT_BACKEND = os.getenv("LOCAL_STT_BACKEND", "modal")
+LOCAL_STT_MAX_WORKERS = int(os.getenv("LOCAL_STT_MAX_WORKERS", "4"))
+# Requests allowed to wait for a worker before new ones skip straight to the next STT fallback
+LOCAL_STT_MAX_PENDING = int(os.getenv("LOCAL_STT_MAX_PENDING", "16"))
+
+
+def _whisper_transcribe(model, audio_data: bytes) -> str:
+    """
+    Transcribe an audio clip with a loaded Whisper model
     
-    def _needs_web_search(self, user_message: str) -> bool:
-        """Determine if a question requires current information from the web"""
-        current_info_keywords = [
-            "latest", "recent", "current", "today", "this week", "this month", "2024", "2025",
-            "news", "breaking", "update", "trending", "happening now", "what's new",
-            "current events", "recent developments", "latest trends", "new releases",
-            "market", "stock", "price", "crypto", "bitcoin", "ai news", "technology news"
-        ]
+    Args:
+        model: Model returned by whisper.load_model
+        audio_data: Encoded audio in any format ffmpeg can decode
         
-        user_lower = user_message.lower()
-        return any(keyword in user_lower for keyword in current_info_keywords)
+    Returns:
+        Transcribed text, or "" for clips that are too short
+    """
+    import tempfile
+    import whisper
     
-    def _extract_search_query(self, user_message: str) -> str:
-        """Extract search query from user message"""
-        # Remove question words and clean up for better search
-        query = user_message.replace("what's", "").replace("what is", "").replace("tell me about", "")
-        query = query.replace("what are", "").replace("?", "").strip()
-        return query
+    with tempfile.NamedTemporaryFile(suffix=".audio") as tmp_file:
+        tmp_file.write(audio_data)
+        tmp_file.flush()
+        
+        # Decodes, downmixes and resamples to 16kHz mono float32
+        audio_array = whisper.load_audio(tmp_file.name)
+    
+    # Check duration
+    duration = len(audio_array) / whisper.audio.SAMPLE_RATE
+    if duration < 0.5:
+        print("⚠️ Audio too short for transcription")
+        return ""
+    
+    result = model.transcribe(
+        audio_array,
+        fp16=False,
+        language="en",
+        temperature=0.0
+    )
+    return result["text"].strip() if result.get("text") else ""
+
+
+def _whisper_transcribe_window(model, pcm: bytes, prompt: str = "") -> List[Dict]:
+    """
+    Transcribe a window of streamed audio into timed segments
+    
+    Args:
+        model: Model returned by whisper.load_model
+        pcm: 16 kHz mono 16-bit little-endian PCM
+        prompt: Text already committed before the window, for context
+        
+    Returns:
+        [{"start", "end", "text"}] with times in seconds from the window start
+    """
+    import numpy as np
+    
+    audio_array = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768
+    result = model.transcribe(
+        audio_array,
+        fp16=False,
+        language="en",
+        temperature=0.0,
+        initial_prompt=prompt or None,
+        # Each window is decoded independently; carrying text over would repeat hallucinations
+        condition_on_previous_text=False,
+    )
+    return [{"start": segment["start"], "end": segment["end"], "text": segment["text"].strip()}
+            for segment in result.get("segments", []) if segment["text"].strip()]
+
+
+# Whisper model held by each process-pool worker
+_pool_whisper_model = None
+
+
+def _init_pool_whisper():
+    """Load the Whisper model once per process-pool worker"""
+    global _pool_whisper_model
+    import whisper
+    
+    _pool_whisper_model = whisper.load_model(LOCAL_WHISPER_MODEL)
+
+
+def _pool_transcribe(audio_data: bytes) -> str:
+    """Transcribe inside a process-pool worker"""
+    return _whisper_transcribe(_pool_whisper_model, audio_data)
+
+
+def _pool_transcribe_window(pcm: bytes, prompt: str) -> List[Dict]:
+    """Transcribe a streamed window inside a process-pool worker"""
+    return _whisper_transcribe_window(_pool_whisper_model, pcm, prompt)
+
+
+def _pool_ready() -> bool:
+    """No-op task that makes the pool start a worker (loading its model)"""
+    return _pool_whisper_model is not None
+
+
+@app.cls(
+    image=whisper_image,
+    cpu=2.0,
+    memory=2048,
+    concurrency_limit=LOCAL_STT_MAX_WORKERS,  # Scales independently of the gateway
+    allow_concurrent_inputs=1,  # CPU-bound: one clip per container, extra inputs queue in Modal
+    container_idle_timeout=120,  # Fallback path only; idle workers scale back to zero
+    timeout=120,
+)
+class LocalWhisperWorker:
+    """Local Whisper transcription isolated from the gateway so torch never loads there"""
+    
+    @modal.enter()
+    def load_model(self):
+        """Load the Whisper model once per worker container"""
+        import whisper
+        
+        print("🔄 Loading local Whisper model...")
+        self.model = whisper.load_model(LOCAL_WHISPER_MODEL)
+    
+    @modal.method()
+    def transcribe(self, audio_data: bytes) -> str:
+        """Transcribe an audio clip with the local Whisper model"""
+        return _whisper_transcribe(self.model, audio_data)
+    
+    @modal.method()
+    def transcribe_window(self, pcm: bytes, prompt: str = "") -> List[Dict]:
+        """Transcribe a window of streamed PCM into timed segments"""
+        return _whisper_transcribe_window(self.model, pcm, prompt)
+
+
+class LocalWhisperQueueFull(Exception):
+    """Raised when too many clips are already waiting for a local Whisper worker"""
+
+
+class LocalWhisperClient:
+    """Async gateway-side client for the local Whisper service with a bounded request queue"""
     
-    async def text_to_speech(self, text: str) -> bytes:
+    def __init__(self,
+                 backend: str = LOCAL_STT_BACKEND,
+                 max_workers: int = LOCAL_STT_MAX_WORKERS,
+                 max_pending: int = LOCAL_STT_MAX_PENDING,
+                 transcriber=None,
+                 window_transcriber=None):
         """
-        Convert text to speech using multiple TTS options with fallbacks
+        Initialize the client
         
         Args:
-            text: Text to convert to speech
-            
-        Returns:
-            Audio data in bytes
+            backend: "modal", "process" or "inprocess"
+            max_workers: Concurrent transcriptions dispatched to the backend
+            max_pending: Requests allowed to wait for a free worker
+            transcriber: Optional sync callable(bytes) -> str used by the "inprocess" backend
+            window_transcriber: Optional sync callable(pcm, prompt) -> segments for streamed windows on
+                the "inprocess" backend (without it, windows go to transcriber as one-segment WAV clips)
         """
-        try:
-            # Option 1: Edge TTS (Microsoft's free service)
-            audio_data = await self._edge_text_to_speech(text)
-            if audio_data:
-                return audio_data
-            
-            # Option 2: OpenAI TTS (fallback if API key available)
-            if self.openai_client:
-                audio_data = await self._openai_text_to_speech(text)
-                if audio_data:
-                    return audio_data
+        self.backend = backend
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.slots = asyncio.Semaphore(max_workers)
+        self.pending = 0
+        self.transcriber = transcriber
+        self.window_transcriber = window_transcriber
+        self.pool = None
+        self.model = None
+    
+    async def transcribe(self, audio_data: bytes) -> str:
+        """
+        Transcribe a clip on the configured backend without blocking the event loop
+        
+        Args:
+            audio_data: Encoded audio clip
             
-            # Option 3: Simple beep as final fallback
-            return self._generate_simple_beep()
+        Returns:
+            Transcribed text
             
-        except Exception as e:
-            print(f"❌ All TTS options failed: {e}")
-            return self._generate_simple_beep()
+        Raises:
+            LocalWhisperQueueFull: If the request queue is already full
+        """
+        async with self._slot():
+            if self.backend == "modal":
+                return await self._modal_transcribe(audio_data)
+            if self.backend == "process":
+                return await self._process_transcribe(audio_data)
+            return await self._inprocess_transcribe(audio_data)
     
-    async def _edge_text_to_speech(self, text: str) -> bytes:
-        """Generate speech using Microsoft Edge TTS"""
-        try:
-            import edge_tts
-            
-            communicate = edge_tts.Communicate(text, "en-US-AriaNeural")
-            audio_data = b""
+    async def transcribe_window(self, pcm: bytes, prompt: str = "") -> List[Dict]:
+        """
+        Transcribe a window of streamed audio on the configured backend
+        
+        Args:
+            pcm: 16 kHz mono 16-bit little-endian PCM
+            prompt: Text already committed before the window
             
-            async for chunk in communicate.stream():
-                if chunk["type"] == "audio":
-                    audio_data += chunk["data"]
+        Returns:
+            Timed segments, times relative to the window start
             
-            if audio_data:
-                print("✅ Edge TTS generation successful")
-                return audio_data
+        Raises:
+            LocalWhisperQueueFull: If the request queue is already full
+        """
+        async with self._slot():
+            if self.backend == "modal":
+                return await LocalWhisperWorker().transcribe_window.remote.aio(pcm, prompt)
+            loop = asyncio.get_running_loop()
+            if self.backend == "process":
+                return await loop.run_in_executor(self._process_pool(), _pool_transcribe_window, pcm, prompt)
+            if self.window_transcriber is not None:
+                return await asyncio.to_thread(self.window_transcriber, pcm, prompt)
+            if self.transcriber is not None:
+                # Clip-only stand-ins: the window becomes one segment
+                import numpy as np
                 
-        except Exception as e:
-            print(f"❌ Edge TTS failed: {e}")
-        
-        return b""
+                samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768
+                text = await asyncio.to_thread(self.transcriber, _encode_pcm(samples, STT_SAMPLE_RATE))
+                duration = len(samples) / STT_SAMPLE_RATE
+                return [{"start": 0.0, "end": duration, "text": text.strip()}] if text.strip() else []
+            await self._load_model()
+            return await asyncio.to_thread(_whisper_transcribe_window, self.model, pcm, prompt)
+    
+    def busy(self) -> bool:
+        """True when every worker slot is taken"""
+        return self.slots.locked()
     
-    async def _openai_text_to_speech(self, text: str) -> bytes:
-        """Generate speech using OpenAI TTS"""
+    @asynccontextmanager
+    async def _slot(self):
+        """Hold a worker slot, queueing behind at most max_pending other requests"""
+        if self.slots.locked() and self.pending >= self.max_pending:
+            raise LocalWhisperQueueFull(f"{self.pending} local Whisper requests already queued")
+        
+        self.pending += 1
         try:
-            response = self.openai_client.audio.speech.create(
-                model="tts-1",
-                voice="alloy",
-                input=text
-            )
-            print("✅ OpenAI TTS generation successful")
-            return response.content
-            
-        except Exception as e:
-            print(f"❌ OpenAI TTS failed: {e}")
+            await self.slots.acquire()
+        finally:
+            self.pending -= 1
         
-        return b""
-    
-    def _generate_simple_beep(self) -> bytes:
-        """Generate a simple beep as absolute fallback"""
         try:
-            import numpy as np
-            import io
-            import soundfile as sf
-            
-            # Generate simple beep
-            sample_rate = 22050
-            duration = 0.5
-            frequency = 440
+            yield
+        finally:
+            self.slots.release()
+    
+    async def warm(self):
+        """Start the process pool and load the model in one worker before the first fallback needs it"""
+        # Modal workers scale to zero between fallbacks by design; the in-process backend is a test stand-in
+        if self.backend != "process" or self.pool is not None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._process_pool(), _pool_ready)
+    
+    def _process_pool(self):
+        """The local process pool, started on first use"""
+        if self.pool is None:
+            from concurrent.futures import ProcessPoolExecutor
             
-            t = np.linspace(0, duration, int(sample_rate * duration))
-            beep = np.sin(2 * np.pi * frequency * t) * 0.3
+            self.pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_pool_whisper)
+        return self.pool
+    
+    async def _modal_transcribe(self, audio_data: bytes) -> str:
+        """Dispatch to a LocalWhisperWorker container"""
+        return await LocalWhisperWorker().transcribe.remote.aio(audio_data)
+    
+    async def _process_transcribe(self, audio_data: bytes) -> str:
+        """Dispatch to a local process pool, starting it on first use"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._process_pool(), _pool_transcribe, audio_data)
+    
+    async def _inprocess_transcribe(self, audio_data: bytes) -> str:
+        """Run the stand-in transcriber (or a locally loaded model) in a worker thread"""
+        if self.transcriber is not None:
+            return await asyncio.to_thread(self.transcriber, audio_data)
+        
+        await self._load_model()
+        return await asyncio.to_thread(_whisper_transcribe, self.model, audio_data)
+    
+    async def _load_model(self):
+        """Load the in-process Whisper model on first use"""
+        if self.model is None:
+            import whisper
             
-            buffer = io.BytesIO()
-            sf.write(buffer, beep, sample_rate, format='WAV')
-            print("⚠️ Using simple beep fallback")
-            return buffer.getvalue()
+            print("🔄 Loading local Whisper model...")
+            self.model = await asyncio.to_thread(whisper.load_model, LOCAL_WHISPER_MODEL)
+
+
+class StreamingTranscription:
+    """
+    Incremental local Whisper transcription of one turn while the user is still speaking
+    
+    Every STREAM_STEP_SECONDS of new audio the uncommitted part of the buffer is re-decoded.
+    Leading segments that match the previous hypothesis are committed and their audio dropped
+    from the window (local agreement), so hypotheses stay stable and the decode at the
+    endpoint only covers the tail of the utterance.
+    """
+    
+    def __init__(self, local_stt: LocalWhisperClient,
+                 on_partial: Optional[Callable[[str, str], Awaitable]] = None):
+        """
+        Initialize an empty stream
+        
+        Args:
+            local_stt: Local Whisper client the windows are decoded on
+            on_partial: Optional async callback(stable_text, full_text) for each changed hypothesis
+        """
+        self.local_stt = local_stt
+        self.on_partial = on_partial
+        self.pcm = bytearray()
+        self.offset = 0          # Byte offset of the first uncommitted sample
+        self.decoded_to = 0      # Buffer length covered by the latest decode
+        self.committed: List[str] = []
+        self.hypothesis: List[Dict] = []
+        self.text = ""
+        self.partials = 0
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        # (query, task) of a web search started from the committed transcript, and that transcript
+        self.search_prefetch: Optional[Tuple[str, asyncio.Task]] = None
+        self.prefetched_text = ""
+    
+    @property
+    def seconds(self) -> float:
+        """Audio received so far"""
+        return len(self.pcm) / (2 * STT_SAMPLE_RATE)
+    
+    def samples(self):
+        """Received audio as float32 samples"""
+        import numpy as np
+        
+        return np.frombuffer(bytes(self.pcm), dtype="<i2").astype(np.float32) / 32768
+    
+    def feed(self, pcm: bytes):
+        """
+        Append streamed audio, starting a partial decode once enough is new
+        
+        Args:
+            pcm: 16 kHz mono 16-bit little-endian PCM
+        """
+        if self.closed or len(self.pcm) >= STREAM_MAX_SECONDS * 2 * STT_SAMPLE_RATE:
+            return
+        self.pcm.extend(pcm[:len(pcm) - len(pcm) % 2])
+        if self.task is None or self.task.done():
+            if self._step_due():
+                self.task = asyncio.create_task(self._partials())
+    
+    async def finish(self) -> str:
+        """
+        Decode whatever the partials have not covered and return the final transcript
+        
+        Returns:
+            Final transcript ("" if nothing was recognized)
+        """
+        self.closed = True
+        if self.task is not None:
+            # The decode in flight usually covers most of the tail; waiting beats redoing it
+            await asyncio.gather(self.task, return_exceptions=True)
+        if self.decoded_to < len(self.pcm):
+            self._update(await self._decode(len(self.pcm)), len(self.pcm), final=True)
+        return self.text
+    
+    def cancel(self):
+        """Stop decoding and drop a prefetched search"""
+        self.closed = True
+        if self.task is not None:
+            self.task.cancel()
+        if self.search_prefetch is not None:
+            self.search_prefetch[1].cancel()
+    
+    def _step_due(self) -> bool:
+        """Enough new audio for another partial decode"""
+        return len(self.pcm) - self.decoded_to >= STREAM_STEP_SECONDS * 2 * STT_SAMPLE_RATE
+    
+    async def _partials(self):
+        """Decode partial hypotheses while new audio keeps arriving"""
+        while not self.closed and self._step_due():
+            if self.local_stt.busy():
+                # Partials are best-effort: never queue them behind clips other turns are waiting on
+                STREAM_PARTIALS.inc(outcome="busy")
+                return
+            end = len(self.pcm)
+            try:
+                segments = await self._decode(end)
+            except Exception as e:
+                print(f"⚠️  Partial transcription failed: {e}")
+                STREAM_PARTIALS.inc(outcome="error")
+                return
+            previous = self.text
+            self._update(segments, end)
+            if self.closed:
+                return
+            if self.text == previous:
+                STREAM_PARTIALS.inc(outcome="unchanged")
+                continue
+            self.partials += 1
+            STREAM_PARTIALS.inc(outcome="sent")
+            if self.on_partial is not None:
+                await self.on_partial(" ".join(self.committed), self.text)
+    
+    async def _decode(self, end: int) -> List[Dict]:
+        """Transcribe the uncommitted window up to the given buffer length"""
+        prompt = " ".join(self.committed)[-STREAM_PROMPT_CHARS:]
+        return await self.local_stt.transcribe_window(bytes(self.pcm[self.offset:end]), prompt)
+    
+    def _update(self, segments: List[Dict], end: int, final: bool = False):
+        """Commit the segments this decode agrees on with the last one and rebuild the transcript"""
+        self.decoded_to = end
+        if final:
+            self.committed.extend(segment["text"] for segment in segments)
+            self.hypothesis = segments
+            self.text = " ".join(self.committed)
+            return
+        
+        # The last segment may still be cut off mid-word; only earlier ones can be confirmed
+        agreed = 0
+        while (agreed < min(len(segments) - 1, len(self.hypothesis))
+               and _normalize_words(segments[agreed]["text"]) == _normalize_words(self.hypothesis[agreed]["text"])):
+            agreed += 1
+        window_seconds = (end - self.offset) / (2 * STT_SAMPLE_RATE)
+        if agreed == 0 and window_seconds > STREAM_WINDOW_SECONDS and len(segments) > 1:
+            # No agreement within the window: commit the latest hypothesis rather than re-decoding forever
+            agreed = len(segments) - 1
+        
+        if agreed:
+            cut = segments[agreed - 1]["end"]
+            self.committed.extend(segment["text"] for segment in segments[:agreed])
+            self.offset += int(cut * STT_SAMPLE_RATE) * 2
+            segments = [dict(segment, start=segment["start"] - cut, end=segment["end"] - cut)
+                        for segment in segments[agreed:]]
+        self.hypothesis = segments
+        self.text = " ".join(self.committed + [segment["text"] for segment in segments])
+
+
+def _normalize_words(text: str) -> List[str]:
+    """Lowercase words without punctuation, for comparing hypotheses"""
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+class BodySizeLimitMiddleware:
+    """ASGI middleware rejecting request bodies over a per-path byte limit before they are parsed"""
+    
+    def __init__(self, app, limits: Dict[str, int]):
+        """
+        Wrap an ASGI app
+        
+        Args:
+            app: Application to protect
+            limits: Request path -> largest body accepted, in bytes
+        """
+        self.app = app
+        self.limits = limits
+    
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+        
+        endpoint = scope["path"].rsplit("/", 1)[-1]
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > limit:
+            # Refused from the header alone: nothing is read, parsed or spooled to disk
+            from fastapi.responses import JSONResponse
             
-        except:
-            print("❌ Even beep generation failed")
-            return b""
+            API_REQUESTS.inc(endpoint=endpoint, outcome="invalid")
+            response = JSONResponse({"detail": f"request body over {limit} bytes"}, status_code=413)
+            return await response(scope, receive, send)
+        
+        received = 0
+        
+        async def limited_receive():
+            # Chunked bodies (or a Content-Length that lies) stop as soon as they pass the limit
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > limit:
+                API_REQUESTS.inc(endpoint=endpoint, outcome="invalid")
+                raise HTTPException(status_code=413, detail=f"request body over {limit} bytes")
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+
+# Gateway image with STATIC_PHRASES pre-rendered into STATIC_AUDIO_DIR (rebuilt when this file changes)
+# and the deploy-time capacity settings in its environment
+gateway_image = api_image.run_function(
+    render_static_audio,
+    secrets=[modal.Secret.from_name("groq-api-key")],
+).env(CAPACITY_ENV)
 
 
 @app.function(
-    image=image,
+    image=gateway_image,
     secrets=[
         modal.Secret.from_name("groq-api-key"),  # Required
         modal.Secret.from_name("openai-api-key"),  # Optional
     ],
     keep_warm=1,  # Keep one instance warm for faster response
     timeout=300,  # 5 minute timeout
+    allow_concurrent_inputs=MAX_ACTIVE_SESSIONS,  # Scale out once a container is full
+    concurrency_limit=MAX_CONTAINERS,
 )
 @modal.asgi_app()
 def fastapi_app():
-    """Create and configure the FastAPI application"""
+    """Serve the FastAPI application on Modal"""
+    return create_web_app()
+
+
+def create_web_app():
+    """
+    Create and configure the FastAPI application
+    
+    Also usable outside Modal, e.g. `uvicorn main:create_web_app --factory` for offline benchmarks.
+    """
     
-    # Initialize the voice assistant
-    voice_assistant = VoiceAssistant()
+    # Initialize the voice assistant behind this container's admission limits
+    admission = AdmissionController()
+    voice_assistant = VoiceAssistant(admission)
+    static_audio = StaticAudioCache()
     web_app = FastAPI(title="Mohan Groq Assistant", version="1.0.0")
+    # Multipart uploads are parsed and spooled before the handler runs, so their size is capped here
+    web_app.add_middleware(BodySizeLimitMiddleware, limits={
+        "/api/transcribe": API_MAX_BATCH_BYTES + API_MAX_BATCH_FILES * API_MULTIPART_OVERHEAD,
+    })
+    
+    @web_app.on_event("startup")
+    async def start_background_monitors():
+        """Start per-container background monitoring, load pre-rendered audio and pre-warm providers"""
+        web_app.state.loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+        web_app.state.static_audio_task = asyncio.create_task(static_audio.warm(voice_assistant))
+        web_app.state.prewarm_task = voice_assistant.prewarm()
+        if SEARCH_CACHE:
+            web_app.state.search_refresh_task = asyncio.create_task(voice_assistant.web_searcher.run_refresher())
+        loop_diagnostics.attach()
+    
+    @web_app.on_event("shutdown")
+    async def close_provider_connections():
+        """Close pooled TTS connections so the service sees a clean disconnect"""
+        await voice_assistant.edge_tts.close()
+    
+    def require_admin(token: str):
+        """Reject admin requests unless ADMIN_TOKEN is configured and matches"""
+        if not ADMIN_TOKEN or token != ADMIN_TOKEN:
+            raise HTTPException(status_code=404)
+    
+    @web_app.get("/admin/loop")
+    async def get_loop_diagnostics(x_admin_token: str = Header("")):
+        """Report recent event loop stalls and their stacks"""
+        require_admin(x_admin_token)
+        return {
+            "diagnostics": LOOP_DIAGNOSTICS,
+            "threshold_ms": loop_diagnostics.threshold * 1000,
+            "stalls": list(loop_diagnostics.stalls),
+        }
+    
+    @web_app.get("/admin/providers")
+    async def get_provider_health(x_admin_token: str = Header("")):
+        """Report circuit breaker state and health score per provider"""
+        require_admin(x_admin_token)
+        return {name: breaker.snapshot() for name, breaker in voice_assistant.providers.breakers.items()}
+    
+    @web_app.get("/admin/search")
+    async def get_search_cache(x_admin_token: str = Header("")):
+        """Report hot search topics and the age of their cached summaries"""
+        require_admin(x_admin_token)
+        searcher = voice_assistant.web_searcher
+        now = time.time()
+        hot = []
+        for key, query in searcher.hot_topics():
+            entry = searcher.cache.get(key)
+            hot.append({
+                "query": query,
+                "requests": round(searcher.popularity[key][0], 2),
+                "ttl_s": searcher.topic_ttl(query),
+                "age_s": round(now - entry["fetched_at"], 1) if entry else None,
+                "retry_in_s": round(max(0.0, searcher.failures.get(key, [0, now])[1] - now), 1),
+            })
+        return {"enabled": SEARCH_CACHE, "entries": len(searcher.cache), "hot_topics": hot}
+    
+    @web_app.post("/admin/profile")
+    async def run_profiler(seconds: float = 10.0, x_admin_token: str = Header("")):
+        """Attach a sampling profiler to the event loop thread and return collapsed stacks"""
+        require_admin(x_admin_token)
+        try:
+            stacks = await loop_diagnostics.profile(min(seconds, 60.0))
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return PlainTextResponse(stacks)
+    
+    @web_app.get("/metrics")
+    async def get_metrics():
+        """Expose this container's metrics in the Prometheus text format"""
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+    
+    def busy_error(endpoint: str, e: CapacityExceeded) -> HTTPException:
+        """503 with the admission controller's retry hint"""
+        API_REQUESTS.inc(endpoint=endpoint, outcome="busy")
+        return HTTPException(status_code=503, detail=f"{e.stage} is at capacity",
+                             headers={"Retry-After": str(e.retry_after)})
+    
+    @web_app.post("/api/chat")
+    async def chat(payload: Dict = Body(...)):
+        """
+        Answer a text message without TTS
+        
+        Body: {"message": str, "stream": bool}. Returns {"response", "ms"}, or with stream=true
+        server-sent events of {"delta"} followed by {"done", "response", "ms"}.
+        """
+        message = str(payload.get("message") or "").strip()
+        if not message or len(message) > API_MAX_MESSAGE_CHARS:
+            API_REQUESTS.inc(endpoint="chat", outcome="invalid")
+            raise HTTPException(status_code=400, detail=f"message must be 1-{API_MAX_MESSAGE_CHARS} characters")
+        started = time.perf_counter()
+        
+        if not payload.get("stream"):
+            try:
+                response = await voice_assistant.generate_response(message)
+            except CapacityExceeded as e:
+                raise busy_error("chat", e)
+            API_REQUESTS.inc(endpoint="chat", outcome="ok")
+            return {"response": response, "ms": round((time.perf_counter() - started) * 1000, 1)}
+        
+        # Wait for the first delta, so a saturated stage is still a 503 instead of a broken stream
+        deltas = voice_assistant.stream_response(message)
+        try:
+            first = await deltas.__anext__()
+        except CapacityExceeded as e:
+            raise busy_error("chat", e)
+        except StopAsyncIteration:
+            first = ""
+        API_REQUESTS.inc(endpoint="chat_stream", outcome="ok")
+        
+        async def events():
+            text = first
+            yield f"data: {json.dumps({'delta': first})}\n\n"
+            async for delta in deltas:
+                text += delta
+                yield f"data: {json.dumps({'delta': delta})}\n\n"
+            done = {"done": True, "response": text, "ms": round((time.perf_counter() - started) * 1000, 1)}
+            yield f"data: {json.dumps(done)}\n\n"
+        
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    
+    @web_app.post("/api/transcribe")
+    async def transcribe_batch(files: List[UploadFile] = File(...)):
+        """
+        Transcribe many clips concurrently (API_BATCH_CONCURRENCY at a time)
+        
+        Streams one JSON line per clip as each completes: {"index", "filename", "text", "ms"},
+        or "error" and "retry_after" for clips rejected at capacity. Requests over
+        API_MAX_BATCH_FILES files, MAX_AUDIO_BYTES per file or API_MAX_BATCH_BYTES in total get a 413
+        (the total is enforced by BodySizeLimitMiddleware before the body is parsed).
+        """
+        if len(files) > API_MAX_BATCH_FILES:
+            API_REQUESTS.inc(endpoint="transcribe", outcome="invalid")
+            raise HTTPException(status_code=413, detail=f"at most {API_MAX_BATCH_FILES} files per request")
+        clips, total_bytes = [], 0
+        for upload in files:
+            # Read one byte past the cap so an oversized file is detected without loading all of it
+            audio_data = await upload.read(MAX_AUDIO_BYTES + 1)
+            total_bytes += len(audio_data)
+            if len(audio_data) > MAX_AUDIO_BYTES or total_bytes > API_MAX_BATCH_BYTES:
+                API_REQUESTS.inc(endpoint="transcribe", outcome="invalid")
+                limit = (f"at most {MAX_AUDIO_BYTES} bytes per file" if len(audio_data) > MAX_AUDIO_BYTES
+                         else f"at most {API_MAX_BATCH_BYTES} bytes per request")
+                raise HTTPException(status_code=413, detail=f"{upload.filename}: {limit}")
+            clips.append((upload.filename, audio_data))
+        slots = asyncio.Semaphore(API_BATCH_CONCURRENCY)
+        
+        async def transcribe(index: int, filename: str, audio_data: bytes) -> Dict:
+            # Bulk work: Groq budget goes to voice turns and chat first
+            _groq_priority.set("background")
+            async with slots:
+                started = time.perf_counter()
+                result = {"index": index, "filename": filename}
+                try:
+                    result["text"] = await voice_assistant.speech_to_text(audio_data)
+                    API_REQUESTS.inc(endpoint="transcribe", outcome="ok")
+                except CapacityExceeded as e:
+                    API_REQUESTS.inc(endpoint="transcribe", outcome="busy")
+                    result.update(error="busy", retry_after=e.retry_after)
+                result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+                return result
+        
+        async def results():
+            tasks = [asyncio.create_task(transcribe(index, filename, audio_data))
+                     for index, (filename, audio_data) in enumerate(clips)]
+            try:
+                for next_result in asyncio.as_completed(tasks):
+                    yield json.dumps(await next_result) + "\n"
+            finally:
+                # A client that disconnects stops the clips not transcribed yet
+                for task in tasks:
+                    task.cancel()
+        
+        return StreamingResponse(results(), media_type="application/x-ndjson")
     
     @web_app.get("/")
     async def get_homepage():
@@ -667,6 +4253,11 @@ def fastapi_app():
                     color: #2c3e50;
                 }
                 
+                .partial-message {
+                    opacity: 0.6;
+                    font-style: italic;
+                }
+                
                 .controls {
                     display: flex;
                     gap: 15px;
@@ -822,36 +4413,177 @@ def fastapi_app():
                 let isRecording = false;
                 let isProcessing = false;
                 let isSpeaking = false;
-                let currentAudio = null;
+                let currentTurn = 0;
+                let heartbeatTimer = null;
+                let reconnectDelay = 3000;
+                // Binary audio frame announced by the preceding JSON message
+                let pendingAudioFrame = null;
+                // Plays the reply being spoken, one appended chunk per sentence
+                let player = null;
+                // Number of audio chunks announced by the current reply
+                let replyChunks = 0;
+                // Shared Web Audio context for PCM playback; created on the first user gesture
+                let audioContext = null;
+                let pcmWorkletLoaded = null;
+                // Seconds of audio buffered before playback starts, absorbing gaps between sentences
+                const JITTER_BUFFER_SECONDS = 0.3;
+                let greetingRequested = false;
+                // Autoplay is blocked until the user interacts with the page
+                let userGestured = false;
+                // Set by the server when it transcribes audio streamed while the user is still speaking
+                let streamingStt = false;
+                let pcmStreamer = null;
+                let partialMessage = null;
+                // Append ?trace=1 to the page URL to log per-turn latency breakdowns
+                const traceTurns = new URLSearchParams(window.location.search).has('trace');
+
+                // TTS formats this browser can play, best first; ?audio=pcm (or mp3-96k) overrides
+                function preferredAudioFormats() {
+                    const probe = document.createElement('audio');
+                    const formats = [];
+                    const requested = new URLSearchParams(window.location.search).get('audio');
+                    if (requested) formats.push(requested);
+                    if (probe.canPlayType('audio/webm; codecs="opus"')) formats.push('opus');
+                    formats.push('mp3-48k');
+                    return formats;
+                }
+
+                function requestGreeting() {
+                    // Spoken greeting, served pre-rendered; once per page load, after the first gesture
+                    if (greetingRequested || !userGestured || !ws || ws.readyState !== WebSocket.OPEN) return;
+                    greetingRequested = true;
+                    ws.send(JSON.stringify({ type: 'greeting' }));
+                }
+
+                function onFirstGesture() {
+                    userGestured = true;
+                    // Inside the gesture, so the browser lets the greeting play
+                    ensureAudioContext();
+                    requestGreeting();
+                }
 
                 function connectWebSocket() {
                     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
                     const wsUrl = `${protocol}//${window.location.host}/ws`;
                     
                     ws = new WebSocket(wsUrl);
+                    ws.binaryType = 'arraybuffer';
                     
                     ws.onopen = function() {
                         console.log('🔗 WebSocket connected');
                         updateStatus('🎤 Connected - Ready to chat!');
+                        
+                        ws.send(JSON.stringify({ type: 'hello', audio_formats: preferredAudioFormats() }));
+                        
+                        requestGreeting();
+                        
+                        // Heartbeat keeps the server from dropping an idle connection
+                        clearInterval(heartbeatTimer);
+                        heartbeatTimer = setInterval(function() {
+                            if (ws.readyState === WebSocket.OPEN) {
+                                ws.send(JSON.stringify({ type: 'ping', ts: Date.now() }));
+                            }
+                        }, 15000);
                     };
                     
                     ws.onmessage = function(event) {
+                        if (event.data instanceof ArrayBuffer) {
+                            const frame = pendingAudioFrame;
+                            pendingAudioFrame = null;
+                            if (!frame || frame.turn !== currentTurn || isRecording) {
+                                return;
+                            }
+                            // Single clips and the first sentence start a new player; later sentences append
+                            const single = frame.index === undefined;
+                            if (single || frame.index === 0 || !player) {
+                                startPlayer(frame.mime);
+                            }
+                            if (event.data.byteLength) {
+                                player.push(event.data, frame.mime);
+                            }
+                            if (single || frame.index === replyChunks - 1) {
+                                player.finish();
+                            }
+                            return;
+                        }
+                        
                         const data = JSON.parse(event.data);
                         
+                        // Drop late results from turns that were cancelled or superseded
+                        if (data.turn !== undefined && data.turn !== currentTurn) {
+                            return;
+                        }
+                        
+                        if (data.type === 'pong') {
+                            return;
+                        }
+                        
+                        if (data.type === 'audio_format') {
+                            console.log(`🔊 Audio format: ${data.format} (~${data.bytes_per_second} bytes/s)`);
+                            streamingStt = Boolean(data.streaming_stt);
+                            return;
+                        }
+                        
+                        if (data.type === 'trace') {
+                            console.log(`⏱️ Turn ${data.turn}: ${data.total_ms} ms`);
+                            console.table(data.stages);
+                            return;
+                        }
+                        
+                        if (data.type === 'busy') {
+                            // Server is at capacity; back off for the suggested interval
+                            if (data.stage === 'session') {
+                                reconnectDelay = data.retry_after * 1000;
+                            }
+                            isProcessing = false;
+                            updateButtons();
+                            updateStatus(`⏳ Jackie is busy right now - please try again in ${data.retry_after}s`);
+                            return;
+                        }
+                        
+                        if (data.type === 'greeting') {
+                            // Only played if the user has not started a conversation yet
+                            pendingAudioFrame = { turn: 0, mime: data.mime };
+                            return;
+                        }
+                        
+                        if (data.type === 'audio_chunk') {
+                            // One sentence of the reply; its audio follows as a binary frame
+                            pendingAudioFrame = { turn: data.turn, mime: data.mime, index: data.index };
+                            return;
+                        }
+                        
+                        if (data.type === 'transcription_partial') {
+                            showPartial(data.text);
+                            return;
+                        }
+                        
                         if (data.type === 'transcription') {
+                            clearPartial();
                             addMessage('user', data.text);
                         } else if (data.type === 'response') {
                             addMessage('assistant', data.text);
+                            replyChunks = data.audio_chunks || 0;
                             if (data.audio) {
-                                playAudio(data.audio);
+                                playAudio(data.audio, data.mime);
+                            } else if (data.audio_frame) {
+                                pendingAudioFrame = { turn: data.turn, mime: data.mime };
+                            } else if (data.audio_chunks === 0) {
+                                isProcessing = false;
+                                updateButtons();
+                                updateStatus('✅ Ready for next question');
                             }
                         }
                     };
                     
                     ws.onclose = function() {
                         console.log('❌ WebSocket disconnected');
-                        updateStatus('❌ Disconnected - Reconnecting...');
-                        setTimeout(connectWebSocket, 3000);
+                        clearInterval(heartbeatTimer);
+                        if (reconnectDelay === 3000) {
+                            updateStatus('❌ Disconnected - Reconnecting...');
+                        }
+                        setTimeout(connectWebSocket, reconnectDelay);
+                        reconnectDelay = 3000;
                     };
                     
                     ws.onerror = function(error) {
@@ -871,6 +4603,8 @@ def fastapi_app():
                 async function startRecording() {
                     try {
                         stopCurrentAudio();
+                        // Inside the click handler, so the browser lets the context play later
+                        ensureAudioContext();
                         
                         const stream = await navigator.mediaDevices.getUserMedia({ 
                             audio: {
@@ -881,6 +4615,17 @@ def fastapi_app():
                             } 
                         });
                         
+                        if (streamingStt && window.AudioWorkletNode && audioContext) {
+                            // Stream PCM as the user speaks; the server transcribes it on the fly
+                            currentTurn += 1;
+                            clearPartial();
+                            pcmStreamer = new PcmStreamer(stream, currentTurn);
+                            isRecording = true;
+                            updateButtons();
+                            updateStatus('🔴 Recording... Release button when done');
+                            return;
+                        }
+                        
                         audioChunks = [];
                         mediaRecorder = new MediaRecorder(stream, {
                             mimeType: 'audio/webm;codecs=opus'
@@ -912,7 +4657,14 @@ def fastapi_app():
                 }
 
                 function stopRecording() {
-                    if (mediaRecorder && isRecording) {
+                    if (pcmStreamer && isRecording) {
+                        pcmStreamer.stop();
+                        pcmStreamer = null;
+                        isRecording = false;
+                        isProcessing = true;
+                        updateButtons();
+                        updateStatus('⚡ Processing your question...');
+                    } else if (mediaRecorder && isRecording) {
                         mediaRecorder.stop();
                         isRecording = false;
                         isProcessing = true;
@@ -921,12 +4673,24 @@ def fastapi_app():
                     }
                 }
 
+                function cancelTurn() {
+                    // Tell the server to abort the in-flight STT/LLM/TTS work for this turn
+                    if (ws && ws.readyState === WebSocket.OPEN) {
+                        ws.send(JSON.stringify({ type: 'cancel', turn: currentTurn }));
+                    }
+                    currentTurn += 1;
+                    isProcessing = false;
+                    updateButtons();
+                    updateStatus('🛑 Request cancelled - Ready for next question');
+                }
+
                 function stopCurrentAudio() {
-                    if (currentAudio) {
-                        currentAudio.pause();
-                        currentAudio.currentTime = 0;
-                        currentAudio = null;
-                        isSpeaking = false;
+                    // A reply still streaming in is cancelled too, so no later sentence restarts playback
+                    if (isProcessing || (player && !player.finished)) {
+                        cancelTurn();
+                    }
+                    if (player) {
+                        stopPlayback();
                         updateButtons();
                         updateStatus('🎤 Audio stopped - Ready for next question');
                     }
@@ -936,8 +4700,11 @@ def fastapi_app():
                     const reader = new FileReader();
                     reader.onload = function() {
                         const base64Audio = reader.result.split(',')[1];
+                        currentTurn += 1;
                         ws.send(JSON.stringify({
                             type: 'audio',
+                            turn: currentTurn,
+                            trace: traceTurns,
                             data: base64Audio,
                             mimeType: audioBlob.type,
                             size: audioBlob.size
@@ -946,45 +4713,534 @@ def fastapi_app():
                     reader.readAsDataURL(audioBlob);
                 }
 
-                function playAudio(base64Audio) {
-                    try {
-                        stopCurrentAudio();
-                        
-                        currentAudio = new Audio(`data:audio/wav;base64,${base64Audio}`);
+                function playAudio(base64Audio, mime) {
+                    const bytes = Uint8Array.from(atob(base64Audio), c => c.charCodeAt(0));
+                    const clip = startPlayer(mime || 'audio/mpeg');
+                    clip.push(bytes.buffer);
+                    clip.finish();
+                }
+
+                function startPlayer(mime) {
+                    // The turn has completed; stopping old playback must not cancel it
+                    isProcessing = false;
+                    stopPlayback();
+                    const current = new SequencePlayer(mime);
+                    current.onstart = function() {
+                        if (player !== current || isSpeaking) return;
                         isSpeaking = true;
-                        isProcessing = false;
                         updateButtons();
                         updateStatus('🔊 Jackie is speaking - Click Stop to interrupt');
-                        
-                        currentAudio.onended = function() {
-                            currentAudio = null;
-                            isSpeaking = false;
-                            updateButtons();
-                            updateStatus('✅ Ready for next question');
+                    };
+                    current.onended = function() {
+                        endPlayback(current, '✅ Ready for next question');
+                    };
+                    current.onerror = function(e) {
+                        console.log('Audio playback failed:', e);
+                        endPlayback(current, '🎤 Ready to chat');
+                    };
+                    player = current;
+                    updateButtons();
+                    return current;
+                }
+
+                function endPlayback(current, status) {
+                    if (player !== current) return;
+                    current.stop();
+                    player = null;
+                    isSpeaking = false;
+                    updateButtons();
+                    updateStatus(status);
+                }
+
+                function stopPlayback() {
+                    if (player) {
+                        player.stop();
+                        player = null;
+                    }
+                    isSpeaking = false;
+                }
+
+                function createChunkPlayer(mime) {
+                    // PCM goes straight to an AudioWorklet; compressed formats through MediaSource;
+                    // anything the browser cannot stream falls back to one <audio> element per chunk
+                    if (mime === 'audio/wav' && window.AudioWorkletNode && ensureAudioContext()) {
+                        return new PcmChunkPlayer();
+                    }
+                    const type = mediaSourceType(mime);
+                    if (window.MediaSource && MediaSource.isTypeSupported(type)) {
+                        return new MediaSourceChunkPlayer(type);
+                    }
+                    return new ElementChunkPlayer(mime);
+                }
+
+                function mediaSourceType(mime) {
+                    // MediaSource wants quoted codecs: 'audio/webm; codecs="opus"'
+                    const [type, codecs] = mime.split(';').map(part => part.trim());
+                    return codecs ? `${type}; codecs="${codecs.replace('codecs=', '').replace(/"/g, '')}"` : type;
+                }
+
+                function ensureAudioContext() {
+                    const Context = window.AudioContext || window.webkitAudioContext;
+                    if (!Context) return null;
+                    if (!audioContext) {
+                        audioContext = new Context();
+                    }
+                    if (audioContext.state === 'suspended') {
+                        audioContext.resume();
+                    }
+                    return audioContext;
+                }
+
+                // A reply can change container mid-way (Edge WebM next to OpenAI Ogg, the WAV beep, local WAV
+                // without ffmpeg): each run of same-MIME chunks gets its own player, started when the last ends
+                class SequencePlayer {
+                    constructor(mime) {
+                        this.segments = [{ mime: mime, chunks: [], finished: false }];
+                        this.index = 0;
+                        this.current = null;
+                        this.started = false;
+                        this.finished = false;
+                        this.stopped = false;
+                        this.startSegment();
+                    }
+
+                    push(data, mime) {
+                        let segment = this.segments[this.segments.length - 1];
+                        if (mime && mime !== segment.mime) {
+                            this.finishSegment(segment);
+                            segment = { mime: mime, chunks: [], finished: false };
+                            this.segments.push(segment);
+                            if (!this.current && !this.stopped) {
+                                // The previous segment failed; play on from this one
+                                this.index = this.segments.length - 1;
+                                this.startSegment();
+                            }
+                        }
+                        if (segment !== this.segments[this.index]) {
+                            segment.chunks.push(data);
+                        } else if (this.current) {
+                            this.current.push(data);
+                        }
+                    }
+
+                    finish() {
+                        this.finished = true;
+                        this.finishSegment(this.segments[this.segments.length - 1]);
+                        if (!this.current && this.index === this.segments.length - 1) this.onended();
+                    }
+
+                    finishSegment(segment) {
+                        segment.finished = true;
+                        if (this.current && segment === this.segments[this.index]) this.current.finish();
+                    }
+
+                    startSegment() {
+                        const segment = this.segments[this.index];
+                        const current = createChunkPlayer(segment.mime);
+                        current.onstart = () => {
+                            if (this.started) return;
+                            this.started = true;
+                            this.onstart();
                         };
-                        
-                        currentAudio.onerror = function() {
-                            currentAudio = null;
-                            isSpeaking = false;
-                            isProcessing = false;
-                            updateButtons();
-                            updateStatus('🎤 Ready to chat');
+                        current.onended = () => this.next();
+                        current.onerror = (e) => {
+                            console.log('Audio segment failed:', segment.mime, e);
+                            this.next();
                         };
-                        
-                        currentAudio.play().catch(e => {
+                        this.current = current;
+                        segment.chunks.forEach(data => current.push(data));
+                        segment.chunks = [];
+                        if (segment.finished) current.finish();
+                    }
+
+                    next() {
+                        if (this.stopped || !this.current) return;
+                        this.current.stop();
+                        this.current = null;
+                        if (this.index + 1 < this.segments.length) {
+                            this.index += 1;
+                            this.startSegment();
+                        } else if (this.finished) {
+                            this.onended();
+                        }
+                        // Otherwise a segment failed mid-way: its remaining chunks are dropped and
+                        // the next MIME change (or finish) picks up from there
+                    }
+
+                    stop() {
+                        this.stopped = true;
+                        if (this.current) this.current.stop();
+                    }
+                }
+
+                // Sentences share one media element: appended in sequence mode they play back to back
+                class MediaSourceChunkPlayer {
+                    constructor(type) {
+                        this.pending = [];
+                        this.finished = false;
+                        this.started = false;
+                        this.stopped = false;
+                        this.sourceBuffer = null;
+                        this.mediaSource = new MediaSource();
+                        this.url = URL.createObjectURL(this.mediaSource);
+                        this.audio = new Audio(this.url);
+                        this.audio.onended = () => this.onended();
+                        this.audio.onerror = () => this.onerror(this.audio.error);
+                        this.mediaSource.addEventListener('sourceopen', () => {
+                            if (this.stopped) return;
+                            try {
+                                this.sourceBuffer = this.mediaSource.addSourceBuffer(type);
+                                this.sourceBuffer.mode = 'sequence';
+                                this.sourceBuffer.addEventListener('updateend', () => this.pump());
+                                this.pump();
+                            } catch (e) {
+                                this.onerror(e);
+                            }
+                        }, { once: true });
+                    }
+
+                    push(data) {
+                        this.pending.push(data);
+                        this.pump();
+                    }
+
+                    finish() {
+                        this.finished = true;
+                        this.pump();
+                    }
+
+                    pump() {
+                        const buffer = this.sourceBuffer;
+                        if (!buffer || buffer.updating || this.stopped) return;
+                        if (this.pending.length) {
+                            try {
+                                buffer.appendBuffer(this.pending.shift());
+                            } catch (e) {
+                                this.onerror(e);
+                            }
+                            return;
+                        }
+                        const ranges = buffer.buffered;
+                        const ahead = ranges.length ? ranges.end(ranges.length - 1) - this.audio.currentTime : 0;
+                        if (!this.started && (ahead >= JITTER_BUFFER_SECONDS || this.finished)) {
+                            this.started = true;
+                            this.audio.play().then(() => this.onstart()).catch(e => this.onerror(e));
+                        }
+                        if (this.finished && this.mediaSource.readyState === 'open') {
+                            this.mediaSource.endOfStream();
+                        }
+                    }
+
+                    stop() {
+                        this.stopped = true;
+                        this.audio.onended = null;
+                        this.audio.onerror = null;
+                        this.audio.pause();
+                        URL.revokeObjectURL(this.url);
+                    }
+                }
+
+                // Runs in the audio thread: plays queued float samples, holding output until enough is buffered
+                const PCM_WORKLET_SOURCE = `
+                    class PcmPlayerProcessor extends AudioWorkletProcessor {
+                        constructor() {
+                            super();
+                            this.queue = [];
+                            this.offset = 0;
+                            this.buffered = 0;
+                            this.started = false;
+                            this.finished = false;
+                            this.port.onmessage = (event) => {
+                                if (event.data === 'finish') {
+                                    this.finished = true;
+                                } else {
+                                    this.queue.push(event.data);
+                                    this.buffered += event.data.length;
+                                }
+                            };
+                        }
+
+                        process(inputs, outputs) {
+                            const output = outputs[0][0];
+                            if (!this.started) {
+                                if (this.buffered < sampleRate * ${JITTER_BUFFER_SECONDS} && !this.finished) return true;
+                                this.started = true;
+                                this.port.postMessage('started');
+                            }
+                            let written = 0;
+                            while (written < output.length && this.queue.length) {
+                                const chunk = this.queue[0];
+                                const count = Math.min(output.length - written, chunk.length - this.offset);
+                                output.set(chunk.subarray(this.offset, this.offset + count), written);
+                                written += count;
+                                this.offset += count;
+                                this.buffered -= count;
+                                if (this.offset === chunk.length) {
+                                    this.queue.shift();
+                                    this.offset = 0;
+                                }
+                            }
+                            if (this.finished && !this.queue.length) {
+                                this.port.postMessage('ended');
+                                return false;
+                            }
+                            return true;
+                        }
+                    }
+                    registerProcessor('pcm-player', PcmPlayerProcessor);
+                `;
+
+                function loadPcmWorklet(context) {
+                    if (!pcmWorkletLoaded) {
+                        const url = URL.createObjectURL(new Blob([PCM_WORKLET_SOURCE], { type: 'application/javascript' }));
+                        pcmWorkletLoaded = context.audioWorklet.addModule(url);
+                    }
+                    return pcmWorkletLoaded;
+                }
+
+                function decodeWav(buffer, targetRate) {
+                    // 16-bit PCM WAV, first channel, as float samples at the context's rate
+                    const view = new DataView(buffer);
+                    let offset = 12;
+                    let rate = targetRate;
+                    let channels = 1;
+                    let samples = new Float32Array(0);
+                    while (offset + 8 <= view.byteLength) {
+                        const id = String.fromCharCode(view.getUint8(offset), view.getUint8(offset + 1),
+                                                       view.getUint8(offset + 2), view.getUint8(offset + 3));
+                        const size = view.getUint32(offset + 4, true);
+                        const body = offset + 8;
+                        if (id === 'fmt ') {
+                            channels = view.getUint16(body + 2, true);
+                            rate = view.getUint32(body + 4, true);
+                        } else if (id === 'data') {
+                            // Streamed WAVs may not fill in the data size; read to the end of the frame
+                            const end = Math.min(body + size, view.byteLength);
+                            const count = Math.floor((end - body) / (2 * channels));
+                            samples = new Float32Array(count);
+                            for (let i = 0; i < count; i++) {
+                                samples[i] = view.getInt16(body + i * 2 * channels, true) / 32768;
+                            }
+                            break;
+                        }
+                        offset = body + size + (size % 2);
+                    }
+                    if (rate === targetRate || !samples.length) return samples;
+                    const ratio = rate / targetRate;
+                    const resampled = new Float32Array(Math.floor(samples.length / ratio));
+                    for (let i = 0; i < resampled.length; i++) {
+                        const position = i * ratio;
+                        const index = Math.floor(position);
+                        const next = Math.min(index + 1, samples.length - 1);
+                        resampled[i] = samples[index] + (samples[next] - samples[index]) * (position - index);
+                    }
+                    return resampled;
+                }
+
+                class PcmChunkPlayer {
+                    constructor() {
+                        this.pending = [];
+                        this.finished = false;
+                        this.stopped = false;
+                        this.node = null;
+                        const context = audioContext;
+                        loadPcmWorklet(context).then(() => {
+                            if (this.stopped) return;
+                            this.node = new AudioWorkletNode(context, 'pcm-player', { outputChannelCount: [1] });
+                            this.node.port.onmessage = (event) => {
+                                if (event.data === 'started') this.onstart();
+                                if (event.data === 'ended') this.onended();
+                            };
+                            this.node.connect(context.destination);
+                            this.pending.forEach(data => this.push(data));
+                            this.pending = [];
+                            if (this.finished) this.node.port.postMessage('finish');
+                        }).catch(e => this.onerror(e));
+                    }
+
+                    push(data) {
+                        if (!this.node) {
+                            this.pending.push(data);
+                            return;
+                        }
+                        const samples = decodeWav(data, this.node.context.sampleRate);
+                        this.node.port.postMessage(samples, [samples.buffer]);
+                    }
+
+                    finish() {
+                        this.finished = true;
+                        if (this.node) this.node.port.postMessage('finish');
+                    }
+
+                    stop() {
+                        this.stopped = true;
+                        if (this.node) {
+                            this.node.port.onmessage = null;
+                            this.node.disconnect();
+                        }
+                    }
+                }
+
+                // Fallback for browsers without MediaSource support for the format: one clip per chunk
+                class ElementChunkPlayer {
+                    constructor(mime) {
+                        this.mime = mime;
+                        this.queue = [];
+                        this.finished = false;
+                        this.stopped = false;
+                        this.current = null;
+                    }
+
+                    push(data) {
+                        this.queue.push(URL.createObjectURL(new Blob([data], { type: this.mime })));
+                        if (!this.current) this.next();
+                    }
+
+                    finish() {
+                        this.finished = true;
+                        if (!this.current && !this.queue.length) this.onended();
+                    }
+
+                    next() {
+                        if (this.stopped) return;
+                        const url = this.queue.shift();
+                        if (!url) {
+                            this.current = null;
+                            if (this.finished) this.onended();
+                            return;
+                        }
+                        const audio = new Audio(url);
+                        this.current = audio;
+                        audio.onended = audio.onerror = () => {
+                            URL.revokeObjectURL(url);
+                            this.next();
+                        };
+                        audio.play().then(() => this.onstart()).catch(e => {
                             console.log('Audio play failed:', e);
-                            currentAudio = null;
-                            isSpeaking = false;
-                            isProcessing = false;
-                            updateButtons();
-                            updateStatus('🎤 Ready to chat');
+                            URL.revokeObjectURL(url);
+                            this.next();
                         });
-                        
-                    } catch (e) {
-                        console.log('Audio creation failed:', e);
-                        isProcessing = false;
-                        updateButtons();
-                        updateStatus('🎤 Ready to chat');
+                    }
+
+                    stop() {
+                        this.stopped = true;
+                        if (this.current) this.current.pause();
+                        this.queue.forEach(url => URL.revokeObjectURL(url));
+                        this.queue = [];
+                    }
+                }
+
+                // Runs in the audio thread: forwards microphone blocks to the page
+                const PCM_CAPTURE_SOURCE = `
+                    class PcmCaptureProcessor extends AudioWorkletProcessor {
+                        process(inputs) {
+                            const input = inputs[0][0];
+                            if (input) this.port.postMessage(input.slice());
+                            return true;
+                        }
+                    }
+                    registerProcessor('pcm-capture', PcmCaptureProcessor);
+                `;
+                let pcmCaptureLoaded = null;
+                // Seconds of microphone audio per "audio_stream" message
+                const STREAM_CHUNK_SECONDS = 0.25;
+                const STREAM_SAMPLE_RATE = 16000;
+
+                function loadCaptureWorklet(context) {
+                    if (!pcmCaptureLoaded) {
+                        const url = URL.createObjectURL(new Blob([PCM_CAPTURE_SOURCE], { type: 'application/javascript' }));
+                        pcmCaptureLoaded = context.audioWorklet.addModule(url);
+                    }
+                    return pcmCaptureLoaded;
+                }
+
+                // Sends the microphone as 16 kHz 16-bit PCM chunks while recording, then "audio_end"
+                class PcmStreamer {
+                    constructor(stream, turn) {
+                        this.stream = stream;
+                        this.turn = turn;
+                        this.ratio = audioContext.sampleRate / STREAM_SAMPLE_RATE;
+                        this.position = 0;
+                        this.sum = 0;
+                        this.count = 0;
+                        this.samples = [];
+                        this.node = null;
+                        this.stopped = false;
+                        this.source = audioContext.createMediaStreamSource(stream);
+                        loadCaptureWorklet(audioContext).then(() => {
+                            if (this.stopped) return;
+                            this.node = new AudioWorkletNode(audioContext, 'pcm-capture');
+                            this.node.port.onmessage = (event) => this.capture(event.data);
+                            this.source.connect(this.node);
+                            // Silent output; connected so the browser keeps pulling the node
+                            this.node.connect(audioContext.destination);
+                        }).catch(e => console.log('PCM capture failed:', e));
+                    }
+
+                    capture(block) {
+                        // Downsample by averaging the input samples behind each output sample
+                        for (let i = 0; i < block.length; i++) {
+                            this.sum += block[i];
+                            this.count += 1;
+                            this.position += 1;
+                            if (this.position >= this.ratio) {
+                                this.position -= this.ratio;
+                                this.samples.push(this.sum / this.count);
+                                this.sum = 0;
+                                this.count = 0;
+                            }
+                        }
+                        if (this.samples.length >= STREAM_SAMPLE_RATE * STREAM_CHUNK_SECONDS) {
+                            this.flush();
+                        }
+                    }
+
+                    flush() {
+                        if (!this.samples.length || !ws || ws.readyState !== WebSocket.OPEN) return;
+                        const pcm = new Int16Array(this.samples.length);
+                        for (let i = 0; i < pcm.length; i++) {
+                            pcm[i] = Math.max(-1, Math.min(1, this.samples[i])) * 32767;
+                        }
+                        this.samples = [];
+                        const bytes = new Uint8Array(pcm.buffer);
+                        let binary = '';
+                        for (let i = 0; i < bytes.length; i++) {
+                            binary += String.fromCharCode(bytes[i]);
+                        }
+                        ws.send(JSON.stringify({ type: 'audio_stream', turn: this.turn, pcm: btoa(binary) }));
+                    }
+
+                    stop() {
+                        this.flush();
+                        this.stopped = true;
+                        if (this.node) {
+                            this.node.port.onmessage = null;
+                            this.node.disconnect();
+                        }
+                        this.source.disconnect();
+                        this.stream.getTracks().forEach(track => track.stop());
+                        if (ws && ws.readyState === WebSocket.OPEN) {
+                            ws.send(JSON.stringify({ type: 'audio_end', turn: this.turn, trace: traceTurns }));
+                        }
+                    }
+                }
+
+                function showPartial(text) {
+                    // Live transcript of the question being spoken, replaced by the final one
+                    if (!partialMessage) {
+                        partialMessage = document.createElement('div');
+                        partialMessage.className = 'message user-message partial-message';
+                        document.getElementById('chatContainer').appendChild(partialMessage);
+                    }
+                    partialMessage.textContent = text;
+                    const chatContainer = document.getElementById('chatContainer');
+                    chatContainer.scrollTop = chatContainer.scrollHeight;
+                }
+
+                function clearPartial() {
+                    if (partialMessage) {
+                        partialMessage.remove();
+                        partialMessage = null;
                     }
                 }
 
@@ -1011,10 +5267,10 @@ def fastapi_app():
                         talkBtn.disabled = false;
                         stopBtn.disabled = true;
                     } else if (isProcessing) {
-                        talkBtn.textContent = '⚡ Processing...';
+                        talkBtn.textContent = '⚡ Processing... (tap to interrupt)';
                         talkBtn.classList.remove('recording');
-                        talkBtn.disabled = true;
-                        stopBtn.disabled = true;
+                        talkBtn.disabled = false;
+                        stopBtn.disabled = false;
                     } else {
                         talkBtn.textContent = '🎤 Start Recording';
                         talkBtn.classList.remove('recording');
@@ -1029,17 +5285,21 @@ def fastapi_app():
 
                 // Keyboard shortcuts
                 document.addEventListener('keydown', function(e) {
-                    if (e.code === 'Space' && !isRecording && !isProcessing) {
+                    if (e.code === 'Space' && !isRecording) {
                         e.preventDefault();
                         toggleTalk();
                     }
-                    if (e.code === 'Escape' && (isSpeaking || isRecording)) {
+                    if (e.code === 'Escape' && (isSpeaking || isRecording || isProcessing)) {
                         e.preventDefault();
-                        if (isSpeaking) stopCurrentAudio();
+                        if (isSpeaking || isProcessing) stopCurrentAudio();
                         if (isRecording) stopRecording();
                     }
                 });
 
+                // The greeting waits for a click or key press anywhere (including the mic button)
+                document.addEventListener('pointerdown', onFirstGesture, { once: true });
+                document.addEventListener('keydown', onFirstGesture, { once: true });
+
                 // Initialize
                 connectWebSocket();
             </script>
@@ -1051,65 +5311,38 @@ def fastapi_app():
     @web_app.websocket("/ws")
     async def websocket_endpoint(websocket: WebSocket):
         """Handle WebSocket connections for real-time voice chat"""
-        await websocket.accept()
+        if not admission.admit_session():
+            # Accept only to deliver the retry hint, then close with "try again later"
+            print(f"🚦 Session limit reached ({admission.max_sessions}), rejecting connection")
+            await websocket.accept()
+            await websocket.send_text(json.dumps({
+                "type": "busy",
+                "stage": "session",
+                "retry_after": admission.retry_after
+            }))
+            await websocket.close(code=1013)
+            return
+        
+        # Take the slot before any await, so a burst of connects cannot all pass the check above
         connection_id = id(websocket)
         active_connections[connection_id] = websocket
         
         try:
-            while True:
-                # Receive message from client
-                data = await websocket.receive_text()
-                message = json.loads(data)
-                
-                if message["type"] == "audio":
-                    # Process voice message
-                    audio_data = base64.b64decode(message["data"])
-                    print(f"📨 Received audio: {len(audio_data)} bytes")
-                    
-                    # Step 1: Convert speech to text
-                    user_text = await voice_assistant.speech_to_text(audio_data)
-                    
-                    if user_text and user_text.strip():
-                        # Send transcription back to client
-                        await websocket.send_text(json.dumps({
-                            "type": "transcription",
-                            "text": user_text.strip()
-                        }))
-                        
-                        # Step 2: Generate response
-                        response_text = await voice_assistant.generate_response(user_text.strip())
-                        
-                        # Step 3: Convert response to speech
-                        response_audio = await voice_assistant.text_to_speech(response_text)
-                        
-                        # Send response back to client
-                        await websocket.send_text(json.dumps({
-                            "type": "response",
-                            "text": response_text,
-                            "audio": base64.b64encode(response_audio).decode() if response_audio else ""
-                        }))
-                    else:
-                        # Handle unclear audio
-                        await websocket.send_text(json.dumps({
-                            "type": "transcription",
-                            "text": "[Could not understand audio - please try speaking more clearly]"
-                        }))
-                        
-                        error_response = ("I didn't catch that clearly. Could you please speak a bit louder and more clearly? "
-                                        "I'm here to answer any questions about Mohan's experience in data science!")
-                        response_audio = await voice_assistant.text_to_speech(error_response)
-                        
-                        await websocket.send_text(json.dumps({
-                            "type": "response",
-                            "text": error_response,
-                            "audio": base64.b64encode(response_audio).decode() if response_audio else ""
-                        }))
-                        
+            await websocket.accept()
+            if PREWARM_ON_ACCEPT:
+                # Connections open in the background while the user records their first question
+                voice_assistant.prewarm()
+            session = ConversationSession(websocket, voice_assistant, static_audio)
+            await session.run()
         except WebSocketDisconnect:
-            if connection_id in active_connections:
-                del active_connections[connection_id]
+            pass
         except Exception as e:
             print(f"❌ WebSocket error: {e}")
+            try:
+                await websocket.close(code=1011)
+            except Exception:
+                pass
+        finally:
             if connection_id in active_connections:
                 del active_connections[connection_id]
     
@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Mohan Voice Assistant - Stub Provider Servers
+Local stand-ins for Groq, OpenAI, Edge TTS and web search with configurable latency
+and streaming behavior, so the assistant can be benchmarked offline and in CI.
+
+Endpoints:
+- POST /openai/v1/audio/transcriptions   Groq Whisper (point GROQ_BASE_URL here)
+- POST /openai/v1/chat/completions       Groq LLM, JSON or SSE streaming
+  (both Groq endpoints send x-ratelimit-* headers and 429s when per-model budgets are set)
+- POST /v1/audio/transcriptions          OpenAI Whisper (point OPENAI_BASE_URL at /v1)
+- POST /v1/audio/speech                  OpenAI TTS
+- WS   /edge                             Edge TTS synthesis protocol (point EDGE_TTS_URL here)
+- GET  /search, /page/{n}                DDGS-shaped search results and pages (SEARCH_API_URL)
+
+StubWhisper stands in for the local Whisper model in-process (LocalWhisperClient "inprocess" backend).
+
+Usage:
+    python stub_providers.py --port 8100 --stt-ms 300 --llm-first-token-ms 250
+
+Author: Mohan Bhosale
+"""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+
+# Questions the stub STT "hears", cycled per request; the search-flavored ones exercise web search
+DEFAULT_TRANSCRIPTS = [
+    "Tell me about Mohan's current role",
+    "What are the latest AI news this week?",
+    "What are his key achievements in data science?",
+    "What technologies does he work with?",
+]
+
+# Approximate bytes per second of synthesized audio per Edge TTS output format (mirrors main.AUDIO_FORMATS)
+EDGE_FORMAT_BYTES_PER_SECOND = {
+    "webm-24khz-16bit-mono-opus": 3000,
+    "audio-24khz-48kbitrate-mono-mp3": 6000,
+    "audio-24khz-96kbitrate-mono-mp3": 12000,
+    "riff-24khz-16bit-mono-pcm": 48000,
+}
+OPENAI_FORMAT_BYTES_PER_SECOND = {"opus": 3000, "mp3": 6000, "wav": 48000}
+# Container magic bytes, so the app's MIME detection sees what the real services send
+FORMAT_SIGNATURES = {
+    "webm-24khz-16bit-mono-opus": b"\x1aE\xdf\xa3",
+    "riff-24khz-16bit-mono-pcm": b"RIFF",
+    "opus": b"OggS",
+    "wav": b"RIFF",
+}
+DEFAULT_AUDIO_BYTES_PER_SECOND = 6000
+WORDS_PER_SECOND = 2.7
+
+
+class StubConfig:
+    """Latency and payload shape of the stub providers"""
+
+    def __init__(self,
+                 stt_ms: float = 300,
+                 stt_upload_kbps: float = 0,
+                 llm_first_token_ms: float = 250,
+                 llm_tokens_per_second: float = 250,
+                 reply_words: int = 60,
+                 tts_first_chunk_ms: float = 150,
+                 edge_connect_ms: float = 200,
+                 edge_idle_timeout_s: float = 0,
+                 tts_realtime_factor: float = 0.1,
+                 tts_chunks_per_second: float = 20,
+                 local_whisper_ms: float = 350,
+                 local_whisper_ms_per_second: float = 40,
+                 search_ms: float = 400,
+                 page_ms: float = 300,
+                 failure_rate: float = 0.0,
+                 groq_rpm: float = 0,
+                 groq_tpm: float = 0,
+                 tts_outage: bool = False,
+                 transcripts: Optional[list] = None,
+                 transcripts_by_audio: Optional[Dict[str, str]] = None,
+                 reply_words_by_transcript: Optional[Dict[str, int]] = None):
+        self.stt_ms = stt_ms
+        # Effective upload bandwidth to the STT service in kbit/s (0 = unlimited), so clip size costs time
+        self.stt_upload_kbps = stt_upload_kbps
+        self.llm_first_token_ms = llm_first_token_ms
+        self.llm_tokens_per_second = llm_tokens_per_second
+        self.reply_words = reply_words
+        self.tts_first_chunk_ms = tts_first_chunk_ms
+        # TLS + WebSocket handshake and token check before an Edge connection is usable
+        self.edge_connect_ms = edge_connect_ms
+        # Idle Edge connections are closed by the "service" after this long (0 = never)
+        self.edge_idle_timeout_s = edge_idle_timeout_s
+        # Seconds of synthesis work per second of produced audio
+        self.tts_realtime_factor = tts_realtime_factor
+        self.tts_chunks_per_second = tts_chunks_per_second
+        # CPU Whisper cost per call: a fixed part (the encoder always sees a padded 30 s window) plus
+        # decoding per second of audio
+        self.local_whisper_ms = local_whisper_ms
+        self.local_whisper_ms_per_second = local_whisper_ms_per_second
+        self.search_ms = search_ms
+        self.page_ms = page_ms
+        # Fraction of requests answered with HTTP 500 (or a dropped Edge socket)
+        self.failure_rate = failure_rate
+        # Groq rate limits per model: requests and tokens per minute (0 = unlimited)
+        self.groq_rpm = groq_rpm
+        self.groq_tpm = groq_tpm
+        # Edge and OpenAI TTS both down, so the assistant falls back to its local voice (or the beep)
+        self.tts_outage = tts_outage
+        self.transcripts = transcripts or DEFAULT_TRANSCRIPTS
+        # Replayed sessions: SHA-1 of the uploaded audio -> recorded transcript, and
+        # transcript -> recorded answer length, so each turn keeps its production shape
+        self.transcripts_by_audio = transcripts_by_audio or {}
+        self.reply_words_by_transcript = reply_words_by_transcript or {}
+
+
+class StubWhisper:
+    """
+    Local Whisper model stand-in with CPU-like cost and deterministic transcripts
+
+    Audio is transcribed in two-second segments whose words derive from the segment's samples, so
+    overlapping streamed windows agree on the audio they share, as real decodes mostly do.
+    """
+
+    SEGMENT_SECONDS = 2.0
+    SAMPLE_RATE = 16000
+    VOCABULARY = ("what", "is", "Mohan", "working", "on", "latest", "models", "data", "science",
+                  "projects", "at", "Cohere", "Health", "and", "how", "does", "he", "deploy", "them")
+
+    def __init__(self, config: Optional[StubConfig] = None):
+        self.config = config or StubConfig()
+
+    def transcribe(self, audio_data: bytes) -> str:
+        """Transcribe a clip (any format soundfile reads), like LocalWhisperClient's transcriber"""
+        import io
+        import soundfile as sf
+
+        samples, rate = sf.read(io.BytesIO(audio_data), dtype="int16", always_2d=True)
+        pcm = samples[::max(1, round(rate / self.SAMPLE_RATE)), 0].tobytes()
+        return " ".join(segment["text"] for segment in self.transcribe_window(pcm))
+
+    def transcribe_window(self, pcm: bytes, prompt: str = "") -> list:
+        """Transcribe 16 kHz 16-bit PCM into timed segments, like LocalWhisperClient's window_transcriber"""
+        seconds = len(pcm) / (2 * self.SAMPLE_RATE)
+        time.sleep((self.config.local_whisper_ms + self.config.local_whisper_ms_per_second * seconds) / 1000)
+        segment_bytes = int(self.SEGMENT_SECONDS * self.SAMPLE_RATE) * 2
+        segments = []
+        for start in range(0, len(pcm), segment_bytes):
+            chunk = pcm[start:start + segment_bytes]
+            digest = hashlib.sha1(chunk).digest()
+            words = max(1, round(len(chunk) / (2 * self.SAMPLE_RATE) * WORDS_PER_SECOND))
+            text = " ".join(self.VOCABULARY[(digest[i % len(digest)] + i) % len(self.VOCABULARY)]
+                            for i in range(words))
+            segments.append({"start": start / (2 * self.SAMPLE_RATE),
+                             "end": (start + len(chunk)) / (2 * self.SAMPLE_RATE), "text": text})
+        return segments
+
+
+def _reply_text(words: int) -> str:
+    """Deterministic LLM reply with sentence punctuation every dozen words"""
+    vocabulary = ("Mohan", "builds", "machine", "learning", "systems", "that", "turn", "clinical",
+                  "data", "into", "reliable", "predictions", "for", "healthcare", "teams")
+    tokens = []
+    for i, word in zip(range(words), itertools.cycle(vocabulary)):
+        tokens.append(word + ("." if i % 12 == 11 else ""))
+    text = " ".join(tokens)
+    return text if text.endswith(".") else text + "."
+
+
+def _audio_bytes_for(text: str, bytes_per_second: int, signature: bytes = b"") -> bytes:
+    """Silent payload sized like real synthesized speech for the given text"""
+    seconds = max(0.5, len(text.split()) / WORDS_PER_SECOND)
+    return signature + bytes(int(seconds * bytes_per_second) - len(signature))
+
+
+def create_stub_app(config: StubConfig) -> FastAPI:
+    """
+    Create the stub provider application
+
+    Args:
+        config: Latency and payload settings
+
+    Returns:
+        FastAPI app serving every stub endpoint
+    """
+    stub_app = FastAPI(title="Voice Assistant Stub Providers")
+    transcripts = itertools.cycle(config.transcripts)
+    counters: Dict[str, int] = {}
+    failure_period = int(round(1 / config.failure_rate)) if config.failure_rate > 0 else 0
+
+    def should_fail(name: str) -> bool:
+        counters[name] = counters.get(name, 0) + 1
+        return bool(failure_period) and counters[name] % failure_period == 0
+
+    # Groq model -> {"requests" | "tokens": [level, last refill]}
+    groq_budgets: Dict[str, Dict[str, list]] = {}
+
+    def groq_rate_limit(model: str, tokens: int) -> Tuple[Optional[JSONResponse], Dict[str, str]]:
+        """Spend from the model's per-minute budgets like Groq: (429 response or None, x-ratelimit-* headers)"""
+        limits = {"requests": config.groq_rpm, "tokens": config.groq_tpm}
+        costs = {"requests": 1, "tokens": tokens}
+        now = time.monotonic()
+        budgets = groq_budgets.setdefault(model, {kind: [limit, now] for kind, limit in limits.items()})
+        for kind, budget in budgets.items():
+            budget[0] = min(limits[kind], budget[0] + (now - budget[1]) * limits[kind] / 60)
+            budget[1] = now
+        allowed = all(not limits[kind] or budgets[kind][0] >= min(costs[kind], limits[kind]) for kind in limits)
+        if allowed:
+            for kind in limits:
+                budgets[kind][0] -= min(costs[kind], limits[kind])
+
+        headers = {}
+        retry_after = 0.0
+        for kind, limit in limits.items():
+            if not limit:
+                continue
+            level = budgets[kind][0]
+            headers[f"x-ratelimit-limit-{kind}"] = str(int(limit))
+            headers[f"x-ratelimit-remaining-{kind}"] = str(int(max(0.0, level)))
+            headers[f"x-ratelimit-reset-{kind}"] = f"{(limit - level) * 60 / limit:.2f}s"
+            retry_after = max(retry_after, (min(costs[kind], limit) - level) * 60 / limit)
+        if allowed:
+            return None, headers
+        headers["retry-after"] = str(max(1, int(retry_after + 0.999)))
+        return JSONResponse({"error": {"message": f"Rate limit reached for model `{model}`",
+                                       "type": "requests", "code": "rate_limit_exceeded"}},
+                            status_code=429, headers=headers), headers
+
+    async def transcription(request: Request):
+        form = await request.form()
+        upload = form.get("file")
+        audio = await upload.read() if hasattr(upload, "read") else b""
+        headers = {}
+        if request.url.path.startswith("/openai/"):
+            refused, headers = groq_rate_limit(str(form.get("model")), 0)
+            if refused:
+                return refused
+        upload_seconds = len(audio) * 8 / (config.stt_upload_kbps * 1000) if config.stt_upload_kbps else 0.0
+        await asyncio.sleep(upload_seconds + config.stt_ms / 1000)
+        if should_fail("stt"):
+            return JSONResponse({"error": {"message": "stub failure"}}, status_code=500)
+        text = config.transcripts_by_audio.get(hashlib.sha1(audio).hexdigest())
+        return JSONResponse({"text": text or next(transcripts)}, headers=headers)
+
+    stub_app.post("/openai/v1/audio/transcriptions")(transcription)
+    stub_app.post("/v1/audio/transcriptions")(transcription)
+
+    @stub_app.get("/openai/v1/models")
+    async def groq_models():
+        return {"object": "list", "data": [{"id": "whisper-large-v3", "object": "model", "owned_by": "stub"},
+                                           {"id": "llama-3.3-70b-versatile", "object": "model", "owned_by": "stub"}]}
+
+    @stub_app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if should_fail("llm"):
+            await asyncio.sleep(config.llm_first_token_ms / 1000)
+            return JSONResponse({"error": {"message": "stub failure"}}, status_code=500)
+
+        question = body["messages"][-1]["content"] if body.get("messages") else ""
+        reply_words = next((words for transcript, words in config.reply_words_by_transcript.items()
+                            if transcript and transcript in question), config.reply_words)
+        reply = _reply_text(min(reply_words, body.get("max_tokens") or reply_words))
+        words = reply.split(" ")
+        prompt_chars = sum(len(message.get("content") or "") for message in body.get("messages", []))
+        refused, headers = groq_rate_limit(body.get("model"), prompt_chars // 4 + len(words))
+        if refused:
+            return refused
+        token_delay = 1 / config.llm_tokens_per_second
+        created = int(time.time())
+
+        if body.get("stream"):
+            async def events():
+                await asyncio.sleep(config.llm_first_token_ms / 1000)
+                for i, word in enumerate(words):
+                    chunk = {
+                        "id": "stub", "object": "chat.completion.chunk", "created": created,
+                        "model": body.get("model"),
+                        "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word},
+                                     "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(token_delay)
+                done = {"id": "stub", "object": "chat.completion.chunk", "created": created,
+                        "model": body.get("model"),
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                yield f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+        await asyncio.sleep(config.llm_first_token_ms / 1000 + len(words) * token_delay)
+        return JSONResponse({
+            "id": "stub", "object": "chat.completion", "created": created, "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": len(words), "total_tokens": 100 + len(words)},
+        }, headers=headers)
+
+    @stub_app.post("/v1/audio/speech")
+    async def openai_speech(request: Request):
+        body = await request.json()
+        if config.tts_outage:
+            return JSONResponse({"error": {"message": "stub outage"}}, status_code=503)
+        bytes_per_second = OPENAI_FORMAT_BYTES_PER_SECOND.get(body.get("response_format"),
+                                                              DEFAULT_AUDIO_BYTES_PER_SECOND)
+        audio = _audio_bytes_for(body.get("input", ""), bytes_per_second,
+                                 FORMAT_SIGNATURES.get(body.get("response_format"), b""))
+        seconds = len(audio) / bytes_per_second
+        await asyncio.sleep(config.tts_first_chunk_ms / 1000 + seconds * config.tts_realtime_factor)
+        if should_fail("tts"):
+            return JSONResponse({"error": {"message": "stub failure"}}, status_code=500)
+        return Response(audio, media_type="audio/mpeg")
+
+    @stub_app.websocket("/edge")
+    async def edge_tts(websocket: WebSocket):
+        """Speak the Edge TTS readaloud protocol; handles several requests per connection"""
+        if config.tts_outage:
+            # Refused during the handshake, like an unreachable service
+            await websocket.close(code=1013)
+            return
+        await asyncio.sleep(config.edge_connect_ms / 1000)
+        await websocket.accept()
+        output_format = "audio-24khz-48kbitrate-mono-mp3"
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(websocket.receive_text(),
+                                                     timeout=config.edge_idle_timeout_s or None)
+                except asyncio.TimeoutError:
+                    await websocket.close()
+                    return
+                headers, _, payload = message.partition("\r\n\r\n")
+                if "Path:speech.config" in headers:
+                    match = re.search(r'"outputFormat":"([^"]+)"', payload)
+                    output_format = match.group(1) if match else output_format
+                    continue
+                if "Path:ssml" not in headers:
+                    continue
+
+                request_id = re.search(r"X-RequestId:(\w+)", headers).group(1)
+                if should_fail("edge"):
+                    await websocket.close()
+                    return
+
+                text = re.sub(r"<[^>]+>", " ", payload)
+                bytes_per_second = EDGE_FORMAT_BYTES_PER_SECOND.get(output_format, DEFAULT_AUDIO_BYTES_PER_SECOND)
+                audio = _audio_bytes_for(text, bytes_per_second, FORMAT_SIGNATURES.get(output_format, b""))
+                audio_seconds = len(audio) / bytes_per_second
+                chunk_count = max(1, int(audio_seconds * config.tts_chunks_per_second))
+                chunk_size = -(-len(audio) // chunk_count)
+                chunk_delay = audio_seconds * config.tts_realtime_factor / chunk_count
+
+                await websocket.send_text(
+                    f"X-RequestId:{request_id}\r\nContent-Type:application/json; charset=utf-8\r\n"
+                    "Path:turn.start\r\n\r\n{}"
+                )
+                await asyncio.sleep(config.tts_first_chunk_ms / 1000)
+                header = f"X-RequestId:{request_id}\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n".encode()
+                for offset in range(0, len(audio), chunk_size):
+                    await websocket.send_bytes(len(header).to_bytes(2, "big") + header
+                                               + audio[offset:offset + chunk_size])
+                    await asyncio.sleep(chunk_delay)
+                await websocket.send_text(
+                    f"X-RequestId:{request_id}\r\nContent-Type:application/json; charset=utf-8\r\n"
+                    "Path:turn.end\r\n\r\n{}"
+                )
+        except WebSocketDisconnect:
+            pass
+
+    @stub_app.get("/search")
+    async def search(request: Request, q: str, max_results: int = 5):
+        await asyncio.sleep(config.search_ms / 1000)
+        base = str(request.base_url).rstrip("/")
+        return [
+            {"title": f"{q.title()} - result {i}", "href": f"{base}/page/{i}",
+             "body": f"Summary {i} of recent coverage about {q}."}
+            for i in range(1, max_results + 1)
+        ]
+
+    @stub_app.get("/page/{page_id}")
+    async def page(page_id: int):
+        await asyncio.sleep(config.page_ms / 1000)
+        paragraphs = "".join(f"<p>Paragraph {i} of page {page_id} with **details** and numbers like {i * 7}.</p>"
+                             for i in range(40))
+        return HTMLResponse(f"<html><head><script>var x;</script></head><body>{paragraphs}</body></html>")
+
+    return stub_app
+
+
+def start_stub_server(config: StubConfig, port: int) -> threading.Thread:
+    """
+    Run the stub providers in a background thread
+
+    Args:
+        config: Latency and payload settings
+        port: Local port to listen on
+
+    Returns:
+        The daemon thread serving the stubs (returns once the server accepts connections)
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(create_stub_app(config), host="127.0.0.1", port=port,
+                                           log_level="warning", ws="websockets"))
+    thread = threading.Thread(target=server.run, name="stub-providers", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return thread
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    """Add the stub latency options to an argument parser"""
+    defaults = StubConfig()
+    parser.add_argument("--stt-ms", type=float, default=defaults.stt_ms)
+    parser.add_argument("--stt-upload-kbps", type=float, default=defaults.stt_upload_kbps)
+    parser.add_argument("--llm-first-token-ms", type=float, default=defaults.llm_first_token_ms)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=defaults.llm_tokens_per_second)
+    parser.add_argument("--reply-words", type=int, default=defaults.reply_words)
+    parser.add_argument("--tts-first-chunk-ms", type=float, default=defaults.tts_first_chunk_ms)
+    parser.add_argument("--edge-connect-ms", type=float, default=defaults.edge_connect_ms)
+    parser.add_argument("--edge-idle-timeout-s", type=float, default=defaults.edge_idle_timeout_s)
+    parser.add_argument("--tts-realtime-factor", type=float, default=defaults.tts_realtime_factor)
+    parser.add_argument("--local-whisper-ms", type=float, default=defaults.local_whisper_ms)
+    parser.add_argument("--local-whisper-ms-per-second", type=float, default=defaults.local_whisper_ms_per_second)
+    parser.add_argument("--search-ms", type=float, default=defaults.search_ms)
+    parser.add_argument("--page-ms", type=float, default=defaults.page_ms)
+    parser.add_argument("--failure-rate", type=float, default=defaults.failure_rate)
+    parser.add_argument("--groq-rpm", type=float, default=defaults.groq_rpm, help="Groq requests/min per model")
+    parser.add_argument("--groq-tpm", type=float, default=defaults.groq_tpm, help="Groq tokens/min per model")
+    parser.add_argument("--tts-outage", action="store_true", help="Edge and OpenAI TTS refuse every request")
+
+
+def stub_config_from_args(args) -> StubConfig:
+    """Build a StubConfig from parsed add_stub_arguments options"""
+    return StubConfig(
+        stt_ms=args.stt_ms,
+        stt_upload_kbps=args.stt_upload_kbps,
+        llm_first_token_ms=args.llm_first_token_ms,
+        llm_tokens_per_second=args.llm_tokens_per_second,
+        reply_words=args.reply_words,
+        tts_first_chunk_ms=args.tts_first_chunk_ms,
+        edge_connect_ms=args.edge_connect_ms,
+        edge_idle_timeout_s=args.edge_idle_timeout_s,
+        tts_realtime_factor=args.tts_realtime_factor,
+        local_whisper_ms=args.local_whisper_ms,
+        local_whisper_ms_per_second=args.local_whisper_ms_per_second,
+        search_ms=args.search_ms,
+        page_ms=args.page_ms,
+        failure_rate=args.failure_rate,
+        groq_rpm=args.groq_rpm,
+        groq_tpm=args.groq_tpm,
+        tts_outage=args.tts_outage,
+    )
+
+
+def stub_environment(port: int) -> Dict[str, str]:
+    """Environment variables that point the assistant at stubs listening on the given port"""
+    base = f"http://127.0.0.1:{port}"
+    return {
+        "GROQ_API_KEY": "gsk_stub",
+        "GROQ_BASE_URL": base,
+        "OPENAI_BASE_URL": f"{base}/v1",
+        "EDGE_TTS_URL": f"ws://127.0.0.1:{port}/edge?TrustedClientToken=stub",
+        "SEARCH_API_URL": f"{base}/search",
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Groq/OpenAI/Edge TTS/search providers")
+    parser.add_argument("--port", type=int, default=8100)
+    add_stub_arguments(parser)
+    cli_args = parser.parse_args()
+
+    print(f"🧪 Stub providers on http://127.0.0.1:{cli_args.port}")
+    for key, value in stub_environment(cli_args.port).items():
+        print(f"   export {key}={value}")
+    start_stub_server(stub_config_from_args(cli_args), cli_args.port).join()